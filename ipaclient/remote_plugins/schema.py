@@ -7,12 +7,15 @@ import errno
 import fcntl
 import glob
 import json
+import mmap
 import os
-import re
 import sys
+import tempfile
+import struct
 import time
 import types
 import zipfile
+import zlib
 
 import six
 
@@ -68,6 +71,8 @@ USER_CACHE_PATH = (
 SCHEMA_DIR = os.path.join(USER_CACHE_PATH, 'ipa', 'schema')
 SERVERS_DIR = os.path.join(USER_CACHE_PATH, 'ipa', 'servers')
 
+_ZIP_HEADER_LENGTHS = struct.Struct('<HH')
+
 logger = log_mgr.get_logger(__name__)
 
 
@@ -86,7 +91,37 @@ class _SchemaMethod(ClientMethod):
 
 
 class _SchemaObject(Object):
-    pass
+    def _iter_methods(self):
+        # the schema knows the methods of the object, so plugins of other
+        # objects do not need to be created
+        method_names = self.api._schema.get_methods(self.full_name)
+        namespace = self.api.Method
+        for plugin in namespace:
+            if (isinstance(plugin, _SchemaPlugin) and
+                    plugin.full_name not in method_names):
+                continue
+            plugin = namespace[plugin]
+            if plugin is not namespace[plugin.name]:
+                continue
+            if plugin.obj_name == self.name:
+                yield plugin
+
+
+class _LazyClassAttribute(object):
+    """
+    Class attribute which is created on first access
+
+    Params and outputs of a plugin are created only when the plugin is
+    finalized.
+    """
+    def __init__(self, name, create):
+        self.name = name
+        self.__create = create
+
+    def __get__(self, obj, cls):
+        value = self.__create(cls)
+        setattr(cls, self.name, value)
+        return value
 
 
 class _SchemaPlugin(object):
@@ -198,8 +233,10 @@ class _SchemaPlugin(object):
         else:
             class_dict['topic'] = None
 
-        class_dict['takes_params'] = tuple(self._create_param(api, s)
-                                           for s in schema.get('params', []))
+        class_dict['takes_params'] = _LazyClassAttribute(
+            'takes_params',
+            lambda cls: tuple(self._create_param(api, s)
+                              for s in schema.get('params', [])))
 
         return self.name, self.bases, class_dict
 
@@ -257,14 +294,22 @@ class _SchemaCommandPlugin(_SchemaPlugin):
 
         args = set(str(s['name']) for s in schema['params']
                    if s.get('positional', s.get('required', True)))
-        class_dict['takes_args'] = tuple(
-            p for p in class_dict['takes_params'] if p.name in args)
-        class_dict['takes_options'] = tuple(
-            p for p in class_dict['takes_params'] if p.name not in args)
-        del class_dict['takes_params']
-
-        class_dict['has_output'] = tuple(
-            self._create_output(api, s) for s in schema['output'])
+        params = class_dict.pop('takes_params')
+        params.name = '_schema_params'
+        class_dict[params.name] = params
+        class_dict['takes_args'] = _LazyClassAttribute(
+            'takes_args',
+            lambda cls: tuple(p for p in cls._schema_params
+                              if p.name in args))
+        class_dict['takes_options'] = _LazyClassAttribute(
+            'takes_options',
+            lambda cls: tuple(p for p in cls._schema_params
+                              if p.name not in args))
+
+        class_dict['has_output'] = _LazyClassAttribute(
+            'has_output',
+            lambda cls: tuple(self._create_output(api, s)
+                              for s in schema['output']))
 
         return name, bases, class_dict
 
@@ -283,22 +328,57 @@ def _ensure_dir_created(d):
                                "".format(e))
 
 
-class _LockedZipFile(zipfile.ZipFile):
-    """ Add locking to zipfile.ZipFile
-    Shared lock is used with read mode, exclusive with write mode.
+class _SchemaArchive(object):
     """
-    def __enter__(self):
-        if 'r' in self.mode:
-            fcntl.flock(self.fp, fcntl.LOCK_SH)
-        elif 'w' in self.mode or 'a' in self.mode:
-            fcntl.flock(self.fp, fcntl.LOCK_EX)
+    Read-only view of a schema archive
 
-        return super(_LockedZipFile, self).__enter__()
+    The archive is opened and memory-mapped once and its members are
+    indexed by namespace, so reading a member does not need to open, lock
+    or scan the archive again. Archives are replaced by rename, never
+    rewritten in place, so the mapping stays valid for the life of the
+    process.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            # older clients rewrite the archive in place while holding an
+            # exclusive lock
+            fcntl.flock(f, fcntl.LOCK_SH)
+            try:
+                infos = zipfile.ZipFile(f).infolist()
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+        self._members = {}
+        for info in infos:
+            namespace, sep, name = info.filename.partition('/')
+            if sep:
+                self._members.setdefault(namespace, {})[name] = info
+            else:
+                self._members[info.filename] = info
+
+    def _read_member(self, info):
+        # the data follows the local file header, which has the length of
+        # the file name and of the extra field at offset 26
+        name_len, extra_len = _ZIP_HEADER_LENGTHS.unpack_from(
+            self._map, info.header_offset + 26)
+        start = info.header_offset + 30 + name_len + extra_len
+        data = self._map[start:start + info.compress_size]
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            data = zlib.decompress(data, -zlib.MAX_WBITS)
+        elif info.compress_type != zipfile.ZIP_STORED:
+            raise zipfile.BadZipfile(
+                "Unsupported compression in {}".format(info.filename))
+        return json.loads(data.decode('utf-8'))
+
+    def read(self, path):
+        return self._read_member(self._members[path])
 
-    def __exit__(self, type_, value, traceback):
-        fcntl.flock(self.fp, fcntl.LOCK_UN)
+    def read_namespace_member(self, namespace, member):
+        return self._read_member(self._members[namespace][member])
 
-        return super(_LockedZipFile, self).__exit__(type_, value, traceback)
+    def namespace(self, namespace):
+        return self._members.get(namespace, {})
 
 
 class _SchemaNameSpace(collections.Mapping):
@@ -315,7 +395,7 @@ class _SchemaNameSpace(collections.Mapping):
             yield key
 
     def __len__(self):
-        return len(list(self._schema.iter_namespace(self.name)))
+        return self._schema.len_namespace(self.name)
 
 
 class NotAvailable(Exception):
@@ -344,10 +424,10 @@ class Schema(object):
     """
     schema_path_template = os.path.join(SCHEMA_DIR, '{}')
     servers_path_template = os.path.join(SERVERS_DIR, '{}')
-    ns_member_pattern_template = '^{}/(?P<name>.+)$'
     ns_member_path_template = '{}/{}'
     namespaces = {'classes', 'commands', 'topics'}
     schema_info_path = 'schema'
+    methods_index_path = 'methods'
 
     @classmethod
     def _list(cls):
@@ -362,6 +442,9 @@ class Schema(object):
         self._api = api
         self._client = client
         self._dict = {}
+        self._archive = None
+        self._archive_fingerprint = None
+        self._methods = None
 
     def _open_server_info(self, hostname, mode):
         encoded_hostname = DNSName(hostname).ToASCII()
@@ -431,7 +514,7 @@ class Schema(object):
 
         if not self._dict:
             self._dict['fingerprint'] = fp
-            schema_info = self._read(self.schema_info_path)
+            schema_info = self._read(self.schema_info_path, fp)
             self._dict['version'] = schema_info['version']
             for ns in self.namespaces:
                 self._dict[ns] = _SchemaNameSpace(self, ns)
@@ -443,11 +526,14 @@ class Schema(object):
         self._ensure_cached()
         return self._dict[key]
 
-    def _open_archive(self, mode, fp=None):
+    def _open_archive(self, fp=None):
         if not fp:
             fp = self['fingerprint']
-        arch_path = self.schema_path_template.format(fp)
-        return _LockedZipFile(arch_path, mode)
+        if self._archive is None or self._archive_fingerprint != fp:
+            arch_path = self.schema_path_template.format(fp)
+            self._archive = _SchemaArchive(arch_path)
+            self._archive_fingerprint = fp
+        return self._archive
 
     def _store(self, fingerprint, schema={}):
         _ensure_dir_created(SCHEMA_DIR)
@@ -455,33 +541,69 @@ class Schema(object):
         schema_info = dict(version=schema['version'],
                            fingerprint=schema['fingerprint'])
 
-        with self._open_archive('w', fingerprint) as zf:
-            # store schema information
-            zf.writestr(self.schema_info_path, json.dumps(schema_info))
-            # store namespaces
-            for namespace in self.namespaces:
-                for member in schema[namespace]:
-                    path = self.ns_member_path_template.format(
-                        namespace,
-                        member['full_name']
-                    )
-                    zf.writestr(path, json.dumps(member))
-
-    def _read(self, path):
-        with self._open_archive('r') as zf:
-            return json.loads(zf.read(path))
+        # write a new archive and rename it into place, so that archives
+        # mapped by other processes are never modified
+        fd, tmp_path = tempfile.mkstemp(dir=SCHEMA_DIR, prefix='.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                with zipfile.ZipFile(f, 'w') as zf:
+                    # store schema information
+                    zf.writestr(self.schema_info_path,
+                                json.dumps(schema_info))
+                    # store namespaces
+                    for namespace in self.namespaces:
+                        for member in schema[namespace]:
+                            path = self.ns_member_path_template.format(
+                                namespace,
+                                member['full_name']
+                            )
+                            zf.writestr(path, json.dumps(member))
+                    # store the methods of each class
+                    zf.writestr(self.methods_index_path,
+                                json.dumps(self._index_methods(
+                                    schema['commands'])))
+            os.rename(tmp_path,
+                      self.schema_path_template.format(fingerprint))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @staticmethod
+    def _index_methods(commands):
+        methods = {}
+        for command in commands:
+            if 'obj_class' in command:
+                methods.setdefault(command['obj_class'], []).append(
+                    command['full_name'])
+        return methods
+
+    def get_methods(self, obj_full_name):
+        """
+        Return full names of the commands which are methods of a class
+        """
+        if self._methods is None:
+            archive = self._open_archive()
+            try:
+                methods = archive.read(self.methods_index_path)
+            except KeyError:
+                # archives stored by older clients do not have the index
+                methods = self._index_methods(
+                    archive.read_namespace_member('commands', full_name)
+                    for full_name in archive.namespace('commands'))
+            self._methods = {k: frozenset(v) for k, v in methods.items()}
+        return self._methods.get(obj_full_name, frozenset())
+
+    def _read(self, path, fp=None):
+        return self._open_archive(fp).read(path)
 
     def read_namespace_member(self, namespace, member):
-        path = self.ns_member_path_template.format(namespace, member)
-        return self._read(path)
+        return self._open_archive().read_namespace_member(namespace, member)
 
     def iter_namespace(self, namespace):
-        pattern = self.ns_member_pattern_template.format(namespace)
-        with self._open_archive('r') as zf:
-            for name in zf.namelist():
-                r = re.match(pattern, name)
-                if r:
-                    yield r.groups('name')[0]
+        return iter(self._open_archive().namespace(namespace))
+
+    def len_namespace(self, namespace):
+        return len(self._open_archive().namespace(namespace))
 
 
 def get_package(api, client):
@@ -17,8 +17,8 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import shlex
 import re
+import string
 
 import six
 
@@ -39,6 +39,24 @@ ACTIONS = ["allow", "deny"]
 PERMISSIONS = ["read", "write", "add", "delete", "search", "compare",
                "selfwrite", "proxy", "all"]
 
+# Maximum number of parsed ACI strings remembered by ACI()
+ACI_PARSE_CACHE_SIZE = 1024
+
+# ACI string -> parsed parts, see ACI._dump_parsed()
+_parse_cache = {}
+
+_TARGET_SPACE = ' \t\r\n'
+_TARGET_KEYWORD_END = _TARGET_SPACE + '=!()'
+_TARGET_WORD = frozenset(string.ascii_letters + string.digits + '_.')
+
+
+def _skip_space(s, pos):
+    end = len(s)
+    while pos < end and s[pos] in _TARGET_SPACE:
+        pos += 1
+    return pos
+
+
 class ACI:
     """
     Holds the basic data for an ACI entry, as stored in the cn=accounts
@@ -99,29 +117,62 @@ class ACI:
     def _parse_target(self, aci):
         if six.PY2:
             aci = aci.encode('utf-8')
-        lexer = shlex.shlex(aci)
-        lexer.wordchars = lexer.wordchars + "."
-
-        l = []
-
-        var = False
-        op = "="
-        for token in lexer:
-            # We should have the form (a = b)(a = b)...
-            if token == "(":
-                var = next(lexer).strip()
-                operator = next(lexer)
-                if operator != "=" and operator != "!=":
-                    # Peek at the next char before giving up
-                    operator = operator + next(lexer)
-                    if operator != "=" and operator != "!=":
-                        raise SyntaxError("No operator in target, got '%s'" % operator)
-                op = operator
-                val = next(lexer).strip()
-                val = self._remove_quotes(val)
-                end = next(lexer)
-                if end != ")":
-                    raise SyntaxError('No end parenthesis in target, got %s' % end)
+
+        # We should have the form (a = b)(a = b)...
+        pos = 0
+        end = len(aci)
+        while True:
+            pos = _skip_space(aci, pos)
+            if pos == end:
+                break
+            if aci[pos] != '(':
+                raise SyntaxError("No start parenthesis in target, got '%s'"
+                                  % aci[pos])
+
+            pos = _skip_space(aci, pos + 1)
+            start = pos
+            while pos < end and aci[pos] not in _TARGET_KEYWORD_END:
+                pos += 1
+            var = aci[start:pos]
+            if not var:
+                raise SyntaxError("No keyword in target")
+
+            pos = _skip_space(aci, pos)
+            if aci.startswith('=', pos):
+                op = '='
+                pos += 1
+            elif aci.startswith('!', pos):
+                # '!' and '=' may be separated by white space
+                pos = _skip_space(aci, pos + 1)
+                if not aci.startswith('=', pos):
+                    raise SyntaxError("No operator in target, got '!%s'"
+                                      % aci[pos:pos + 1])
+                op = '!='
+                pos += 1
+            else:
+                raise SyntaxError("No operator in target, got '%s'"
+                                  % aci[pos:pos + 1])
+
+            pos = _skip_space(aci, pos)
+            start = pos
+            if aci.startswith(('"', "'"), pos):
+                pos = aci.find(aci[pos], pos + 1)
+                if pos < 0:
+                    raise SyntaxError("No closing quotation in target")
+                pos += 1
+            elif pos < end:
+                # Unquoted values are a single word or character
+                pos += 1
+                if aci[pos - 1] in _TARGET_WORD:
+                    while pos < end and aci[pos] in _TARGET_WORD:
+                        pos += 1
+            val = self._remove_quotes(aci[start:pos].strip())
+
+            pos = _skip_space(aci, pos)
+            if not aci.startswith(')', pos):
+                raise SyntaxError('No end parenthesis in target, got %s'
+                                  % aci[pos:pos + 1])
+            pos += 1
 
             if var == 'targetattr':
                 # Make a string of the form attr || attr || ... into a list
@@ -135,6 +186,11 @@ class ACI:
                 self.target[var]['expression'] = val
 
     def _parse_acistr(self, acistr):
+        parsed = _parse_cache.get(acistr)
+        if parsed is not None:
+            self._load_parsed(parsed)
+            return
+
         vstart = acistr.find('version 3.0')
         if vstart < 0:
             raise SyntaxError("malformed ACI, unable to find version %s" % acistr)
@@ -150,6 +206,32 @@ class ACI:
         self.permissions = bindperms.group(2).replace(' ','').split(',')
         self.set_bindrule(bindperms.group(3))
 
+        if len(_parse_cache) >= ACI_PARSE_CACHE_SIZE:
+            _parse_cache.clear()
+        _parse_cache[acistr] = self._dump_parsed()
+
+    def _dump_parsed(self):
+        """Return the parsed parts of the ACI as nested tuples"""
+        target = []
+        for t, v in self.target.items():
+            expression = v['expression']
+            if isinstance(expression, list):
+                expression = tuple(expression)
+            target.append((t, v['operator'], expression))
+        return (tuple(target), self.name, self.action,
+                tuple(self.permissions), tuple(self.bindrule.items()))
+
+    def _load_parsed(self, parsed):
+        """Set the ACI from the output of _dump_parsed()"""
+        target, self.name, self.action, permissions, bindrule = parsed
+        self.target = {}
+        for t, op, expression in target:
+            if isinstance(expression, tuple):
+                expression = list(expression)
+            self.target[t] = {'operator': op, 'expression': expression}
+        self.permissions = list(permissions)
+        self.bindrule = dict(bindrule)
+
     def validate(self):
         """Do some basic verification that this will produce a
            valid LDAP ACI.
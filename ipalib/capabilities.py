@@ -54,6 +54,9 @@ capabilities = dict(
 
     # dns_name_values: dnsnames as objects
     dns_name_values=u'2.88',
+
+    # compact_json: JSON-RPC responses are sent without indentation
+    compact_json=u'2.213',
 )
 
 
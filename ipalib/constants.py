@@ -130,6 +130,10 @@ DEFAULT_CONFIG = (
     # jsonrpc_uri is set in Env._finalize_core()
     ('ldap_uri', 'ldap://localhost:389'),
 
+    # LDAP connection pool; the pool is disabled when ldap_pool_size is 0
+    ('ldap_pool_size', 0),
+    ('ldap_pool_idle_timeout', 60),
+
     ('rpc_protocol', 'jsonrpc'),
 
     ('nss_dir', paths.IPA_NSSDB_DIR),
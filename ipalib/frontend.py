@@ -1216,7 +1216,7 @@ class Object(HasParam):
 
     def _on_finalize(self):
         self.methods = NameSpace(
-            self.__get_attrs('Method'), sort=False, name_attr='attr_name'
+            self._iter_methods(), sort=False, name_attr='attr_name'
         )
         self._create_param_namespace('params')
         pkeys = [p for p in self.params() if p.primary_key]
@@ -1259,6 +1259,15 @@ class Object(HasParam):
         """
         raise NotImplementedError('%s.get_dn()' % self.name)
 
+    def _iter_methods(self):
+        """
+        Yield the `Method` plugins of this object.
+
+        Subclasses can override this to avoid instantiating every `Method`
+        plugin in the API.
+        """
+        return self.__get_attrs('Method')
+
     def __get_attrs(self, name):
         if name not in self.api:
             return
@@ -719,10 +719,10 @@ class API(ReadOnly):
         production_mode = self.is_production_mode()
 
         for base in self.bases:
-            for plugin in self.__plugins:
-                if not any(issubclass(b, base) for b in plugin.bases):
-                    continue
-                if not self.env.plugins_on_demand:
+            if not self.env.plugins_on_demand:
+                for plugin in self.__plugins:
+                    if not any(issubclass(b, base) for b in plugin.bases):
+                        continue
                     self._get(plugin)
 
             name = base.__name__
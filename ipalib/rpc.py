@@ -326,6 +326,32 @@ def json_encode_binary(val, version):
         return val
 
 
+class JSONEncoder(json.JSONEncoder):
+    """
+    JSON encoder which converts values the same way as json_encode_binary()
+
+    On Python 3 the values are converted by the default() hook while
+    encoding, so there is no need to copy the whole object first. Python 2
+    json treats str as text though, so there the object still has to go
+    through json_encode_binary() to get binary values base64 encoded.
+    """
+
+    def __init__(self, version, **kwargs):
+        super(JSONEncoder, self).__init__(**kwargs)
+        self.version = version
+
+    def iterencode(self, o, _one_shot=False):
+        if six.PY2:
+            o = json_encode_binary(o, self.version)
+        return super(JSONEncoder, self).iterencode(o, _one_shot)
+
+    def default(self, o):
+        if six.PY3 and isinstance(o, (bytes, Decimal, DN, datetime.datetime,
+                                      DNSName, Principal)):
+            return json_encode_binary(o, self.version)
+        return super(JSONEncoder, self).default(o)
+
+
 def json_decode_binary(val):
     '''
     JSON cannot transport binary data. In order to transport binary data we
@@ -371,6 +397,39 @@ def json_decode_binary(val):
             return val
 
 
+def _json_list_to_tuple(val):
+    return tuple(_json_list_to_tuple(v) if isinstance(v, list) else v
+                 for v in val)
+
+
+def _json_object_hook(val):
+    if '__base64__' in val:
+        return base64.b64decode(val['__base64__'])
+    elif '__datetime__' in val:
+        return datetime.datetime.strptime(val['__datetime__'],
+                                          LDAP_GENERALIZED_TIME_FORMAT)
+    elif '__dns_name__' in val:
+        return DNSName(val['__dns_name__'])
+    # nested dicts have been converted already, only the lists are left
+    for k, v in val.items():
+        if isinstance(v, list):
+            val[k] = _json_list_to_tuple(v)
+    return val
+
+
+def json_loads_binary(data):
+    """
+    Parse JSON ``data`` and decode it like json_decode_binary().
+
+    The values are converted by an object hook while parsing, so there is
+    no second traversal and no copy of the parsed object.
+    """
+    val = json.loads(data, object_hook=_json_object_hook)
+    if isinstance(val, list):
+        val = _json_list_to_tuple(val)
+    return val
+
+
 def decode_fault(e, encoding='UTF-8'):
     assert isinstance(e, Fault)
     if isinstance(e.faultString, bytes):
@@ -1085,7 +1144,7 @@ class JSONServerProxy(object):
         )
 
         try:
-            response = json_decode_binary(json.loads(response.decode('ascii')))
+            response = json_loads_binary(response.decode('ascii'))
         except ValueError as e:
             raise JSONError(error=str(e))
 
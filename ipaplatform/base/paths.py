@@ -159,6 +159,7 @@ class BasePathNamespace(object):
     GETCERT = "/usr/bin/getcert"
     GPG = "/usr/bin/gpg"
     GPG_AGENT = "/usr/bin/gpg-agent"
+    GZIP = "/usr/bin/gzip"
     IPA_GETCERT = "/usr/bin/ipa-getcert"
     KDESTROY = "/usr/bin/kdestroy"
     KINIT = "/usr/bin/kinit"
@@ -171,6 +172,7 @@ class BasePathNamespace(object):
     ODS_KSMUTIL = "/usr/bin/ods-ksmutil"
     ODS_SIGNER = "/usr/sbin/ods-signer"
     OPENSSL = "/usr/bin/openssl"
+    PIGZ = "/usr/bin/pigz"
     PK12UTIL = "/usr/bin/pk12util"
     SETPASSWD = "/usr/bin/setpasswd"
     SIGNTOOL = "/usr/bin/signtool"
@@ -267,6 +269,7 @@ class BasePathNamespace(object):
     SYSRESTORE_INDEX = "/var/lib/ipa-client/sysrestore/sysrestore.index"
     IPA_BACKUP_DIR = "/var/lib/ipa/backup"
     IPA_DNSSEC_DIR = "/var/lib/ipa/dnssec"
+    IPA_DNSKEYSYNCD_DB = "/var/lib/ipa/dnssec/ipa-dnskeysyncd.db"
     IPA_KASP_DB_BACKUP = "/var/lib/ipa/ipa-kasp.db.backup"
     DNSSEC_TOKENS_DIR = "/var/lib/ipa/dnssec/tokens"
     DNSSEC_SOFTHSM_PIN = "/var/lib/ipa/dnssec/softhsm_pin"
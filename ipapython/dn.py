@@ -421,6 +421,9 @@ from __future__ import print_function
 
 import sys
 import functools
+import threading
+import weakref
+from collections import OrderedDict
 
 from ldap.dn import str2dn, dn2str
 from ldap import DECODING_ERROR
@@ -429,7 +432,61 @@ import six
 if six.PY3:
     unicode = str
 
-__all__ = 'AVA', 'RDN', 'DN'
+__all__ = 'AVA', 'RDN', 'DN', 'intern_dn'
+
+# Maximum number of parsed DN strings remembered by DN()
+DN_PARSE_CACHE_SIZE = 4096
+
+
+class _ParseCache(object):
+    '''
+    Bounded LRU mapping of DN strings to their parsed and sorted RDNs.
+
+    The cached tuples are shared between all DN objects built from the same
+    string.
+    '''
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return dict(size=len(self._data), max_size=self.max_size,
+                        hits=self.hits, misses=self.misses)
+
+
+_parse_cache = _ParseCache(DN_PARSE_CACHE_SIZE)
+_interned = weakref.WeakValueDictionary()
 
 def _adjust_indices(start, end, length):
     'helper to fixup start/end slice values'
@@ -490,20 +547,20 @@ def get_ava(*args):
     if l == 3:  # raw values - constructed FROM RDN
         ava = args
     elif l == 2:  # user defined values
-        ava = [_normalize_ava_input(args[0]), _normalize_ava_input(args[1]), 0]
+        ava = (_normalize_ava_input(args[0]), _normalize_ava_input(args[1]), 0)
     elif l == 1:  # slow mode, tuple, string,
         arg = args[0]
         if isinstance(arg, AVA):
-            ava = arg.to_openldap()
+            ava = arg._ava
         elif isinstance(arg, (tuple, list)):
             if len(arg) != 2:
                 raise ValueError("tuple or list must be 2-valued, not \"%s\"" % (arg))
-            ava = [_normalize_ava_input(arg[0]), _normalize_ava_input(arg[1]), 0]
+            ava = (_normalize_ava_input(arg[0]), _normalize_ava_input(arg[1]), 0)
         elif isinstance(arg, six.string_types):
             rdn = str2rdn(arg)
             if len(rdn) > 1:
                 raise TypeError("multiple AVA's specified by \"%s\"" % (arg))
-            ava = list(rdn[0])
+            ava = tuple(rdn[0])
         else:
             raise TypeError("with 1 argument, argument must be str, unicode, tuple or list, got %s instead" %
                             arg.__class__.__name__)
@@ -610,36 +667,29 @@ class AVA(object):
     The str method of an AVA returns the string representation in RFC 4514 DN
     syntax with proper escaping.
     '''
+    __slots__ = ('_ava',)
+
     def __init__(self, *args):
         self._ava = get_ava(*args)
 
     def _get_attr(self):
         return val_decode(self._ava[0])
 
-    def _set_attr(self, new_attr):
-        try:
-            self._ava[0] = _normalize_ava_input(new_attr)
-        except Exception as e:
-            raise ValueError('unable to convert attr "%s": %s' % (new_attr, e))
-
     attr = property(_get_attr)
 
     def _get_value(self):
         return val_decode(self._ava[1])
 
-    def _set_value(self, new_value):
-        try:
-            self._ava[1] = _normalize_ava_input(new_value)
-        except Exception as e:
-            raise ValueError('unable to convert value "%s": %s' % (new_value, e))
-
     value = property(_get_value)
 
     def to_openldap(self):
         return list(self._ava)
 
+    def __reduce__(self):
+        return self.__class__, (self.attr, self.value)
+
     def __str__(self):
-        return dn2str([[self.to_openldap()]])
+        return dn2str(((self._ava,),))
 
     def __repr__(self):
         return "%s.%s('%s')" % (self.__module__, self.__class__.__name__, self.__str__())
@@ -811,36 +861,35 @@ class RDN(object):
     syntax with proper escaping.
     '''
 
+    __slots__ = ('_avas',)
+
     AVA_type = AVA
 
     def __init__(self, *args, **kwds):
         self._avas = self._avas_from_sequence(args, kwds.get('raw', False))
 
     def _avas_from_sequence(self, args, raw=False):
-        avas = []
-        sort = 0
         ava_count = len(args)
 
         if raw:  # fast raw mode
-            avas = args
+            return args
         elif ava_count == 1 and isinstance(args[0], six.string_types):
-            avas = str2rdn(args[0])
-            sort = 1
+            avas = [tuple(ava) for ava in str2rdn(args[0])]
         elif ava_count == 1 and isinstance(args[0], RDN):
-            avas = args[0].to_openldap()
-        elif ava_count > 0:
-            sort = 1
-            for arg in args:
-                avas.append(get_ava(arg))
-        if sort:
-            sort_avas(avas)
-        return avas
+            return args[0]._avas
+        else:
+            avas = [get_ava(arg) for arg in args]
+        sort_avas(avas)
+        return tuple(avas)
 
     def to_openldap(self):
         return [list(a) for a in self._avas]
 
+    def __reduce__(self):
+        return self.__class__, tuple((ava.attr, ava.value) for ava in self)
+
     def __str__(self):
-        return dn2str([self.to_openldap()])
+        return dn2str((self._avas,))
 
     def __repr__(self):
         return "%s.%s('%s')" % (self.__module__, self.__class__.__name__, self.__str__())
@@ -877,12 +926,6 @@ class RDN(object):
             raise IndexError("No AVA's in this RDN")
         return val_decode(self._avas[0][0])
 
-    def _set_attr(self, new_attr):
-        if len(self._avas) == 0:
-            raise IndexError("No AVA's in this RDN")
-
-        self._avas[0][0] = val_encode(six.text_type(new_attr))
-
     attr  = property(_get_attr)
 
     def _get_value(self):
@@ -890,11 +933,6 @@ class RDN(object):
             raise IndexError("No AVA's in this RDN")
         return val_decode(self._avas[0][1])
 
-    def _set_value(self, new_value):
-        if len(self._avas) == 0:
-            raise IndexError("No AVA's in this RDN")
-        self._avas[0][1] = val_encode(six.text_type(new_value))
-
     value = property(_get_value)
 
     def __hash__(self):
@@ -932,21 +970,18 @@ class RDN(object):
         return rdn_key(self._avas) < rdn_key(other._avas)
 
     def __add__(self, other):
-        result = self.__class__(self)
         if isinstance(other, RDN):
-            for ava in other._avas:
-                result._avas.append((ava[0], ava[1], ava[2]))
+            avas = other._avas
         elif isinstance(other, AVA):
-            result._avas.append(other.to_openldap())
+            avas = (other._ava,)
         elif isinstance(other, six.string_types):
-            rdn = self.__class__(other)
-            for ava in rdn._avas:
-                result._avas.append((ava[0], ava[1], ava[2]))
+            avas = self.__class__(other)._avas
         else:
             raise TypeError("expected RDN, AVA or basestring but got %s" % (other.__class__.__name__))
 
-        sort_avas(result._avas)
-        return result
+        avas = list(self._avas + avas)
+        sort_avas(avas)
+        return self.__class__(*avas, **{'raw': True})
 
 
 @functools.total_ordering
@@ -1097,60 +1132,74 @@ class DN(object):
     syntax with proper escaping.
     '''
 
+    # RDNs are kept as tuples of raw AVA tuples, RDN and AVA objects are
+    # only created when the DN is indexed or iterated. The string form and
+    # the hash are computed on first use.
+    __slots__ = ('rdns', '_str', '_hash', '__weakref__')
+
     AVA_type = AVA
     RDN_type = RDN
 
     def __init__(self, *args, **kwds):
-        self.rdns = self._rdns_from_sequence(args)
-
-    def _copy_rdns(self, rdns=None):
-        if not rdns:
-            rdns = self.rdns
-        return [[list(a) for a in rdn] for rdn in rdns]
+        self._str = None
+        self._hash = None
+        if len(args) == 1 and isinstance(args[0], DN):
+            self.rdns = args[0].rdns
+            self._str = args[0]._str
+            self._hash = args[0]._hash
+        else:
+            self.rdns = self._rdns_from_sequence(args)
 
     def _rdns_from_value(self, value):
         if isinstance(value, six.string_types):
-            try:
-                if isinstance(value, six.text_type):
-                    value = val_encode(value)
-                rdns = str2dn(value)
-            except DECODING_ERROR:
-                raise ValueError("malformed RDN string = \"%s\"" % value)
-            for rdn in rdns:
-                sort_avas(rdn)
+            if isinstance(value, six.text_type):
+                value = val_encode(value)
+            rdns = _parse_cache.get(value)
+            if rdns is None:
+                try:
+                    parsed = str2dn(value)
+                except DECODING_ERROR:
+                    raise ValueError("malformed RDN string = \"%s\"" % value)
+                rdns = []
+                for rdn in parsed:
+                    rdn = [tuple(ava) for ava in rdn]
+                    sort_avas(rdn)
+                    rdns.append(tuple(rdn))
+                rdns = tuple(rdns)
+                _parse_cache.put(value, rdns)
         elif isinstance(value, DN):
-            rdns = value._copy_rdns()
+            rdns = value.rdns
         elif isinstance(value, (tuple, list, AVA)):
-            ava = get_ava(value)
-            rdns = [[ava]]
+            rdns = ((get_ava(value),),)
         elif isinstance(value, RDN):
-            rdns = [value.to_openldap()]
+            rdns = (value._avas,)
         else:
             raise TypeError("must be str, unicode, tuple, or RDN or DN, got %s instead" %
                             type(value))
         return rdns
 
     def _rdns_from_sequence(self, seq):
-        rdns = []
+        if len(seq) == 1:
+            return self._rdns_from_value(seq[0])
 
+        rdns = []
         for item in seq:
-            rdn = self._rdns_from_value(item)
-            rdns.extend(rdn)
-        return rdns
+            rdns.extend(self._rdns_from_value(item))
+        return tuple(rdns)
 
     def __deepcopy__(self, memo):
         return self
 
+    def __reduce__(self):
+        return self.__class__, (str(self),)
+
     def _get_rdn(self, rdn):
         return self.RDN_type(*rdn, **{'raw': True})
 
     def __str__(self):
-        try:
-            return dn2str(self.rdns)
-        except Exception as e:
-            print(len(self.rdns))
-            print(self.rdns)
-            raise
+        if self._str is None:
+            self._str = dn2str(self.rdns)
+        return self._str
 
     def __repr__(self):
         return "%s.%s('%s')" % (self.__module__, self.__class__.__name__, self.__str__())
@@ -1172,6 +1221,8 @@ class DN(object):
             cls = self.__class__
             new_dn = cls.__new__(cls)
             new_dn.rdns = self.rdns[key]
+            new_dn._str = None
+            new_dn._hash = None
             return new_dn
         elif isinstance(key, six.string_types):
             for rdn in self.rdns:
@@ -1190,12 +1241,15 @@ class DN(object):
         # hash value between two objects which compare as equal but
         # differ in case must yield the same hash value.
 
-        str_dn = ';,'.join([
-            '++'.join(
-                ['=='.join((atype, avalue or '')) for atype,avalue,dummy in rdn]
-            ) for rdn in self.rdns
-        ])
-        return hash(str_dn.lower())
+        if self._hash is None:
+            str_dn = ';,'.join([
+                '++'.join(
+                    ['=='.join((atype, avalue or ''))
+                     for atype, avalue, dummy in rdn]
+                ) for rdn in self.rdns
+            ])
+            self._hash = hash(str_dn.lower())
+        return self._hash
 
     def __eq__(self, other):
         # Try coercing to DN, if successful compare to coerced object
@@ -1413,3 +1467,19 @@ class DN(object):
         if i == -1:
             raise ValueError("pattern not found")
         return i
+
+
+def intern_dn(value):
+    '''
+    Return a canonical DN object equal to value.
+
+    DN objects are immutable, so code holding many copies of the same DN
+    (e.g. the member values of large groups) can share a single instance.
+    Interned DNs are kept only as long as something else references them.
+    The string form is used as the key, DNs differing only in case are
+    interned separately so that their representation is preserved.
+    '''
+    if not isinstance(value, DN):
+        value = DN(value)
+    key = (value.__class__, str(value))
+    return _interned.setdefault(key, value)
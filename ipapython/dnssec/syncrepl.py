@@ -5,8 +5,16 @@
 """
 This script implements a syncrepl consumer which syncs data from server
 to a local dict.
+
+The cookie and the entries can optionally be persisted in a SQLite database
+so that a restarted consumer resumes the synchronization from the last
+cookie instead of doing a full refresh.
 """
 
+import os
+import pickle
+import sqlite3
+
 # Import the python-ldap modules
 import ldap
 # Import specific classes from python-ldap
@@ -20,10 +28,17 @@ from ipapython import ipa_log_manager
 class SyncReplConsumer(ReconnectLDAPObject, SyncreplConsumer):
     """
     Syncrepl Consumer interface
+
+    If db_path is given, the cookie and the entries are stored in a SQLite
+    database. Entry changes are committed together with the cookie which
+    follows them, so the database always holds a consistent state. Stored
+    entries are passed to application_add() before the next syncrepl search
+    is started.
     """
 
     def __init__(self, *args, **kwargs):
         self.log = ipa_log_manager.log_mgr.get_logger(self)
+        db_path = kwargs.pop('db_path', None)
         # Initialise the LDAP Connection first
         ldap.ldapobject.ReconnectLDAPObject.__init__(self, *args, **kwargs)
         # Now prepare the data store
@@ -31,10 +46,93 @@ class SyncReplConsumer(ReconnectLDAPObject, SyncreplConsumer):
         self.__data['uuids'] = cidict()
         # We need this for later internal use
         self.__presentUUIDs = cidict()
+        self.__db = None
+        self.__db_path = db_path
+        self.__replayed = False
+        if db_path is not None:
+            self.__open_db()
+
+    def __open_db(self):
+        try:
+            self.__db = sqlite3.connect(self.__db_path)
+            self.__create_tables()
+            for key, value in self.__db.execute(
+                    'SELECT key, value FROM meta'):
+                self.__data[key] = pickle.loads(bytes(value))
+            for uuid, attributes in self.__db.execute(
+                    'SELECT uuid, attributes FROM entries'):
+                self.__data['uuids'][uuid] = cidict(
+                    pickle.loads(bytes(attributes)))
+        except (sqlite3.Error, pickle.UnpicklingError, ValueError) as e:
+            self.log.error('Unable to load sync state from %s, '
+                           'doing full refresh: %s', self.__db_path, e)
+            self.__close_db()
+            os.remove(self.__db_path)
+            self.__data = cidict()
+            self.__data['uuids'] = cidict()
+            self.__db = sqlite3.connect(self.__db_path)
+            self.__create_tables()
+        else:
+            self.log.debug('Loaded %d entries from %s',
+                           len(self.__data['uuids']), self.__db_path)
+
+    def __create_tables(self):
+        self.__db.execute(
+            'CREATE TABLE IF NOT EXISTS meta '
+            '(key TEXT PRIMARY KEY, value BLOB)')
+        self.__db.execute(
+            'CREATE TABLE IF NOT EXISTS entries '
+            '(uuid TEXT PRIMARY KEY, attributes BLOB)')
+        self.__db.commit()
+
+    def __close_db(self):
+        if self.__db is not None:
+            self.__db.close()
+            self.__db = None
+
+    def __db_set(self, key, value):
+        if self.__db is not None:
+            self.__db.execute(
+                'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                (key, sqlite3.Binary(pickle.dumps(value, 2))))
 
     def close_db(self):
-        # This is useless for dict
-        pass
+        # Uncommitted changes are not covered by the stored cookie yet,
+        # they will be sent by the server again
+        self.__close_db()
+
+    def clear_db(self):
+        """
+        Drop the stored state, the next search will do a full refresh.
+        """
+        self.__data = cidict()
+        self.__data['uuids'] = cidict()
+        if self.__db is not None:
+            self.__db.execute('DELETE FROM meta')
+            self.__db.execute('DELETE FROM entries')
+            self.__db.commit()
+
+    def syncrepl_search(self, base, scope, *args, **kwargs):
+        # The stored state is only valid for the same search
+        search = repr((base, scope, kwargs.get('filterstr'),
+                       kwargs.get('attrlist')))
+        if self.__data.get('search', search) != search:
+            self.log.info('Search parameters changed, doing full refresh')
+            self.clear_db()
+        if self.__db is not None and 'search' not in self.__data:
+            self.__data['search'] = search
+            self.__db_set('search', search)
+            self.__db.commit()
+
+        if not self.__replayed:
+            self.__replayed = True
+            for uuid, attributes in list(self.__data['uuids'].items()):
+                self.log.debug('Restoring entry: %s %s',
+                               attributes['dn'], uuid)
+                self.application_add(uuid, attributes['dn'], attributes)
+
+        return SyncreplConsumer.syncrepl_search(
+            self, base, scope, *args, **kwargs)
 
     def syncrepl_get_cookie(self):
         if 'cookie' in self.__data:
@@ -47,6 +145,9 @@ class SyncReplConsumer(ReconnectLDAPObject, SyncreplConsumer):
     def syncrepl_set_cookie(self, cookie):
         self.log.debug('New cookie is: %s', cookie)
         self.__data['cookie'] = cookie
+        if self.__db is not None:
+            self.__db_set('cookie', cookie)
+            self.__db.commit()
 
     def syncrepl_entry(self, dn, attributes, uuid):
         attributes = cidict(attributes)
@@ -62,6 +163,13 @@ class SyncReplConsumer(ReconnectLDAPObject, SyncreplConsumer):
         # (including the DN as an attribute for convenience)
         attributes['dn'] = dn
         self.__data['uuids'][uuid] = attributes
+        if self.__db is not None:
+            self.__db.execute(
+                'INSERT OR REPLACE INTO entries (uuid, attributes) '
+                'VALUES (?, ?)',
+                (uuid, sqlite3.Binary(pickle.dumps(
+                    dict((k, attributes[k]) for k in attributes.keys()),
+                    2))))
         # Debugging
         self.log.debug('Detected %s of entry: %s %s', change_type, dn, uuid)
         if change_type == 'modify':
@@ -79,6 +187,9 @@ class SyncReplConsumer(ReconnectLDAPObject, SyncreplConsumer):
             self.log.debug('Detected deletion of entry: %s %s', dn, uuid)
             self.application_del(uuid, dn, attributes)
             del self.__data['uuids'][uuid]
+            if self.__db is not None:
+                self.__db.execute('DELETE FROM entries WHERE uuid = ?',
+                                  (uuid,))
 
     def syncrepl_present(self, uuids, refreshDeletes=False):
         # If we have not been given any UUID values,
@@ -18,9 +18,15 @@
 #
 
 import collections
+import select
+import socket
+import threading
+import time
 import xml.dom.minidom
 
+import nss.io as nss_io
 import nss.nss as nss
+from nss.error import NSPRError
 import six
 from six.moves.urllib.parse import urlencode
 
@@ -49,6 +55,18 @@ INCLUDED_PROFILES = {
 
 DEFAULT_PROFILE = u'caIPAserviceCert'
 
+# Seconds an idle connection is kept open for reuse. Dogtag (Tomcat) closes
+# idle keep-alive connections after 20 seconds by default.
+CONNECTION_IDLE_TIMEOUT = 15
+
+# Maximum number of idle connections kept per server and client certificate
+CONNECTION_POOL_SIZE = 4
+
+# Requests which may be sent again if a reused connection fails after the
+# request was sent. Others, e.g. certificate requests, may have already
+# been processed by the server.
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD'])
+
 
 def error_from_xml(doc, message_template):
     try:
@@ -124,12 +142,167 @@ def ca_status(ca_host=None):
     return _parse_ca_status(body)
 
 
+class ConnectionPool(object):
+    """
+    Pool of keep-alive HTTPS connections
+
+    Idle connections are kept per key, which identifies the server and the
+    client certificate, for up to ``idle_timeout`` seconds, so that
+    subsequent requests do not need a new TLS handshake. An idle connection
+    which the server closed in the meantime is detected before it is reused
+    and replaced by a new one. A request which could not be sent over a
+    reused connection is sent again over a new connection. If only the
+    response is missing, the request is sent again only if its method is
+    in IDEMPOTENT_METHODS.
+    """
+
+    def __init__(self, idle_timeout=CONNECTION_IDLE_TIMEOUT,
+                 max_idle=CONNECTION_POOL_SIZE):
+        self.idle_timeout = idle_timeout
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._stats = collections.Counter()
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                conn, last_used = idle.pop()
+                if now - last_used < self.idle_timeout:
+                    return conn
+                conn.close()
+        return None
+
+    def _put(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append((conn, time.time()))
+                return
+        conn.close()
+
+    def clear(self):
+        """
+        Close all idle connections
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn, _last_used in conns:
+                conn.close()
+
+    def stats(self):
+        """
+        Return request and connection counters and the total request time
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = sum(len(c) for c in self._idle.values())
+        for name in ('requests', 'connections', 'reused', 'stale'):
+            stats.setdefault(name, 0)
+        stats.setdefault('time', 0.0)
+        return stats
+
+    def request(self, key, connection_factory, host, port, method, uri,
+                body, headers):
+        """
+        Perform a HTTP request over a pooled connection
+
+        :return: (http_status, http_headers, http_body)
+        """
+        start = time.time()
+        counts = collections.Counter(requests=1)
+        try:
+            conn = self._get(key)
+            while conn is not None and _is_stale(conn):
+                root_logger.debug('stale connection to %s', uri)
+                counts['stale'] += 1
+                conn.close()
+                conn = self._get(key)
+            if conn is not None:
+                counts['reused'] += 1
+                sent = False
+                try:
+                    conn.request(method, uri, body=body, headers=headers)
+                    sent = True
+                    result = _read_response(conn)
+                except (httplib.BadStatusLine, socket.error, NSPRError) as e:
+                    # the server has most likely closed the idle connection
+                    if sent and method.upper() not in IDEMPOTENT_METHODS:
+                        # but it may have processed the request
+                        conn.close()
+                        raise
+                    root_logger.debug('stale connection to %s: %s', uri, e)
+                    counts['stale'] += 1
+                    conn.close()
+                    conn = None
+                except Exception:
+                    conn.close()
+                    raise
+
+            if conn is None:
+                counts['connections'] += 1
+                conn = connection_factory(host, port)
+                try:
+                    result = _send_request(conn, method, uri, body, headers)
+                except Exception:
+                    conn.close()
+                    raise
+
+            http_status, http_headers, http_body, will_close = result
+            if will_close:
+                conn.close()
+            else:
+                self._put(key, conn)
+        finally:
+            counts['time'] = time.time() - start
+            with self._lock:
+                self._stats.update(counts)
+
+        return http_status, http_headers, http_body
+
+
+def _is_stale(conn):
+    """
+    Check if the server has closed an idle connection
+
+    No data is expected on an idle connection, so if its socket is readable,
+    the server has closed it or sent something the client cannot use.
+    """
+    sock = conn.sock
+    if sock is None:
+        return True
+    try:
+        if isinstance(sock, nss_io.Socket):
+            flags = nss_io.Socket.poll(((sock, nss_io.PR_POLL_READ),),
+                                       nss_io.PR_INTERVAL_NO_WAIT)
+            return bool(flags[0])
+        readable, _writable, _errors = select.select([sock], [], [], 0)
+    except (select.error, socket.error, NSPRError):
+        return True
+    return bool(readable)
+
+
+def _send_request(conn, method, uri, body, headers):
+    conn.request(method, uri, body=body, headers=headers)
+    return _read_response(conn)
+
+
+def _read_response(conn):
+    res = conn.getresponse()
+    http_body = res.read()
+    return res.status, res.msg.dict, http_body, res.will_close
+
+
 def https_request(host, port, url, secdir, password, nickname,
-        method='POST', headers=None, body=None, **kw):
+        method='POST', headers=None, body=None, connection_pool=None, **kw):
     """
     :param method: HTTP request method (defalut: 'POST')
     :param url: The path (not complete URL!) to post to.
     :param body: The request body (encodes kw if None)
+    :param connection_pool: `ConnectionPool` to take the connection from
     :param kw:  Keyword arguments to encode into POST body.
     :return:   (http_status, http_headers, http_body)
                as (integer, dict, str)
@@ -137,6 +310,12 @@ def https_request(host, port, url, secdir, password, nickname,
     Perform a client authenticated HTTPS request
     """
 
+    if connection_pool is not None and secdir != nsslib.current_dbdir:
+        # NSS is going to be initialized with another database. It cannot
+        # be shut down while there are open connections, and connections
+        # of the old database cannot be used anymore.
+        connection_pool.clear()
+
     def connection_factory(host, port):
         no_init = secdir == nsslib.current_dbdir
         conn = nsslib.NSSConnection(host, port, dbdir=secdir, no_init=no_init,
@@ -153,7 +332,8 @@ def https_request(host, port, url, secdir, password, nickname,
         body = urlencode(kw)
     return _httplib_request(
         'https', host, port, url, connection_factory, body,
-        method=method, headers=headers)
+        method=method, headers=headers, connection_pool=connection_pool,
+        pool_key=(host, port, secdir, nickname))
 
 
 def http_request(host, port, url, **kw):
@@ -172,12 +352,14 @@ def http_request(host, port, url, **kw):
 
 def _httplib_request(
         protocol, host, port, path, connection_factory, request_body,
-        method='POST', headers=None):
+        method='POST', headers=None, connection_pool=None, pool_key=None):
     """
     :param request_body: Request body
     :param connection_factory: Connection class to use. Will be called
         with the host and port arguments.
     :param method: HTTP request method (default: 'POST')
+    :param connection_pool: `ConnectionPool` to take the connection from
+    :param pool_key: Key of the connection in ``connection_pool``
 
     Perform a HTTP(s) request.
     """
@@ -195,14 +377,19 @@ def _httplib_request(
         headers['content-type'] = 'application/x-www-form-urlencoded'
 
     try:
-        conn = connection_factory(host, port)
-        conn.request(method, uri, body=request_body, headers=headers)
-        res = conn.getresponse()
-
-        http_status = res.status
-        http_headers = res.msg.dict
-        http_body = res.read()
-        conn.close()
+        if connection_pool is not None:
+            http_status, http_headers, http_body = connection_pool.request(
+                pool_key, connection_factory, host, port, method, uri,
+                request_body, headers)
+        else:
+            conn = connection_factory(host, port)
+            conn.request(method, uri, body=request_body, headers=headers)
+            res = conn.getresponse()
+
+            http_status = res.status
+            http_headers = res.msg.dict
+            http_body = res.read()
+            conn.close()
     except Exception as e:
         raise NetworkError(uri=uri, error=str(e))
 
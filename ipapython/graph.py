@@ -2,6 +2,8 @@
 # Copyright (C) 2015  FreeIPA Contributors see COPYING for license
 #
 
+from collections import deque
+
 
 class Graph():
     """
@@ -9,16 +11,21 @@ class Graph():
 
     G = (V, E) where G is graph, V set of vertices and E list of edges.
     E = (tail, head) where tail and head are vertices
+
+    Adjacency lists are kept in both directions, so looking up the heads or
+    tails of a vertex does not need to scan the edge list.
     """
 
     def __init__(self):
         self.vertices = set()
         self.edges = []
         self._adj = dict()
+        self._radj = dict()
 
     def add_vertex(self, vertex):
         self.vertices.add(vertex)
         self._adj[vertex] = []
+        self._radj[vertex] = []
 
     def add_edge(self, tail, head):
         if tail not in self.vertices:
@@ -27,14 +34,16 @@ class Graph():
             raise ValueError("head is not a vertex")
         self.edges.append((tail, head))
         self._adj[tail].append(head)
+        self._radj[head].append(tail)
 
     def remove_edge(self, tail, head):
         try:
             self.edges.remove((tail, head))
-        except KeyError:
+        except ValueError:
             raise ValueError(
                 "graph does not contain edge: (%s, %s)" % (tail, head))
         self._adj[tail].remove(head)
+        self._radj[head].remove(tail)
 
     def remove_vertex(self, vertex):
         try:
@@ -42,10 +51,15 @@ class Graph():
         except KeyError:
             raise ValueError("graph does not contain vertex: %s" % vertex)
 
-        # delete _adjacencies
-        del self._adj[vertex]
-        for key, _adj in self._adj.items():
-            _adj[:] = [v for v in _adj if v != vertex]
+        # delete adjacencies, only the neighbours need to be updated
+        for head in set(self._adj.pop(vertex)):
+            if head != vertex:
+                self._radj[head][:] = [
+                    v for v in self._radj[head] if v != vertex]
+        for tail in set(self._radj.pop(vertex)):
+            if tail != vertex:
+                self._adj[tail][:] = [
+                    v for v in self._adj[tail] if v != vertex]
 
         # delete edges
         edges = [e for e in self.edges if e[0] != vertex and e[1] != vertex]
@@ -55,13 +69,13 @@ class Graph():
         """
         Get list of vertices where a vertex is on the right side of an edge
         """
-        return [e[0] for e in self.edges if e[1] == head]
+        return list(self._radj.get(head, []))
 
     def get_heads(self, tail):
         """
         Get list of vertices where a vertex is on the left side of an edge
         """
-        return [e[1] for e in self.edges if e[0] == tail]
+        return list(self._adj.get(tail, []))
 
     def bfs(self, start=None):
         """
@@ -70,11 +84,94 @@ class Graph():
         """
         if not start:
             start = list(self.vertices)[0]
-        visited = set()
-        queue = [start]
+        visited = set([start])
+        queue = deque([start])
         while queue:
-            vertex = queue.pop(0)
-            if vertex not in visited:
-                visited.add(vertex)
-                queue.extend(set(self._adj.get(vertex, [])) - visited)
+            vertex = queue.popleft()
+            for head in self._adj.get(vertex, []):
+                if head not in visited:
+                    visited.add(head)
+                    queue.append(head)
         return visited
+
+    def strongly_connected_components(self, exclude=()):
+        """
+        Find strongly connected components of the graph (Tarjan's algorithm).
+
+        Vertices in `exclude` are treated as if they were removed from the
+        graph. Return a list of sets of vertices, a component is always
+        listed after all components reachable from it.
+        """
+        exclude = set(exclude)
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        components = []
+
+        for root in self.vertices:
+            if root in index or root in exclude:
+                continue
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self._adj[root]))]
+            while work:
+                vertex, heads = work[-1]
+                for head in heads:
+                    if head in exclude:
+                        continue
+                    if head not in index:
+                        index[head] = lowlink[head] = len(index)
+                        stack.append(head)
+                        on_stack.add(head)
+                        work.append((head, iter(self._adj[head])))
+                        break
+                    elif head in on_stack:
+                        lowlink[vertex] = min(lowlink[vertex], index[head])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent],
+                                              lowlink[vertex])
+                    if lowlink[vertex] == index[vertex]:
+                        component = set()
+                        while True:
+                            member = stack.pop()
+                            on_stack.remove(member)
+                            component.add(member)
+                            if member == vertex:
+                                break
+                        components.append(component)
+
+        return components
+
+    def reachability(self, exclude=()):
+        """
+        Find the vertices reachable from each vertex of the graph.
+
+        Vertices in `exclude` are treated as if they were removed from the
+        graph. Return a dict mapping each remaining vertex to a frozenset of
+        vertices reachable from it (including the vertex itself). Vertices
+        in the same strongly connected component share the set.
+        """
+        exclude = set(exclude)
+        component_of = {}
+        reachable = []
+
+        for i, component in enumerate(
+                self.strongly_connected_components(exclude)):
+            for vertex in component:
+                component_of[vertex] = i
+            visited = set(component)
+            for vertex in component:
+                for head in self._adj[vertex]:
+                    if head in exclude:
+                        continue
+                    j = component_of[head]
+                    if j != i:
+                        visited.update(reachable[j])
+            reachable.append(frozenset(visited))
+
+        return dict((v, reachable[i]) for v, i in component_of.items())
@@ -27,6 +27,7 @@ import contextlib
 import collections
 import os
 import pwd
+import threading
 
 import ldap
 import ldap.sasl
@@ -189,6 +190,146 @@ class SchemaCache(object):
 schema_cache = SchemaCache()
 
 
+class LDAPConnectionPool(object):
+    '''
+    Pool of authenticated python-ldap connections.
+
+    Connections are pooled per key (typically the Kerberos principal the
+    connection is bound as). A connection is checked out with get() and
+    handed back with put(); connections that are not returned are simply
+    forgotten. Idle connections are unbound when they exceed idle_timeout
+    or when the pool grows above max_size, least recently used first.
+
+    Before an idle connection is handed out again, it is checked with a
+    "Who am I?" extended operation; connections failing the check are
+    discarded.
+    '''
+
+    def __init__(self, max_size, idle_timeout):
+        self.log = log_mgr.get_logger(self)
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+
+        self._lock = threading.Lock()
+        # key -> list of (conn, last_used) pairs, most recently used last
+        self._idle = {}
+        self._size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.failed_checks = 0
+
+    def get(self, key):
+        '''
+        Return a healthy idle connection for key or None.
+        '''
+        while True:
+            conn = None
+            with self._lock:
+                evicted = self._evict_expired()
+                conns = self._idle.get(key)
+                if conns:
+                    conn, _last_used = conns.pop()
+                    if not conns:
+                        del self._idle[key]
+                    self._size -= 1
+                else:
+                    self.misses += 1
+            for old_conn in evicted:
+                self._unbind(old_conn)
+
+            if conn is None:
+                return None
+            if self._check(conn):
+                with self._lock:
+                    self.hits += 1
+                return conn
+
+            with self._lock:
+                self.failed_checks += 1
+            self._unbind(conn)
+
+    def put(self, key, conn):
+        '''
+        Return conn bound for key to the pool.
+        '''
+        evicted = []
+        with self._lock:
+            self._idle.setdefault(key, []).append((conn, time.time()))
+            self._size += 1
+            evicted.extend(self._evict_expired())
+            while self._size > self.max_size:
+                evicted.append(self._pop_oldest())
+        for old_conn in evicted:
+            self._unbind(old_conn)
+
+    def clear(self):
+        '''
+        Unbind all idle connections.
+        '''
+        with self._lock:
+            conns = [conn for entries in self._idle.values()
+                     for conn, _last_used in entries]
+            self._idle.clear()
+            self._size = 0
+        for conn in conns:
+            self._unbind(conn)
+
+    def stats(self):
+        '''
+        Return a dict of pool counters.
+        '''
+        with self._lock:
+            return dict(size=self._size, hits=self.hits, misses=self.misses,
+                        evictions=self.evictions,
+                        failed_checks=self.failed_checks)
+
+    def _pop_oldest(self):
+        oldest_key = None
+        oldest_time = None
+        for key, entries in self._idle.items():
+            last_used = entries[0][1]
+            if oldest_time is None or last_used < oldest_time:
+                oldest_key, oldest_time = key, last_used
+        entries = self._idle[oldest_key]
+        conn, _last_used = entries.pop(0)
+        if not entries:
+            del self._idle[oldest_key]
+        self._size -= 1
+        self.evictions += 1
+        return conn
+
+    def _evict_expired(self):
+        # caller must hold self._lock; returns the connections to unbind
+        evicted = []
+        deadline = time.time() - self.idle_timeout
+        for key in list(self._idle):
+            entries = self._idle[key]
+            while entries and entries[0][1] < deadline:
+                conn, _last_used = entries.pop(0)
+                evicted.append(conn)
+                self._size -= 1
+                self.evictions += 1
+            if not entries:
+                del self._idle[key]
+        return evicted
+
+    def _check(self, conn):
+        try:
+            conn.whoami_s()
+        except ldap.LDAPError as e:
+            self.log.debug('discarding pooled connection %s: %s', conn, e)
+            return False
+        return True
+
+    def _unbind(self, conn):
+        try:
+            conn.unbind_s()
+        except ldap.LDAPError:
+            pass
+
+
 class LDAPEntry(collections.MutableMapping):
     __slots__ = ('_conn', '_dn', '_names', '_nice', '_raw', '_sync',
                  '_not_list', '_orig', '_raw_view', '_single_value_view')
@@ -1334,13 +1475,58 @@ class LDAPClient(object):
         :raises: errors.NotFound if result set is empty
                                  or base_dn doesn't exist
         """
+        res = []
+        truncated = False
+
+        for item in self._iter_search(filter, attrs_list, base_dn, scope,
+                                      time_limit, size_limit, search_refs,
+                                      paged_search):
+            if isinstance(item, LDAPEntry):
+                res.append(item)
+            else:
+                truncated = item
+
+        if not res and not truncated:
+            raise errors.EmptyResult(reason='no matching entry found')
+
+        return (res, truncated)
+
+    def iter_entries(self, filter=None, attrs_list=None, base_dn=None,
+                     scope=ldap.SCOPE_SUBTREE, time_limit=None,
+                     size_limit=None, search_refs=False, paged_search=False):
+        """
+        Generate entries matching specified search parameters.
+
+        Unlike find_entries(), entries are yielded as soon as they are
+        received from the server, so with paged_search only a single page
+        of results is kept in memory. If the generator is closed before
+        it is exhausted, the search is abandoned on the server.
+
+        The keyword arguments are the same as in find_entries().
+
+        :raises: errors.LimitsExceeded after the last entry if the search
+                 hit a server limit
+        :raises: errors.NotFound if base_dn doesn't exist
+        """
+        for item in self._iter_search(filter, attrs_list, base_dn, scope,
+                                      time_limit, size_limit, search_refs,
+                                      paged_search):
+            if isinstance(item, LDAPEntry):
+                yield item
+            else:
+                self.handle_truncated_result(item)
+
+    def _iter_search(self, filter, attrs_list, base_dn, scope, time_limit,
+                     size_limit, search_refs, paged_search):
+        """
+        Generate the LDAPEntry objects returned by a search. If the results
+        were truncated, the truncated flag is generated last.
+        """
         if base_dn is None:
             base_dn = DN()
         assert isinstance(base_dn, DN)
         if not filter:
             filter = '(objectClass=*)'
-        res = []
-        truncated = False
 
         if time_limit is None:
             time_limit = self.time_limit
@@ -1374,6 +1560,7 @@ class LDAPClient(object):
                 if paged_search:
                     sctrls = [SimplePagedResultsControl(0, page_size, cookie)]
 
+                id = None
                 try:
                     id = self.conn.search_ext(
                         str(base_dn), scope, filter, attrs_list,
@@ -1389,7 +1576,8 @@ class LDAPClient(object):
                         if (objtype == ldap.RES_SEARCH_ENTRY or
                                 (search_refs and
                                     objtype == ldap.RES_SEARCH_REFERENCE)):
-                            res.append(res_list[0])
+                            yield res_list[0]
+                    id = None
 
                     if paged_search:
                         # Get cookie for the next page
@@ -1400,42 +1588,56 @@ class LDAPClient(object):
                         else:
                             cookie = ''
                 except ldap.ADMINLIMIT_EXCEEDED:
-                    truncated = TRUNCATED_ADMIN_LIMIT
+                    yield TRUNCATED_ADMIN_LIMIT
                     break
                 except ldap.SIZELIMIT_EXCEEDED:
-                    truncated = TRUNCATED_SIZE_LIMIT
+                    yield TRUNCATED_SIZE_LIMIT
                     break
                 except ldap.TIMELIMIT_EXCEEDED:
-                    truncated = TRUNCATED_TIME_LIMIT
+                    yield TRUNCATED_TIME_LIMIT
                     break
                 except ldap.LDAPError as e:
                     # If paged search is in progress, try to cancel it
                     if paged_search and cookie:
-                        sctrls = [SimplePagedResultsControl(0, 0, cookie)]
-                        try:
-                            self.conn.search_ext_s(
-                                str(base_dn), scope, filter, attrs_list,
-                                serverctrls=sctrls, timeout=time_limit,
-                                sizelimit=size_limit)
-                        except ldap.LDAPError as e:
-                            self.log.warning(
-                                "Error cancelling paged search: %s", e)
+                        self._cancel_paged_search(
+                            base_dn, scope, filter, attrs_list, time_limit,
+                            size_limit, cookie)
                         cookie = ''
 
                     try:
                         raise e
                     except (ldap.ADMINLIMIT_EXCEEDED, ldap.TIMELIMIT_EXCEEDED,
                             ldap.SIZELIMIT_EXCEEDED):
-                        truncated = True
+                        yield True
                         break
+                except GeneratorExit:
+                    # The caller stopped consuming results, abandon the
+                    # running search and cancel the paged search
+                    if id is not None:
+                        try:
+                            self.conn.abandon(id)
+                        except ldap.LDAPError as e:
+                            self.log.warning("Error abandoning search: %s", e)
+                    if paged_search and cookie:
+                        self._cancel_paged_search(
+                            base_dn, scope, filter, attrs_list, time_limit,
+                            size_limit, cookie)
+                    raise
 
                 if not paged_search or not cookie:
                     break
 
-        if not res and not truncated:
-            raise errors.EmptyResult(reason='no matching entry found')
-
-        return (res, truncated)
+    def _cancel_paged_search(self, base_dn, scope, filter, attrs_list,
+                             time_limit, size_limit, cookie):
+        sctrls = [SimplePagedResultsControl(0, 0, cookie)]
+        try:
+            self.conn.search_ext_s(
+                str(base_dn), scope, filter, attrs_list,
+                serverctrls=sctrls, timeout=time_limit,
+                sizelimit=size_limit)
+        except ldap.LDAPError as e:
+            self.log.warning(
+                "Error cancelling paged search: %s", e)
 
     def find_entry_by_attr(self, attr, value, object_class, attrs_list=None,
                            base_dn=None):
@@ -1542,6 +1744,103 @@ class LDAPClient(object):
 
         entry.reset_modlist()
 
+    def get_entry_async(self, dn, attrs_list=None, time_limit=None):
+        """
+        Send a search for the entry at dn without waiting for the result.
+
+        Returns a message ID to pass to get_async_result().
+        """
+        assert isinstance(dn, DN)
+
+        if time_limit is None:
+            time_limit = self.time_limit
+        if time_limit == 0:
+            time_limit = -1.0
+        if attrs_list:
+            attrs_list = [a.lower() for a in set(attrs_list)]
+
+        with self.error_handler():
+            if six.PY2:
+                attrs_list = self.encode(attrs_list)
+            return self.conn.search_ext(
+                str(dn), self.SCOPE_BASE, '(objectClass=*)', attrs_list,
+                timeout=float(time_limit))
+
+    def find_entries_async(self, filter=None, attrs_list=None, base_dn=None,
+                           scope=ldap.SCOPE_SUBTREE, time_limit=None,
+                           size_limit=None):
+        """
+        Send a search without waiting for the result. Unlike
+        find_entries(), the search is not paged.
+
+        Returns a message ID to pass to get_async_result().
+        """
+        if base_dn is None:
+            base_dn = DN()
+        assert isinstance(base_dn, DN)
+        if not filter:
+            filter = '(objectClass=*)'
+
+        if time_limit is None:
+            time_limit = self.time_limit
+        if time_limit == 0:
+            time_limit = -1.0
+        if size_limit is None:
+            size_limit = self.size_limit
+        if attrs_list:
+            attrs_list = [a.lower() for a in set(attrs_list)]
+
+        with self.error_handler():
+            if six.PY2:
+                filter = self.encode(filter)
+                attrs_list = self.encode(attrs_list)
+            return self.conn.search_ext(
+                str(base_dn), scope, filter, attrs_list,
+                timeout=float(time_limit), sizelimit=int(size_limit))
+
+    def add_entry_async(self, entry):
+        """
+        Send the creation of a new entry without waiting for the result.
+
+        Returns a message ID to pass to get_async_result().
+        """
+        # remove all [] values (python-ldap hates 'em)
+        attrs = dict((k, v) for k, v in entry.raw.items() if v)
+
+        with self.error_handler():
+            attrs = self.encode(attrs)
+            return self.conn.add_ext(str(entry.dn), list(attrs.items()))
+
+    def update_entry_async(self, entry):
+        """
+        Send the update of entry's attributes without waiting for the
+        result. Unlike update_entry(), the modlist of entry is not reset.
+
+        Returns a message ID to pass to get_async_result().
+        """
+        modlist = entry.generate_modlist()
+        if not modlist:
+            raise errors.EmptyModlist()
+
+        with self.error_handler():
+            modlist = [(a, str(b), self.encode(c))
+                       for a, b, c in modlist]
+            return self.conn.modify_ext(str(entry.dn), modlist)
+
+    def get_async_result(self, msgid):
+        """
+        Wait for the result of an operation sent by one of the *_async()
+        methods.
+
+        Returns the list of entries found by a search, an empty list for
+        other operations.
+
+        :raises: errors.NotFound if the searched entry doesn't exist
+        """
+        with self.error_handler():
+            result = self.conn.result3(msgid)[1]
+        return self._convert_result(result or [])
+
     def delete_entry(self, entry_or_dn):
         """Delete an entry given either the DN or the entry itself"""
         if isinstance(entry_or_dn, DN):
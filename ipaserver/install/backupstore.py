@@ -0,0 +1,222 @@
+#
+# Copyright (C) 2016  FreeIPA Contributors see COPYING for license
+#
+"""
+Content-addressed chunk store for incremental backups.
+
+Incremental backups do not archive the backed up files. Their content is
+split into chunks which are stored, compressed, in a chunk store shared by
+all incremental backups and named by the SHA-256 hash of their data. Each
+backup contains a manifest listing its files and their chunks, so chunks
+which did not change since a previous backup are not written again.
+
+Chunk boundaries are determined by the content, a chunk ends after a line
+whose checksum matches CHUNK_MASK, so that data inserted into a file (e.g.
+an entry added to an LDIF) changes only the chunks around it.
+"""
+
+import errno
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+
+from ipapython import admintool
+
+MANIFEST_FILE = 'manifest'
+MANIFEST_VERSION = 1
+CHUNK_STORE_DIR = 'chunks'
+
+CHUNK_MIN_SIZE = 64 * 1024
+CHUNK_MAX_SIZE = 4 * 1024 * 1024
+# a chunk ends after 1 of 8192 lines on average
+CHUNK_MASK = 0x1fff
+
+
+class ChunkError(admintool.ScriptError):
+    pass
+
+
+def iter_chunks(fileobj):
+    """
+    Split the content of a binary file object into chunks.
+    """
+    pieces = []
+    size = 0
+    while True:
+        line = fileobj.readline(CHUNK_MAX_SIZE)
+        if not line:
+            break
+        pieces.append(line)
+        size += len(line)
+        if (size >= CHUNK_MAX_SIZE or
+                (size >= CHUNK_MIN_SIZE and
+                 zlib.crc32(line) & CHUNK_MASK == 0)):
+            yield b''.join(pieces)
+            pieces = []
+            size = 0
+    if pieces:
+        yield b''.join(pieces)
+
+
+class ChunkStore(object):
+    """
+    Directory with compressed chunks, named by the hash of their data
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def for_backup(cls, backup_dir):
+        """
+        Return the chunk store of incremental backups stored next to
+        backup_dir.
+        """
+        return cls(os.path.join(os.path.dirname(os.path.abspath(backup_dir)),
+                                CHUNK_STORE_DIR))
+
+    def _chunk_path(self, digest):
+        return os.path.join(self.path, digest[:2], digest[2:])
+
+    def put(self, data):
+        """
+        Store a chunk unless it is stored already.
+
+        Returns a tuple (digest, number of bytes written).
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._chunk_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+
+        dirname = os.path.dirname(path)
+        try:
+            os.makedirs(dirname, 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        # chunks are written to a temporary file first so that an
+        # interrupted backup does not leave a truncated chunk behind
+        data = zlib.compress(data)
+        fd, tmpname = tempfile.mkstemp(dir=dirname, prefix='.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.rename(tmpname, path)
+        except:
+            os.unlink(tmpname)
+            raise
+        return digest, len(data)
+
+    def get(self, digest):
+        """
+        Return the data of a chunk.
+
+        :raises: ChunkError if the chunk is missing or damaged
+        """
+        try:
+            with open(self._chunk_path(digest), 'rb') as f:
+                data = zlib.decompress(f.read())
+        except (IOError, OSError) as e:
+            raise ChunkError("Cannot read chunk %s: %s" % (digest, e))
+        except zlib.error as e:
+            raise ChunkError("Chunk %s is damaged: %s" % (digest, e))
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ChunkError("Chunk %s is damaged: hash mismatch" % digest)
+        return data
+
+
+def create_manifest(store, source_dir, filename):
+    """
+    Store the content of source_dir in the chunk store and write the
+    manifest describing it to filename.
+
+    Returns a tuple (bytes backed up, bytes of new chunks written).
+    """
+    entries = []
+    total = 0
+    written = 0
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        files.sort()
+        for name in dirs + files:
+            path = os.path.join(root, name)
+            st = os.lstat(path)
+            entry = {
+                'path': os.path.relpath(path, source_dir),
+                'mode': st.st_mode & 0o7777,
+            }
+            if os.path.islink(path):
+                entry['type'] = 'symlink'
+                entry['target'] = os.readlink(path)
+            elif os.path.isdir(path):
+                entry['type'] = 'dir'
+            else:
+                entry['type'] = 'file'
+                entry['chunks'] = []
+                with open(path, 'rb') as f:
+                    for data in iter_chunks(f):
+                        digest, size = store.put(data)
+                        entry['chunks'].append(digest)
+                        total += len(data)
+                        written += size
+            entries.append(entry)
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'files': entries,
+    }
+    with open(filename, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+    return total, written
+
+
+def read_manifest(filename):
+    with open(filename) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ChunkError("Unsupported manifest version %s in %s" %
+                         (manifest.get('version'), filename))
+    return manifest
+
+
+def restore_manifest(store, manifest, target_dir):
+    """
+    Recreate the files described by the manifest in target_dir.
+    """
+    for entry in manifest['files']:
+        path = os.path.join(target_dir, entry['path'])
+        if entry['type'] == 'dir':
+            os.mkdir(path)
+        elif entry['type'] == 'symlink':
+            os.symlink(entry['target'], path)
+            continue
+        else:
+            with open(path, 'wb') as f:
+                for digest in entry['chunks']:
+                    f.write(store.get(digest))
+        os.chmod(path, entry['mode'])
+
+
+def verify_manifest(store, manifest):
+    """
+    Check that all chunks of the manifest are present and intact.
+
+    Returns a list of error messages, empty if the backup is intact.
+    """
+    problems = []
+    checked = set()
+    for entry in manifest['files']:
+        for digest in entry.get('chunks', ()):
+            if digest in checked:
+                continue
+            checked.add(digest)
+            try:
+                store.get(digest)
+            except ChunkError as e:
+                problems.append("%s: %s" % (entry['path'], e))
+    return problems
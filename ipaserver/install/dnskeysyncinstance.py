@@ -507,4 +507,10 @@ class DNSKeySyncInstance(service.Service):
         except Exception:
             pass
 
+        # the stored sync state belongs to the old installation
+        try:
+            os.remove(paths.IPA_DNSKEYSYNCD_DB)
+        except Exception:
+            pass
+
         installutils.remove_keytab(paths.IPA_DNSKEYSYNCD_KEYTAB)
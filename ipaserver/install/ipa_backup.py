@@ -17,8 +17,11 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import locale
 import os
 import shutil
+import signal
+import subprocess
 import tempfile
 import time
 import pwd
@@ -32,8 +35,10 @@ from ipapython import version
 from ipapython.ipautil import run, write_tmp_file
 from ipapython import admintool
 from ipapython.dn import DN
+from ipapython.ipa_log_manager import root_logger
 from ipaserver.install.replication import wait_for_task
 from ipaserver.install import installutils
+from ipaserver.install import backupstore
 from ipaserver.session import ISO8601_DATETIME_FMT
 from ipapython import ipaldap
 from ipalib.constants import CACERT
@@ -62,14 +67,18 @@ EOF
 """
 
 
-def encrypt_file(filename, keyring, remove_original=True):
-    source = filename
-    dest = filename + '.gpg'
-
+def encrypt_command(keyring, dest=None):
+    """
+    Return the gpg command encrypting a file given as the last argument.
+    Without it gpg reads the standard input, without dest it writes to the
+    standard output.
+    """
     args = [paths.GPG,
             '--batch',
-            '--default-recipient-self',
-            '-o', dest]
+            '--default-recipient-self']
+
+    if dest is not None:
+        args.extend(['-o', dest])
 
     if keyring is not None:
         args.append('--no-default-keyring')
@@ -79,6 +88,78 @@ def encrypt_file(filename, keyring, remove_original=True):
         args.append(keyring + '.sec')
 
     args.append('-e')
+    return args
+
+
+def compress_command():
+    """
+    Return the command compressing the standard input to the standard
+    output in the gzip format. pigz is preferred as it uses all CPUs.
+    """
+    if os.path.exists(paths.PIGZ):
+        return [paths.PIGZ, '-c']
+    return [paths.GZIP, '-c']
+
+
+def run_pipeline(commands, output, cwd=None):
+    """
+    Run the commands with the standard output of each one connected to the
+    standard input of the next one and write the output of the last one to
+    the output file, in a single pass.
+
+    Raises admintool.ScriptError if any of the commands fails.
+    """
+    processes = []
+    with open(output, 'wb') as out:
+        stdin = None
+        try:
+            for i, args in enumerate(commands):
+                root_logger.debug('args=%s', ' '.join(args))
+                stdout = out if i == len(commands) - 1 else subprocess.PIPE
+                err = tempfile.TemporaryFile()
+                p = subprocess.Popen(args, stdin=stdin, stdout=stdout,
+                                     stderr=err, close_fds=True, cwd=cwd)
+                processes.append((args, p, err))
+                if stdin is not None:
+                    # only the next command reads the pipe, so that the
+                    # previous one gets SIGPIPE if the next one fails
+                    stdin.close()
+                stdin = p.stdout
+        except:
+            for _args, p, _err in processes:
+                p.kill()
+            raise
+        finally:
+            for _args, p, _err in processes:
+                p.wait()
+
+    failed = None
+    for args, p, err in processes:
+        err.seek(0)
+        error_log = err.read().decode(locale.getpreferredencoding(),
+                                      errors='replace')
+        err.close()
+        root_logger.debug('%s finished, return code=%s, stderr=%s',
+                          args[0], p.returncode, error_log)
+        # when a command fails, the commands before it are killed by
+        # SIGPIPE (or fail writing to the pipe), so the last failure which
+        # is not SIGPIPE is the one to report
+        if p.returncode != 0 and (failed is None or
+                                  p.returncode != -signal.SIGPIPE):
+            failed = (args, p.returncode, error_log)
+
+    if failed is not None:
+        args, returncode, error_log = failed
+        raise admintool.ScriptError(
+            '%s returned non-zero code %d: %s' %
+            (os.path.basename(args[0]), returncode, error_log))
+
+
+def encrypt_file(filename, keyring, remove_original=True):
+    source = filename
+    dest = filename + '.gpg'
+
+    args = encrypt_command(keyring, dest)
     args.append(source)
 
     result = run(args, raiseonerr=False)
@@ -220,6 +301,9 @@ class Backup(admintool.AdminTool):
             default=False, help="Include log files in backup")
         parser.add_option("--online", dest="online", action="store_true",
             default=False, help="Perform the LDAP backups online, for data only.")
+        parser.add_option("--incremental", dest="incremental",
+            action="store_true", default=False,
+            help="Store only data changed since previous incremental backups")
 
 
     def setup_logging(self, log_file_mode='a'):
@@ -250,6 +334,10 @@ class Backup(admintool.AdminTool):
             self.option_parser.error("You cannot specify --data "
                 "with --logs")
 
+        if options.incremental and options.gpg:
+            self.option_parser.error("You cannot specify --incremental "
+                "with --gpg")
+
 
     def run(self):
         options = self.options
@@ -305,7 +393,8 @@ class Backup(admintool.AdminTool):
                 auth_backup_path = os.path.join(paths.VAR_LIB_IPA, 'auth_backup')
                 tasks.backup_auth_configuration(auth_backup_path)
                 self.file_backup(options)
-            self.finalize_backup(options.data_only, options.gpg, options.gpg_keyring)
+            self.finalize_backup(options.data_only, options.gpg,
+                                 options.gpg_keyring, options.incremental)
 
             if options.data_only:
                 if not options.online:
@@ -477,8 +566,7 @@ class Backup(admintool.AdminTool):
                 '--exclude=/var/lib/ipa/backup',
                 '--xattrs',
                 '--selinux',
-                '-cf',
-                tarfile
+                '-cf', '-',
                ]
 
         args.extend(verify_directories(self.dirs))
@@ -487,46 +575,55 @@ class Backup(admintool.AdminTool):
         if options.logs:
             args.extend(verify_directories(self.logs))
 
-        result = run(args, raiseonerr=False)
-        if result.returncode != 0:
-            raise admintool.ScriptError('tar returned non-zero code %d: %s' %
-                                        (result.returncode, result.error_log))
-
-        # Backup the necessary directory structure. This is a separate
-        # call since we are using the '--no-recursion' flag to store
-        # the directory structure only, no files.
+        # Backup the necessary directory structure. '--no-recursion' applies
+        # to the following names only, they store the directory structure
+        # only, no files.
         missing_directories = verify_directories(self.required_dirs)
-
         if missing_directories:
-            args = ['tar',
-                    '--exclude=/var/lib/ipa/backup',
-                    '--xattrs',
-                    '--selinux',
-                    '--no-recursion',
-                    '-rf',  # -r appends to an existing archive
-                    tarfile,
-                   ]
+            args.append('--no-recursion')
             args.extend(missing_directories)
 
-            result = run(args, raiseonerr=False)
-            if result.returncode != 0:
-                raise admintool.ScriptError(
-                    'tar returned non-zero code %d '
-                    'when adding directory structure: %s' %
-                    (result.returncode, result.error_log))
-
-        # Compress the archive. This is done separately, since 'tar' cannot
-        # append to a compressed archive.
-        result = run(['gzip', tarfile], raiseonerr=False)
-        if result.returncode != 0:
-            raise admintool.ScriptError(
-                'gzip returned non-zero code %d '
-                'when compressing the backup: %s' %
-                (result.returncode, result.error_log))
+        if options.incremental:
+            # Unchanged files must result in unchanged data to be stored
+            # only once, so the archive is not compressed. Chunks are
+            # compressed in the chunk store.
+            self.stream_backup([args], tarfile)
+        else:
+            # The archive is compressed while it is created, it is still
+            # named files.tar to preserve compatibility
+            self.stream_backup([args, compress_command()], tarfile)
 
-        # Rename the archive back to files.tar to preserve compatibility
-        os.rename(os.path.join(self.dir, 'files.tar.gz'), tarfile)
 
+    def stream_backup(self, commands, filename, cwd=None):
+        '''
+        Write the output of the commands, connected by pipes, to filename
+        and report the throughput.
+        '''
+        start = time.time()
+        run_pipeline(commands, filename, cwd=cwd)
+        elapsed = max(time.time() - start, 0.001)
+        size = os.path.getsize(filename) / 1024.0 / 1024.0
+        self.log.info('Wrote %s: %.1f MiB in %.1f seconds (%.1f MiB/s)',
+                      os.path.basename(filename), size, elapsed,
+                      size / elapsed)
+
+    def incremental_backup(self, backup_dir):
+        '''
+        Store the backed up files in the chunk store and write the
+        manifest of the backup.
+        '''
+        self.log.info('Storing changed data')
+        store = backupstore.ChunkStore.for_backup(backup_dir)
+        start = time.time()
+        total, written = backupstore.create_manifest(
+            store, self.dir,
+            os.path.join(backup_dir, backupstore.MANIFEST_FILE))
+        elapsed = max(time.time() - start, 0.001)
+        total = total / 1024.0 / 1024.0
+        self.log.info('Stored %.1f MiB in %.1f seconds (%.1f MiB/s), '
+                      '%.1f MiB of new data written',
+                      total, elapsed, total / elapsed,
+                      written / 1024.0 / 1024.0)
 
     def create_header(self, data_only):
         '''
@@ -563,7 +660,8 @@ class Backup(admintool.AdminTool):
             config.write(fd)
 
 
-    def finalize_backup(self, data_only=False, encrypt=False, keyring=None):
+    def finalize_backup(self, data_only=False, encrypt=False, keyring=None,
+                        incremental=False):
         '''
         Create the final location of the backup files and move the files
         we've backed up there, optionally encrypting them.
@@ -574,6 +672,10 @@ class Backup(admintool.AdminTool):
 
         These, along with the header, are moved into a new subdirectory
         in /var/lib/ipa/backup.
+
+        Incremental backups store the files in the chunk store in
+        /var/lib/ipa/backup instead and the subdirectory contains their
+        manifest.
         '''
 
         if data_only:
@@ -586,24 +688,23 @@ class Backup(admintool.AdminTool):
         os.mkdir(backup_dir)
         os.chmod(backup_dir, 0o700)
 
-        cwd = os.getcwd()
-        os.chdir(self.dir)
-        args = ['tar',
-                '--xattrs',
-                '--selinux',
-                '-czf',
-                filename,
-                '.'
-               ]
-        result = run(args, raiseonerr=False)
-        if result.returncode != 0:
-            raise admintool.ScriptError(
-                'tar returned non-zero code %s: %s' %
-                (result.returncode, result.error_log))
-
-        if encrypt:
-            self.log.info('Encrypting %s' % filename)
-            filename = encrypt_file(filename, keyring)
+        if incremental:
+            self.incremental_backup(backup_dir)
+        else:
+            args = ['tar',
+                    '--xattrs',
+                    '--selinux',
+                    '-cf', '-',
+                    '.'
+                   ]
+            commands = [args, compress_command()]
+            if encrypt:
+                # The archive is encrypted while it is created, it is never
+                # written to the disk unencrypted
+                self.log.info('Encrypting %s' % filename)
+                filename = filename + '.gpg'
+                commands.append(encrypt_command(keyring))
+            self.stream_backup(commands, filename, cwd=self.dir)
 
         shutil.move(self.header, backup_dir)
 
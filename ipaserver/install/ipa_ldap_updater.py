@@ -55,6 +55,10 @@ class LDAPUpdater(admintool.AdminTool):
         parser.add_option("-S", '--schema-file', action="append",
             dest="schema_files",
             help="custom schema ldif file to use (implies -s)")
+        parser.add_option("--force", action="store_true",
+            dest="force", default=False,
+            help="apply also update files which were already applied and "
+                 "whose entries did not change since")
 
     @classmethod
     def get_command_class(cls, options, args):
@@ -107,7 +111,8 @@ class LDAPUpdater_Upgrade(LDAPUpdater):
 
         realm = api.env.realm
         upgrade = IPAUpgrade(realm, self.files,
-                             schema_files=options.schema_files)
+                             schema_files=options.schema_files,
+                             force=options.force)
 
         try:
             upgrade.create_instance()
@@ -144,7 +149,7 @@ class LDAPUpdater_NonUpgrade(LDAPUpdater):
         if not self.files:
             self.files = ld.get_all_files(UPDATES_DIR)
 
-        modified = ld.update(self.files) or modified
+        modified = ld.update(self.files, force=options.force) or modified
 
         if modified:
             self.log.info('Update complete')
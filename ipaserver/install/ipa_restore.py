@@ -38,6 +38,7 @@ from ipaserver.install.cainstance import create_ca_user
 from ipaserver.install.replication import (wait_for_task, ReplicationManager,
                                            get_cs_replication_manager)
 from ipaserver.install import installutils
+from ipaserver.install import backupstore
 from ipaserver.install import dsinstance, httpinstance, cainstance
 from ipapython import ipaldap
 import ipapython.errors
@@ -163,6 +164,9 @@ class Restore(admintool.AdminTool):
         parser.add_option('-U', '--unattended', dest="unattended",
             action="store_true", default=False,
             help="Unattended restoration never prompts the user")
+        parser.add_option('--verify', dest="verify", action="store_true",
+            default=False,
+            help="Only check the integrity of an incremental backup")
 
 
     def setup_logging(self, log_file_mode='a'):
@@ -197,6 +201,8 @@ class Restore(admintool.AdminTool):
 
         # get the directory manager password
         self.dirman_password = options.password
+        if options.verify:
+            return
         if not options.password:
             if not options.unattended:
                 self.dirman_password = installutils.read_password(
@@ -225,6 +231,10 @@ class Restore(admintool.AdminTool):
         except IOError as e:
             raise admintool.ScriptError("Cannot read backup metadata: %s" % e)
 
+        if options.verify:
+            self.verify_backup()
+            return
+
         if options.data_only:
             restore_type = 'DATA'
         else:
@@ -647,7 +657,7 @@ class Restore(admintool.AdminTool):
         args = ['tar',
                 '--xattrs',
                 '--selinux',
-                '-xzf',
+                '-xf',
                 os.path.join(self.dir, 'files.tar'),
                 paths.IPA_DEFAULT_CONF[1:],
                ]
@@ -691,7 +701,7 @@ class Restore(admintool.AdminTool):
         args = ['tar',
                 '--xattrs',
                 '--selinux',
-                '-xzf',
+                '-xf',
                 os.path.join(self.dir, 'files.tar')
                ]
         if nologs:
@@ -722,12 +732,43 @@ class Restore(admintool.AdminTool):
         self.backup_services = config.get('ipa', 'services').split(',')
 
 
+    def verify_backup(self):
+        '''
+        Check that all chunks of an incremental backup are present and
+        intact.
+        '''
+        manifest = os.path.join(self.backup_dir, backupstore.MANIFEST_FILE)
+        if not os.path.exists(manifest):
+            raise admintool.ScriptError(
+                '%s is not an incremental backup' % self.backup_dir)
+
+        problems = backupstore.verify_manifest(
+            backupstore.ChunkStore.for_backup(self.backup_dir),
+            backupstore.read_manifest(manifest))
+        for problem in problems:
+            self.log.error('%s', problem)
+        if problems:
+            raise admintool.ScriptError(
+                'Backup %s is damaged' % self.backup_dir)
+        self.log.info('Backup %s is intact', self.backup_dir)
+
     def extract_backup(self, keyring=None):
         '''
         Extract the contents of the tarball backup into a temporary location,
         decrypting if necessary.
         '''
 
+        manifest = os.path.join(self.backup_dir, backupstore.MANIFEST_FILE)
+        if os.path.exists(manifest):
+            self.log.info('Restoring files of incremental backup')
+            backupstore.restore_manifest(
+                backupstore.ChunkStore.for_backup(self.backup_dir),
+                backupstore.read_manifest(manifest), self.dir)
+            pent = pwd.getpwnam(constants.DS_USER)
+            os.chown(self.top_dir, pent.pw_uid, pent.pw_gid)
+            recursive_chown(self.dir, pent.pw_uid, pent.pw_gid)
+            return
+
         encrypt = False
         filename = None
         if self.backup_type == 'FULL':
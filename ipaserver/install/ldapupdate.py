@@ -23,6 +23,7 @@
 # save undo files?
 
 import base64
+import hashlib
 import sys
 import uuid
 import platform
@@ -34,7 +35,7 @@ import fnmatch
 import ldap
 import six
 
-from ipaserver.install import installutils
+from ipaserver.install import installutils, sysupgrade
 from ipapython import ipautil, ipaldap
 from ipalib import errors
 from ipalib import api, create_api
@@ -49,6 +50,19 @@ if six.PY3:
 
 UPDATES_DIR=paths.UPDATES_DIR
 UPDATE_SEARCH_TIME_LIMIT = 30  # seconds
+# maximal number of LDAP operations the updater keeps in flight
+UPDATE_MAX_PENDING = 32
+UPDATE_ENTRY_ATTRS = ["*", "aci", "attributeTypes", "objectClasses"]
+# index tasks are polled with exponential backoff between these delays
+INDEX_TASK_MIN_DELAY = 0.2  # seconds
+INDEX_TASK_MAX_DELAY = 5  # seconds
+
+# Updates of entries in these subtrees can change how the server handles
+# other operations (schema, plugins, indexes), so they are never pipelined
+UPDATE_BARRIER_DNS = (
+    DN(('cn', 'schema')),
+    DN(('cn', 'config')),
+)
 
 
 def connect(ldapi=False, realm=None, fqdn=None, dm_password=None, pw_name=None):
@@ -122,7 +136,7 @@ def safe_output(attr, values):
         values = [values]
 
     try:
-        all(v.decode('ascii') for v in values)
+        all(v.decode('ascii') for v in values if isinstance(v, bytes))
     except UnicodeDecodeError:
         try:
             values = [base64.b64encode(v) for v in values]
@@ -134,6 +148,17 @@ def safe_output(attr, values):
     return values
 
 
+def _canonical(value):
+    """Convert parsed updates to a value with a stable repr()"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _canonical(v)) for k, v in value.items()))
+    elif isinstance(value, (list, tuple)):
+        return tuple(_canonical(v) for v in value)
+    elif isinstance(value, DN):
+        return str(value)
+    return value
+
+
 class LDAPUpdate:
     action_keywords = ["default", "add", "remove", "only", "onlyifexist", "deleteentry", "replace", "addifnew", "addifexist"]
 
@@ -258,6 +283,13 @@ class LDAPUpdate:
         self.dm_password = dm_password
         self.conn = None
         self.modified = False
+        # pipelined writes: (msgid, update, dn, refs, add, prefetched)
+        self._pending = []
+        # entries searched ahead: dn => list of entries or None if missing
+        self._prefetched = {}
+        # attributes to reindex at the end of the update file or before
+        # the next plugin or deleteentry record
+        self._index_attributes = []
         self.online = online
         self.ldapi = ldapi
         self.pw_name = pwd.getpwuid(os.geteuid()).pw_name
@@ -532,17 +564,15 @@ class LDAPUpdate:
 
         return all_updates
 
-    def create_index_task(self, attribute):
-        """Create a task to update an index for an attribute"""
-
-        # Sleep a bit to ensure previous operations are complete
-        time.sleep(5)
+    def create_index_task(self, *attributes):
+        """Create a task to update the indexes of the attributes"""
 
         cn_uuid = uuid.uuid1()
         # cn_uuid.time is in nanoseconds, but other users of LDAPUpdate expect
         # seconds in 'TIME' so scale the value down
         self.sub_dict['TIME'] = int(cn_uuid.time/1e9)
-        cn = "indextask_%s_%s_%s" % (attribute, cn_uuid.time, cn_uuid.clock_seq)
+        cn = "indextask_%s_%s_%s" % ('_'.join(attributes), cn_uuid.time,
+                                     cn_uuid.clock_seq)
         dn = DN(('cn', cn), ('cn', 'index'), ('cn', 'tasks'), ('cn', 'config'))
 
         e = self.conn.make_entry(
@@ -550,10 +580,11 @@ class LDAPUpdate:
             objectClass=['top', 'extensibleObject'],
             cn=[cn],
             nsInstance=['userRoot'],
-            nsIndexAttribute=[attribute],
+            nsIndexAttribute=list(attributes),
         )
 
-        self.debug("Creating task to index attribute: %s", attribute)
+        self.debug("Creating task to index attributes: %s",
+                   ', '.join(attributes))
         self.debug("Task id: %s", dn)
 
         self.conn.add_entry(e)
@@ -566,13 +597,15 @@ class LDAPUpdate:
 
         assert isinstance(dn, DN)
 
-        # Pause for a moment to give the task time to be created
-        time.sleep(1)
-
-        attrlist = ['nstaskstatus', 'nstaskexitcode']
+        attrlist = ['nstaskstatus', 'nstaskexitcode', 'nstaskcurrentitem',
+                    'nstasktotalitems']
         entry = None
+        delay = INDEX_TASK_MIN_DELAY
+        last_status = None
 
         while True:
+            time.sleep(delay)
+            delay = min(delay * 2, INDEX_TASK_MAX_DELAY)
             try:
                 entry = self.conn.get_entry(dn, attrlist)
             except errors.NotFound as e:
@@ -585,18 +618,46 @@ class LDAPUpdate:
             status = entry.single_value.get('nstaskstatus')
             if status is None:
                 # task doesn't have a status yet
-                time.sleep(1)
                 continue
 
+            if status != last_status:
+                # report progress, poll quickly again after a change
+                last_status = status
+                delay = INDEX_TASK_MIN_DELAY
+                current = entry.single_value.get('nstaskcurrentitem')
+                total = entry.single_value.get('nstasktotalitems')
+                if current is not None and total is not None:
+                    self.info("Indexing: %s (%s/%s)", status, current, total)
+                else:
+                    self.info("Indexing: %s", status)
+
             if status.lower().find("finished") > -1:
-                self.debug("Indexing finished")
+                exitcode = entry.single_value.get('nstaskexitcode')
+                if exitcode not in (None, '0', 0):
+                    self.error("Indexing failed with exit code %s: %s",
+                               exitcode, status)
+                else:
+                    self.debug("Indexing finished")
                 break
 
             self.debug("Indexing in progress")
-            time.sleep(1)
 
         return
 
+    def _run_index_tasks(self):
+        """Reindex all attributes whose index was added or changed, in a
+           single task
+        """
+        attributes = self._index_attributes
+        self._index_attributes = []
+        if not attributes:
+            return
+        start = time.time()
+        taskid = self.create_index_task(*attributes)
+        self.monitor_index_task(taskid)
+        self.info("Reindexed %d attributes in %.2f seconds",
+                  len(attributes), time.time() - start)
+
     def _create_default_entry(self, dn, default):
         """Create the default entry from the values provided.
 
@@ -633,11 +694,167 @@ class LDAPUpdate:
         """
         assert isinstance(dn, DN)
         searchfilter="objectclass=*"
-        sattrs = ["*", "aci", "attributeTypes", "objectClasses"]
+        sattrs = UPDATE_ENTRY_ATTRS
         scope = ldap.SCOPE_BASE
 
         return self.conn.get_entries(dn, scope, searchfilter, sattrs)
 
+    def _is_barrier(self, dn):
+        return any(dn.endswith(barrier) for barrier in UPDATE_BARRIER_DNS)
+
+    def _prefetch_entries(self, updates):
+        """Search for the entries of the update records in advance.
+
+           All base searches up to the next plugin or deleteentry are sent
+           before their results are read, UPDATE_MAX_PENDING at a time.
+           Entries which cannot be prefetched are searched for later, when
+           their update is applied.
+        """
+        dns = []
+        seen = set(self._prefetched)
+        for update in updates:
+            if 'deleteentry' in update or 'plugin' in update:
+                break
+            dn = update['dn']
+            if dn not in seen and not self._is_barrier(dn):
+                seen.add(dn)
+                dns.append(dn)
+
+        self._prefetched.update(self._search_entries(dns))
+        self.debug("Prefetched %d entries", len(dns))
+
+    def _search_entries(self, dns):
+        """Search for the entries with the given DNs, UPDATE_MAX_PENDING
+           base searches at a time.
+
+           Returns a dict DN => list of entries or None if the entry does
+           not exist. DNs which could not be searched for are left out.
+        """
+        entries = {}
+        for start in range(0, len(dns), UPDATE_MAX_PENDING):
+            msgids = []
+            for dn in dns[start:start + UPDATE_MAX_PENDING]:
+                msgids.append((dn, self.conn.get_entry_async(
+                    dn, UPDATE_ENTRY_ATTRS,
+                    time_limit=UPDATE_SEARCH_TIME_LIMIT)))
+            for dn, msgid in msgids:
+                try:
+                    result = self.conn.get_async_result(msgid)
+                except errors.NotFound:
+                    entries[dn] = None
+                except errors.PublicError as e:
+                    self.debug("Search of %s failed: %s", dn, e)
+                else:
+                    entries[dn] = result or None
+        return entries
+
+    def _get_referenced_dns(self, entry, add):
+        """Return the DNs in the values of DN syntax attributes (member,
+           memberOf, managedBy, ...) written by the add or modify of entry.
+
+           The server applies pipelined writes concurrently, so a write
+           which refers to another entry must not be in flight together
+           with a write of that entry, e.g. the memberOf plugin does not
+           update an entry added after the group which lists it as member.
+        """
+        if add:
+            attrs = list(entry.raw.items())
+        else:
+            attrs = [(attr, values)
+                     for _op, attr, values in entry.generate_modlist()]
+        refs = set()
+        for attr, values in attrs:
+            if not self.conn.has_dn_syntax(attr):
+                continue
+            for value in values or ():
+                if isinstance(value, bytes):
+                    value = value.decode('utf-8')
+                try:
+                    refs.add(DN(value))
+                except ValueError:
+                    pass
+        return refs
+
+    def _wait_for_submit(self, dn, refs):
+        """Read the results which must be known before a write of dn which
+           refers to the DNs refs is sent: earlier writes related to the
+           write (see _wait_for_pending()), and the oldest write if
+           UPDATE_MAX_PENDING writes are pending.
+
+           Failures of these writes are reported as the synchronous update
+           would report them, so this must not be called while handling
+           errors of the update of dn.
+        """
+        self._wait_for_pending(dn, refs)
+        if len(self._pending) >= UPDATE_MAX_PENDING:
+            self._wait_for_result(self._pending[0])
+
+    def _submit_update(self, update, entry, refs, add, prefetched):
+        """Send add or modify of entry without waiting for the result.
+
+           _wait_for_submit() must be called first so that dependent
+           records are applied in order.
+        """
+        if add:
+            msgid = self.conn.add_entry_async(entry)
+        else:
+            msgid = self.conn.update_entry_async(entry)
+        self._pending.append(
+            (msgid, update, entry.dn, refs, add, prefetched))
+
+    def _wait_for_result(self, pending):
+        """Read the result of a pipelined write and report it like the
+           synchronous update would. A write of a prefetched entry which
+           fails is applied again with a fresh copy of the entry, as it may
+           have been changed by earlier updates in the meantime.
+        """
+        msgid, update, dn, _refs, add, prefetched = pending
+        self._pending.remove(pending)
+        try:
+            self.conn.get_async_result(msgid)
+        except errors.PublicError as e:
+            if prefetched:
+                self.debug("Update of prefetched entry %s failed (%s), "
+                           "retrying", dn, e)
+                self._update_record(update, prefetched=False)
+                # the caller waits for this write because a later record
+                # depends on it, so the retry must be applied as well
+                self._wait_for_pending(dn)
+            elif not add:
+                if not isinstance(e, (errors.DatabaseError, errors.ACIError)):
+                    raise
+                self.error("Update failed: %s", e)
+            elif isinstance(e, errors.NotFound):
+                # parent entry of the added entry does not exist
+                # this may not be an error (e.g. entries in NIS container)
+                self.error("Parent DN of %s may not exist, cannot "
+                           "create the entry", dn)
+            else:
+                self.error("Add failure %s", e)
+        else:
+            self.modified = True
+
+    def _wait_for_pending(self, dn=None, refs=()):
+        """Wait for pipelined writes. If dn is given, wait only for the
+           writes up to the last one related to dn: writes of dn, its
+           parents or children, writes of the DNs refs (and their parents
+           or children), and writes which refer to dn.
+        """
+        def related(dn1, dn2):
+            return dn1.endswith(dn2) or dn2.endswith(dn1)
+
+        count = 0
+        for i, pending in enumerate(self._pending):
+            pending_dn, pending_refs = pending[2], pending[3]
+            if (dn is None or related(dn, pending_dn) or
+                    any(related(ref, pending_dn) for ref in refs) or
+                    any(related(dn, ref) for ref in pending_refs)):
+                count = i + 1
+        for _i in range(count):
+            if not self._pending:
+                break
+            self._wait_for_result(self._pending[0])
+
     def _apply_update_disposition(self, updates, entry):
         """
         updates is a list of changes to apply
@@ -742,14 +959,25 @@ class LDAPUpdate:
             for l in value:
                 self.debug("\t%s", safe_output(a, l))
 
-    def _update_record(self, update):
+    def _update_record(self, update, prefetched=True):
         found = False
 
         new_entry = self._create_default_entry(update.get('dn'),
                                                update.get('default'))
+        # a prefetched copy is used once, later updates of the same entry
+        # need to see the result of this one
+        prefetched = prefetched and new_entry.dn in self._prefetched
+        if prefetched:
+            e = self._prefetched.pop(new_entry.dn)
+        else:
+            self._wait_for_pending(new_entry.dn)
+        pipelined = not self._is_barrier(new_entry.dn)
 
         try:
-            e = self._get_entry(new_entry.dn)
+            if not prefetched:
+                e = self._get_entry(new_entry.dn)
+            elif e is None:
+                raise errors.NotFound(reason=str(new_entry.dn))
             if len(e) > 1:
                 # we should only ever get back one entry
                 raise BadSyntax("More than 1 entry returned on a dn search!? %s" % new_entry.dn)
@@ -775,10 +1003,20 @@ class LDAPUpdate:
 
         self.print_entity(entry, "Final value after applying updates")
 
+        if pipelined:
+            refs = self._get_referenced_dns(entry, not found)
+            # outside of the error handling below, failures of earlier
+            # records must not be reported as failures of this one
+            self._wait_for_submit(entry.dn, refs)
+
         added = False
         updated = False
         if not found:
             try:
+                if len(entry) and pipelined:
+                    self._submit_update(update, entry, refs, True,
+                                        prefetched)
+                    return
                 if len(entry):
                     # addifexist may result in an entry with only a
                     # dn defined. In that case there is nothing to do.
@@ -806,6 +1044,10 @@ class LDAPUpdate:
                     safe_changes.append((type, attr, safe_output(attr, values)))
                 self.debug("%s" % safe_changes)
                 self.debug("Updated %d" % updated)
+                if updated and pipelined:
+                    self._submit_update(update, entry, refs, False,
+                                        prefetched)
+                    return
                 if updated:
                     self.conn.update_entry(entry)
                 self.debug("Done")
@@ -825,8 +1067,11 @@ class LDAPUpdate:
         if entry.dn.endswith(DN(('cn', 'index'), ('cn', 'userRoot'),
                                 ('cn', 'ldbm database'), ('cn', 'plugins'),
                                 ('cn', 'config'))) and (added or updated):
-            taskid = self.create_index_task(entry.single_value['cn'])
-            self.monitor_index_task(taskid)
+            # Indexes are rebuilt in a single task at the end of the file
+            # or before the next plugin or deleteentry record
+            attribute = entry.single_value['cn']
+            if attribute not in self._index_attributes:
+                self._index_attributes.append(attribute)
         return
 
     def _delete_record(self, updates):
@@ -835,6 +1080,9 @@ class LDAPUpdate:
         """
 
         dn = updates['dn']
+        self._wait_for_pending()
+        self._prefetched.clear()
+        self._run_index_tasks()
         try:
             self.debug("Deleting entry %s", dn)
             self.conn.delete_entry(dn)
@@ -858,6 +1106,11 @@ class LDAPUpdate:
         return f
 
     def _run_update_plugin(self, plugin_name):
+        # plugins may read or change any entry and rely on the indexes
+        # changed by the records before them
+        self._wait_for_pending()
+        self._prefetched.clear()
+        self._run_index_tasks()
         self.log.debug("Executing upgrade plugin: %s", plugin_name)
         restart_ds, updates = self.api.Updater[plugin_name]()
         if updates:
@@ -882,22 +1135,123 @@ class LDAPUpdate:
             raise RuntimeError("Offline updates are not supported.")
 
     def _run_updates(self, all_updates):
-        for update in all_updates:
-            if 'deleteentry' in update:
-                self._delete_record(update)
-            elif 'plugin' in update:
-                self._run_update_plugin(update['plugin'])
+        prefetch = True
+        try:
+            for i, update in enumerate(all_updates):
+                if 'deleteentry' in update:
+                    self._delete_record(update)
+                    prefetch = True
+                elif 'plugin' in update:
+                    self._run_update_plugin(update['plugin'])
+                    prefetch = True
+                else:
+                    if prefetch:
+                        self._prefetch_entries(all_updates[i:])
+                        prefetch = False
+                    self._update_record(update)
+            self._wait_for_pending()
+        finally:
+            self._pending = []
+            self._prefetched.clear()
+
+    def _get_update_targets(self, updates):
+        """Return the entries changed by the updates, or None if the updates
+           run a plugin, which can change anything.
+
+        :returns: list of (DN, set of lowercased names of the attributes of
+                  the entry which the updates read or change)
+        """
+        targets = []
+        attrs_by_dn = {}
+        for update in updates:
+            if 'plugin' in update:
+                return None
+            dn = update['dn']
+            try:
+                attrs = attrs_by_dn[dn]
+            except KeyError:
+                attrs = attrs_by_dn[dn] = set()
+                targets.append((dn, attrs))
+            for disposition in ('default', 'updates'):
+                for item in update.get(disposition, ()):
+                    attrs.add(item['attr'].lower())
+        return targets
+
+    def _get_fingerprints(self, files):
+        """Compute the fingerprints of the update files and the current
+           state of the entries they change.
+
+           Applying an update file reads and changes only the attributes it
+           names, and its result depends on whether the entries exist, so
+           only these are part of the fingerprint.
+
+        :param files: list of (filename, updates, targets)
+        :returns: dict filename => fingerprint
+        """
+        dns = set()
+        for _f, _updates, targets in files:
+            dns.update(dn for dn, _attrs in targets)
+        entries = self._search_entries(list(dns))
+
+        fingerprints = {}
+        for f, updates, targets in files:
+            h = hashlib.sha256()
+            h.update(repr(_canonical(updates)).encode('utf-8'))
+            for dn, attrs in targets:
+                if dn not in entries:
+                    # state of the entry is not known, do not skip the file
+                    break
+                h.update(str(dn).encode('utf-8'))
+                if entries[dn] is None:
+                    h.update(b'\0')
+                    continue
+                for entry in entries[dn]:
+                    h.update(repr(sorted(
+                        (attr.lower(), sorted(values))
+                        for attr, values in entry.raw.items()
+                        if attr.lower() in attrs)).encode('utf-8'))
             else:
-                self._update_record(update)
+                fingerprints[f] = h.hexdigest()
+        return fingerprints
+
+    def _is_applied(self, f, updates, targets):
+        """Check if the update file was applied by a previous run, is
+           unchanged and the entries it changes are in the state in which
+           the file left them.
+        """
+        if targets is None:
+            return False
+        try:
+            applied = sysupgrade.get_upgrade_state('ldapupdate', f)
+        except Exception as e:
+            self.debug("Cannot read fingerprint of '%s': %s", f, e)
+            return False
+        if applied is None:
+            return False
+        fingerprints = self._get_fingerprints([(f, updates, targets)])
+        return fingerprints.get(f) == applied
+
+    def _store_fingerprints(self, fingerprints):
+        for f, fingerprint in fingerprints.items():
+            try:
+                sysupgrade.set_upgrade_state('ldapupdate', f, fingerprint)
+            except Exception as e:
+                self.debug("Cannot store fingerprint of '%s': %s", f, e)
 
-    def update(self, files, ordered=True):
+    def update(self, files, ordered=True, force=False):
         """Execute the update. files is a list of the update files to use.
         :param ordered: Update files are executed in alphabetical order
+        :param force: Apply all update files. Otherwise files which were
+            applied by a previous run are skipped if the file (after
+            template substitution) is unchanged and the entries it changes
+            are in the state in which the file left them.
 
         returns True if anything was changed, otherwise False
         """
         self.modified = False
+        self._index_attributes = []
         all_updates = []
+        fingerprints = {}
         try:
             self.create_connection()
 
@@ -913,9 +1267,33 @@ class LDAPUpdate:
                     self.error("error reading update file '%s'", f)
                     raise RuntimeError(e)
 
+                start = time.time()
                 self.parse_update_file(f, data, all_updates)
-                self._run_updates(all_updates)
+                targets = None
+                if f != '-':
+                    targets = self._get_update_targets(all_updates)
+                if not force and self._is_applied(f, all_updates, targets):
+                    self.info("Update file '%s' is already applied, "
+                              "skipping", f)
+                else:
+                    self._run_updates(all_updates)
+                    # later files may search by the changed indexes
+                    self._run_index_tasks()
+                    self.info("Update file '%s' applied: %d records in "
+                              "%.2f seconds", f, len(all_updates),
+                              time.time() - start)
+                    if targets is not None:
+                        # the state right after the file was applied, later
+                        # files may change the same entries. The file is
+                        # skipped only if it would be applied to this state
+                        # again.
+                        fingerprints.update(self._get_fingerprints(
+                            [(f, all_updates, targets)]))
                 all_updates = []
+
+            # stored only now, so that the files are applied again if an
+            # index task fails
+            self._store_fingerprints(fingerprints)
         finally:
             self.close_connection()
 
@@ -927,9 +1305,11 @@ class LDAPUpdate:
         updates is a dictionary containing the updates
         """
         self.modified = False
+        self._index_attributes = []
         try:
             self.create_connection()
             self._run_updates(updates)
+            self._run_index_tasks()
         finally:
             self.close_connection()
 
@@ -1813,11 +1813,11 @@ def upgrade_check(options):
                          "system")
 
 
-def upgrade():
+def upgrade(force=False):
     realm = api.env.realm
     schema_files = [os.path.join(ipautil.SHARE_DIR, f) for f
                     in dsinstance.ALL_SCHEMA_FILES]
-    data_upgrade = IPAUpgrade(realm, schema_files=schema_files)
+    data_upgrade = IPAUpgrade(realm, schema_files=schema_files, force=force)
 
     try:
         data_upgrade.create_instance()
@@ -69,10 +69,11 @@ class IPAUpgrade(service.Service):
     listeners and updating over ldapi. This way we know the server is
     quiet.
     """
-    def __init__(self, realm_name, files=[], schema_files=[]):
+    def __init__(self, realm_name, files=[], schema_files=[], force=False):
         """
         realm_name: kerberos realm name, used to determine DS instance dir
         files: list of update files to process. If none use UPDATEDIR
+        force: apply also the update files which were already applied
         """
 
         ext = ''
@@ -89,6 +90,7 @@ class IPAUpgrade(service.Service):
         self.serverid = serverid
         self.schema_files = schema_files
         self.realm = realm_name
+        self.force = force
 
     def __start(self):
         services.service(self.service_name).start(self.serverid, ldapi=True)
@@ -210,7 +212,8 @@ class IPAUpgrade(service.Service):
             ld = ldapupdate.LDAPUpdate(dm_password='', ldapi=True)
             if len(self.files) == 0:
                 self.files = ld.get_all_files(ldapupdate.UPDATES_DIR)
-            self.modified = (ld.update(self.files) or self.modified)
+            self.modified = (ld.update(self.files, force=self.force) or
+                             self.modified)
         except ldapupdate.BadSyntax as e:
             root_logger.error('Bad syntax in upgrade %s', e)
             raise
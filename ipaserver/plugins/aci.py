@@ -117,7 +117,9 @@ must include all existing attributes as well. When doing an aci-mod the
 targetattr REPLACES the current attributes, it does not add to them.
 
 """
+from collections import OrderedDict
 from copy import deepcopy
+import threading
 
 import six
 
@@ -404,6 +406,194 @@ def _find_aci_by_name(acis, aciprefix, aciname):
     raise errors.NotFound(reason=_('ACI with name "%s" not found') % aciname)
 
 
+class ParsedACIs(object):
+    """
+    The parsed ACIs of an entry, indexed for aci_find and permission_find
+
+    The ACI objects are shared between requests and must not be modified.
+    """
+
+    def __init__(self, dn, acistrs):
+        self.dn = dn
+        self.acis = []
+        self.strings = []
+        for acistr in acistrs:
+            try:
+                self.acis.append(ACI(acistr))
+            except SyntaxError:
+                root_logger.warning("Failed to parse: %s" % acistr)
+            else:
+                self.strings.append(acistr)
+
+        # the values are lists of positions in self.acis
+        self.by_name = {}
+        self.by_aciname = {}
+        self.by_prefix = {}
+        self.by_targetattr = {}
+        self.by_permission = {}
+        self.by_bindrule = {}
+        self.by_targetfilter = {}
+        self.by_target = {}
+        self.names = []
+        for i, a in enumerate(self.acis):
+            self.names.append(a.name.lower())
+            self.by_name.setdefault(a.name.lower(), []).append(i)
+            prefix, name = _parse_aci_name(a.name)
+            self.by_aciname.setdefault(name, []).append(i)
+            self.by_prefix.setdefault(prefix, []).append(i)
+            if 'targetattr' in a.target:
+                for attr in set(t.lower() for t in
+                                a.target['targetattr']['expression']):
+                    self.by_targetattr.setdefault(attr, []).append(i)
+            for permission in set(a.permissions):
+                self.by_permission.setdefault(permission, []).append(i)
+            self.by_bindrule.setdefault(
+                a.bindrule['expression'], []).append(i)
+            if 'targetfilter' in a.target:
+                self.by_targetfilter.setdefault(
+                    a.target['targetfilter']['expression'], []).append(i)
+            if 'target' in a.target:
+                self.by_target.setdefault(
+                    a.target['target']['expression'].lower(), []).append(i)
+
+    def get_string(self, name):
+        """
+        Return the ACI string of the ACI named ``name``, or None.
+        """
+        for i in self.by_name.get(name.lower(), ()):
+            if self.acis[i].name == name:
+                return self.strings[i]
+        return None
+
+    def find(self, term=None, aciname=None, aciprefix=None, attrs=None,
+             bindrule=None, permissions=None, memberof_filter=None,
+             target=None, selfaci=False, group=None, targetgroup=None,
+             group_container_dn=None, filter=None, subtree=None):
+        """
+        Return the ACIs matching all of the given criteria, in the order
+        in which they are stored in the entry.
+        """
+        # positions of the matching ACIs, None means all
+        matches = [None]
+
+        def narrow(positions):
+            if matches[0] is None:
+                matches[0] = set(positions)
+            else:
+                matches[0].intersection_update(positions)
+
+        def narrow_by(predicate):
+            if matches[0] is None:
+                matches[0] = set(range(len(self.acis)))
+            matches[0] = set(i for i in matches[0]
+                             if predicate(self.acis[i]))
+
+        if term:
+            term = term.lower()
+            narrow(i for i, name in enumerate(self.names) if term in name)
+
+        if aciname:
+            narrow(self.by_aciname.get(aciname, ()))
+
+        if aciprefix:
+            narrow(self.by_prefix.get(aciprefix, ()))
+
+        if attrs:
+            for attr in set(t.lower() for t in attrs):
+                narrow(self.by_targetattr.get(attr, ()))
+
+        if bindrule:
+            narrow(self.by_bindrule.get(bindrule, ()))
+
+        if permissions:
+            for permission in set(permissions):
+                narrow(self.by_permission.get(permission, ()))
+
+        if memberof_filter:
+            narrow(self.by_targetfilter.get(memberof_filter, ()))
+
+        if target is not None:
+            narrow(i for i in self.by_target.get(target.lower(), ())
+                   if self.acis[i].target['target']['expression'] == target)
+
+        if selfaci:
+            narrow(self.by_bindrule.get(u'ldap:///self', ()))
+
+        if group:
+            def match_group(a):
+                groupdn = a.bindrule['expression']
+                try:
+                    groupdn = DN(groupdn.replace('ldap:///',''))
+                    cn = groupdn[0]['cn']
+                except (ValueError, IndexError, KeyError):
+                    cn = None
+                return cn is not None and cn == group
+            narrow_by(match_group)
+
+        if targetgroup:
+            def match_targetgroup(a):
+                if 'target' not in a.target:
+                    return False
+                target = a.target['target']['expression']
+                targetdn = DN(target.replace('ldap:///',''))
+                if not targetdn.endswith(group_container_dn):
+                    return False
+                try:
+                    cn = targetdn[0]['cn']
+                except (IndexError, KeyError):
+                    cn = None
+                return cn == targetgroup
+            narrow_by(match_targetgroup)
+
+        if filter:
+            narrow(self.by_targetfilter.get(filter, ()))
+
+        if subtree:
+            narrow(self.by_target.get(subtree.lower(), ()))
+
+        if matches[0] is None:
+            return list(self.acis)
+        return [self.acis[i] for i in sorted(matches[0])]
+
+
+# Maximum number of parsed ACI lists remembered by get_parsed_acis()
+PARSED_ACIS_CACHE_SIZE = 16
+
+# (DN, ACI strings) -> ParsedACIs, least recently used first
+_parsed_acis_cache = OrderedDict()
+_parsed_acis_lock = threading.Lock()
+
+
+def get_parsed_acis(ldap, dn):
+    """
+    Return the ParsedACIs of the entry at ``dn``.
+
+    The ACIs are always read with the caller's bind, so only ACIs the
+    caller may read are returned. Only parsing them is cached: the
+    result is shared by all requests of the process which read the same
+    ACI values.
+    """
+    entry = ldap.get_entry(dn, ['aci'])
+    key = (DN(dn), tuple(entry.get('aci', [])))
+
+    with _parsed_acis_lock:
+        try:
+            parsed = _parsed_acis_cache.pop(key)
+        except KeyError:
+            parsed = None
+        else:
+            _parsed_acis_cache[key] = parsed
+    if parsed is not None:
+        return parsed
+
+    parsed = ParsedACIs(key[0], key[1])
+    with _parsed_acis_lock:
+        _parsed_acis_cache[key] = parsed
+        while len(_parsed_acis_cache) > PARSED_ACIS_CACHE_SIZE:
+            _parsed_acis_cache.popitem(last=False)
+    return parsed
+
+
 def validate_permissions(ugettext, perm):
     perm = perm.strip().lower()
     if perm not in _valid_permissions_values:
@@ -702,46 +892,12 @@ class aci_find(crud.Search):
     def execute(self, term=None, **kw):
         ldap = self.api.Backend.ldap2
 
-        entry = ldap.get_entry(self.api.env.basedn, ['aci'])
-
-        acis = _convert_strings_to_acis(entry.get('aci', []))
-        results = []
-
-        if term:
-            term = term.lower()
-            for a in acis:
-                if a.name.lower().find(term) != -1 and a not in results:
-                    results.append(a)
-            acis = list(results)
-        else:
-            results = list(acis)
-
-        if kw.get('aciname'):
-            for a in acis:
-                prefix, name = _parse_aci_name(a.name)
-                if name != kw['aciname']:
-                    results.remove(a)
-            acis = list(results)
-
-        if kw.get('aciprefix'):
-            for a in acis:
-                prefix, name = _parse_aci_name(a.name)
-                if prefix != kw['aciprefix']:
-                    results.remove(a)
-            acis = list(results)
-
-        if kw.get('attrs'):
-            for a in acis:
-                if not 'targetattr' in a.target:
-                    results.remove(a)
-                    continue
-                alist1 = sorted(
-                    [t.lower() for t in a.target['targetattr']['expression']]
-                )
-                alist2 = sorted([t.lower() for t in kw['attrs']])
-                if len(set(alist1) & set(alist2)) != len(alist2):
-                    results.remove(a)
-            acis = list(results)
+        parsed = get_parsed_acis(ldap, self.api.env.basedn)
+        criteria = dict(
+            (name, kw.get(name)) for name in (
+                'aciname', 'aciprefix', 'attrs', 'permissions', 'group',
+                'targetgroup', 'subtree'))
+        criteria['selfaci'] = kw.get('selfaci', False) is True
 
         if kw.get('permission'):
             try:
@@ -751,19 +907,7 @@ class aci_find(crud.Search):
             except errors.NotFound:
                 pass
             else:
-                for a in acis:
-                    uri = 'ldap:///%s' % entry.dn
-                    if a.bindrule['expression'] != uri:
-                        results.remove(a)
-                acis = list(results)
-
-        if kw.get('permissions'):
-            for a in acis:
-                alist1 = sorted(a.permissions)
-                alist2 = sorted(kw['permissions'])
-                if len(set(alist1) & set(alist2)) != len(alist2):
-                    results.remove(a)
-            acis = list(results)
+                criteria['bindrule'] = 'ldap:///%s' % parsed.dn
 
         if kw.get('memberof'):
             try:
@@ -771,96 +915,21 @@ class aci_find(crud.Search):
             except errors.NotFound:
                 pass
             else:
-                memberof_filter = '(memberOf=%s)' % dn
-                for a in acis:
-                    if 'targetfilter' in a.target:
-                        targetfilter = a.target['targetfilter']['expression']
-                        if targetfilter != memberof_filter:
-                            results.remove(a)
-                    else:
-                        results.remove(a)
+                criteria['memberof_filter'] = '(memberOf=%s)' % dn
 
         if kw.get('type'):
-            for a in acis:
-                if 'target' in a.target:
-                    target = a.target['target']['expression']
-                else:
-                    results.remove(a)
-                    continue
-                found = False
-                for k in _type_map.keys():
-                    if _type_map[k] == target and kw['type'] == k:
-                        found = True
-                        break
-                if not found:
-                    try:
-                        results.remove(a)
-                    except ValueError:
-                        pass
-
-        if kw.get('selfaci', False) is True:
-            for a in acis:
-                if a.bindrule['expression'] != u'ldap:///self':
-                    try:
-                        results.remove(a)
-                    except ValueError:
-                        pass
-
-        if kw.get('group'):
-            for a in acis:
-                groupdn = a.bindrule['expression']
-                groupdn = DN(groupdn.replace('ldap:///',''))
-                try:
-                    cn = groupdn[0]['cn']
-                except (IndexError, KeyError):
-                    cn = None
-                if cn is None or cn != kw['group']:
-                    try:
-                        results.remove(a)
-                    except ValueError:
-                        pass
+            criteria['target'] = _type_map.get(kw['type'], u'')
 
         if kw.get('targetgroup'):
-            for a in acis:
-                found = False
-                if 'target' in a.target:
-                    target = a.target['target']['expression']
-                    targetdn = DN(target.replace('ldap:///',''))
-                    group_container_dn = DN(api.env.container_group, api.env.basedn)
-                    if targetdn.endswith(group_container_dn):
-                        try:
-                            cn = targetdn[0]['cn']
-                        except (IndexError, KeyError):
-                            cn = None
-                        if cn == kw['targetgroup']:
-                            found = True
-                if not found:
-                    try:
-                        results.remove(a)
-                    except ValueError:
-                        pass
+            criteria['group_container_dn'] = DN(
+                api.env.container_group, api.env.basedn)
 
         if kw.get('filter'):
             if not kw['filter'].startswith('('):
                 kw['filter'] = unicode('('+kw['filter']+')')
-            for a in acis:
-                if 'targetfilter' not in a.target or\
-                    not a.target['targetfilter']['expression'] or\
-                    a.target['targetfilter']['expression'] != kw['filter']:
-                    results.remove(a)
-
-        if kw.get('subtree'):
-            for a in acis:
-                if 'target' in a.target:
-                    target = a.target['target']['expression']
-                else:
-                    results.remove(a)
-                    continue
-                if kw['subtree'].lower() != target.lower():
-                    try:
-                        results.remove(a)
-                    except ValueError:
-                        pass
+            criteria['filter'] = kw['filter']
+
+        results = parsed.find(term, **criteria)
 
         acis = []
         for result in results:
@@ -904,9 +973,7 @@ class aci_show(crud.Retrieve):
         ldap = self.api.Backend.ldap2
 
         dn = kw.get('location', self.api.env.basedn)
-        entry = ldap.get_entry(dn, ['aci'])
-
-        acis = _convert_strings_to_acis(entry.get('aci', []))
+        acis = get_parsed_acis(ldap, dn).acis
 
         aci = _find_aci_by_name(acis, kw['aciprefix'], aciname)
         if kw.get('raw', False):
@@ -44,6 +44,12 @@ if six.PY3:
 
 DNA_MAGIC = -1
 
+# Number of entries whose indirect members are resolved in a single search
+INDIRECT_MEMBERS_BATCH_SIZE = 100
+
+# member values containing these need full DN parsing
+_SPECIAL_DN_CHARS = u'\\"+;<>#'
+
 global_output_params = (
     Flag('has_password',
         label=_('Password'),
@@ -639,11 +645,86 @@ class LDAPObject(Object):
         oc = [x.lower() for x in classes]
         return objectclass.lower() in oc
 
+    def _on_finalize(self):
+        super(LDAPObject, self)._on_finalize()
+        self._member_containers = self._build_member_containers()
+
+    def _build_member_containers(self):
+        """
+        Index the containers of the objects in attribute_members.
+
+        Returns a dict mapping each member attribute to a pair of dicts,
+        one keyed by container DN and one keyed by the lower-cased string
+        form of the container DN. The values are (position, LDAPObject)
+        tuples, the position in attribute_members decides which object
+        wins when a member DN is in the containers of several objects.
+        """
+        index = {}
+        for attr, ldap_obj_names in self.attribute_members.items():
+            by_dn = {}
+            by_str = {}
+            for position, ldap_obj_name in enumerate(ldap_obj_names):
+                if ldap_obj_name not in self.api.Object:
+                    continue
+                ldap_obj = self.api.Object[ldap_obj_name]
+                container_dn = DN(ldap_obj.container_dn, self.api.env.basedn)
+                by_dn.setdefault(container_dn, (position, ldap_obj))
+                by_str.setdefault(
+                    str(container_dn).lower(), (position, ldap_obj))
+            index[attr] = (by_dn, by_str)
+        return index
+
+    @staticmethod
+    def _find_member_container(containers, suffixes):
+        found = None
+        for suffix in suffixes:
+            match = containers.get(suffix)
+            if match is not None and (found is None or match[0] < found[0]):
+                found = match
+        return found
+
+    def _convert_member_value(self, member, by_dn, by_str):
+        """
+        Return a (LDAPObject, primary key) tuple for a raw member value.
+
+        Plain member values (no escaped or multi-valued RDNs) are handled
+        on the string level, anything else is converted to a DN first.
+        Returns None if the member is not in any of the indexed containers.
+        """
+        if isinstance(member, bytes):
+            member = member.decode('utf-8')
+        if not any(c in member for c in _SPECIAL_DN_CHARS):
+            parts = member.split(',')
+            rdns = [part.split('=') for part in parts]
+            if all(len(rdn) == 2 and
+                   rdn[0].strip() == rdn[0] and rdn[0] and
+                   rdn[1].strip() == rdn[1] and rdn[1]
+                   for rdn in rdns):
+                found = self._find_member_container(
+                    by_str,
+                    (u','.join(parts[i:]).lower()
+                     for i in range(len(parts))))
+                if found is None:
+                    return None
+                ldap_obj = found[1]
+                if (not ldap_obj.rdn_attribute and
+                        rdns[0][0] == ldap_obj.primary_key.name):
+                    return ldap_obj, rdns[0][1]
+                return ldap_obj, ldap_obj.get_primary_key_from_dn(
+                    DN(member))
+
+        memberdn = DN(member)
+        found = self._find_member_container(
+            by_dn, (memberdn[i:] for i in range(len(memberdn))))
+        if found is None:
+            return None
+        ldap_obj = found[1]
+        return ldap_obj, ldap_obj.get_primary_key_from_dn(memberdn)
+
     def convert_attribute_members(self, entry_attrs, *keys, **options):
         if options.get('raw', False):
             return
 
-        container_dns = {}
         new_attrs = {}
 
         for attr in self.attribute_members:
@@ -653,26 +734,19 @@ class LDAPObject(Object):
                 continue
             del entry_attrs[attr]
 
+            by_dn, by_str = self._member_containers[attr]
             for member in value:
-                memberdn = DN(member)
-                for ldap_obj_name in self.attribute_members[attr]:
-                    ldap_obj = self.api.Object[ldap_obj_name]
-                    try:
-                        container_dn = container_dns[ldap_obj_name]
-                    except KeyError:
-                        container_dn = DN(ldap_obj.container_dn, api.env.basedn)
-                        container_dns[ldap_obj_name] = container_dn
-
-                    if memberdn.endswith(container_dn):
-                        new_value = ldap_obj.get_primary_key_from_dn(memberdn)
-                        new_attr_name = '%s_%s' % (attr, ldap_obj.name)
-                        try:
-                            new_attr = new_attrs[new_attr_name]
-                        except KeyError:
-                            new_attr = entry_attrs.setdefault(new_attr_name, [])
-                            new_attrs[new_attr_name] = new_attr
-                        new_attr.append(new_value)
-                        break
+                converted = self._convert_member_value(member, by_dn, by_str)
+                if converted is None:
+                    continue
+                ldap_obj, new_value = converted
+                new_attr_name = '%s_%s' % (attr, ldap_obj.name)
+                try:
+                    new_attr = new_attrs[new_attr_name]
+                except KeyError:
+                    new_attr = entry_attrs.setdefault(new_attr_name, [])
+                    new_attrs[new_attr_name] = new_attr
+                new_attr.append(new_value)
 
     def get_indirect_members(self, entry_attrs, attrs_list):
         if 'memberindirect' in attrs_list:
@@ -680,6 +754,20 @@ class LDAPObject(Object):
         if 'memberofindirect' in attrs_list:
             self.get_memberofindirect(entry_attrs)
 
+    def get_indirect_members_batch(self, entries, attrs_list):
+        """
+        Same as get_indirect_members, for a list of entries.
+
+        The indirect members are resolved with one search per
+        INDIRECT_MEMBERS_BATCH_SIZE entries rather than per entry, the
+        searches for indirect membership of these entries are sent
+        without waiting for each other.
+        """
+        if 'memberindirect' in attrs_list:
+            self.get_memberindirect_batch(entries)
+        if 'memberofindirect' in attrs_list:
+            self.get_memberofindirect_batch(entries)
+
     def get_memberindirect(self, group_entry):
         """
         Get indirect members
@@ -688,15 +776,11 @@ class LDAPObject(Object):
         mo_filter = self.backend.make_filter({'memberof': group_entry.dn})
         filter = self.backend.combine_filters(
             ('(member=*)', mo_filter), self.backend.MATCH_ALL)
-        try:
-            result = self.backend.get_entries(
-                self.api.env.basedn,
-                filter=filter,
-                attrs_list=['member'],
-                size_limit=-1, # paged search will get everything anyway
-                paged_search=True)
-        except errors.NotFound:
-            result = []
+        # stream the results, only the member values need to be kept
+        result = self.backend.iter_entries(
+            filter, ['member'], self.api.env.basedn,
+            size_limit=-1,  # paged search will get everything anyway
+            paged_search=True)
 
         indirect = set()
         for entry in result:
@@ -711,13 +795,8 @@ class LDAPObject(Object):
         dn = entry.dn
         filter = self.backend.make_filter(
             {'member': dn, 'memberuser': dn, 'memberhost': dn})
-        try:
-            result = self.backend.get_entries(
-                self.api.env.basedn,
-                filter=filter,
-                attrs_list=[''])
-        except errors.NotFound:
-            result = []
+        result = self.backend.iter_entries(
+            filter, [''], self.api.env.basedn)
 
         direct = set()
         indirect = set(entry.raw.get('memberof', []))
@@ -731,6 +810,74 @@ class LDAPObject(Object):
         if indirect:
             entry.raw['memberofindirect'] = list(indirect)
 
+    def get_memberindirect_batch(self, group_entries):
+        """
+        Get indirect members of all group_entries
+        """
+        for i in range(0, len(group_entries), INDIRECT_MEMBERS_BATCH_SIZE):
+            batch = group_entries[i:i + INDIRECT_MEMBERS_BATCH_SIZE]
+
+            # group DN -> indirect members
+            indirect = dict((DN(e.dn), set()) for e in batch)
+
+            mo_filter = self.backend.make_filter_from_attr(
+                'memberof', [e.dn for e in batch], self.backend.MATCH_ANY)
+            filter = self.backend.combine_filters(
+                ('(member=*)', mo_filter), self.backend.MATCH_ALL)
+            result = self.backend.iter_entries(
+                filter, ['member', 'memberof'], self.api.env.basedn,
+                size_limit=-1,  # paged search will get everything anyway
+                paged_search=True)
+
+            for entry in result:
+                members = entry.raw.get('member', [])
+                for memberof in entry.get('memberof', []):
+                    try:
+                        indirect[DN(memberof)].update(members)
+                    except KeyError:
+                        pass
+
+            for group_entry in batch:
+                members = indirect[DN(group_entry.dn)]
+                members.difference_update(group_entry.raw.get('member', []))
+                if members:
+                    group_entry.raw['memberindirect'] = list(members)
+
+    def get_memberofindirect_batch(self, entries):
+        """
+        Get indirect membership of all entries
+
+        The searches for the direct parents of the entries of a batch are
+        sent at once. Like in get_memberofindirect(), only the DNs of the
+        parents are read, never their (possibly long) member lists.
+        """
+        for i in range(0, len(entries), INDIRECT_MEMBERS_BATCH_SIZE):
+            batch = entries[i:i + INDIRECT_MEMBERS_BATCH_SIZE]
+
+            msgids = []
+            for entry in batch:
+                dn = entry.dn
+                filter = self.backend.make_filter(
+                    {'member': dn, 'memberuser': dn, 'memberhost': dn})
+                msgids.append(self.backend.find_entries_async(
+                    filter, [''], self.api.env.basedn))
+
+            for entry, msgid in zip(batch, msgids):
+                direct_dns = set(
+                    DN(group_entry.dn)
+                    for group_entry in self.backend.get_async_result(msgid))
+                direct = set()
+                indirect = set()
+                for dn in entry.raw.get('memberof', []):
+                    if DN(self.backend.decode(dn, 'memberof')) in direct_dns:
+                        direct.add(dn)
+                    else:
+                        indirect.add(dn)
+
+                entry.raw['memberof'] = list(direct)
+                if indirect:
+                    entry.raw['memberofindirect'] = list(indirect)
+
     def get_password_attributes(self, ldap, dn, entry_attrs):
         """
         Search on the entry to determine if it has a password or
@@ -2035,8 +2182,8 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
                 entries.sort(key=sort_key)
 
         if not options.get('raw', False):
+            self.obj.get_indirect_members_batch(entries, attrs_list)
             for e in entries:
-                self.obj.get_indirect_members(e, attrs_list)
                 self.obj.convert_attribute_members(e, *args, **options)
 
         for (i, e) in enumerate(entries):
@@ -45,15 +45,20 @@ And then a nested response for each IPA command method sent in the request
 
 """
 
+import os
+import threading
+import time
+
 import six
+from six.moves import queue
 
 from ipalib import api, errors
 from ipalib import Command
 from ipalib.frontend import Local
-from ipalib.parameters import Str, Dict
+from ipalib.parameters import Flag, Str, Dict
 from ipalib.output import Output
 from ipalib.text import _
-from ipalib.request import context
+from ipalib.request import context, destroy_context
 from ipalib.plugable import Registry
 from ipapython.version import API_VERSION
 
@@ -62,16 +67,109 @@ if six.PY3:
 
 register = Registry()
 
+
+class WorkerPool(object):
+    """
+    Bounded pool of reusable worker threads.
+
+    Threads are started on demand, up to max_workers, and kept for later
+    tasks.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._tasks = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = 0
+        # threads not executing a task and tasks not taken by a thread
+        self._idle = 0
+        self._queued = 0
+
+    def _run(self):
+        while True:
+            task, done = self._tasks.get()
+            with self._lock:
+                self._idle -= 1
+                self._queued -= 1
+            try:
+                task()
+            except Exception:
+                # tasks report their own errors, keep the thread
+                pass
+            with self._lock:
+                self._idle += 1
+            done.set()
+
+    def submit(self, task):
+        """
+        Execute task() in a worker thread.
+
+        Returns an event which is set when the task is finished.
+        """
+        done = threading.Event()
+        with self._lock:
+            self._queued += 1
+            if (self._queued > self._idle and
+                    self._threads < self.max_workers):
+                self._threads += 1
+                self._idle += 1
+                thread = threading.Thread(target=self._run,
+                                          name='batch-worker')
+                thread.daemon = True
+                thread.start()
+            self._tasks.put((task, done))
+        return done
+
+
 @register()
 class batch(Command):
     NO_CLI = True
 
+    # maximum number of threads executing methods of a parallel batch
+    max_workers = 8
+
+    # methods which only read and may be executed concurrently
+    parallel_methods = frozenset([
+        'automember_find', 'automember_show',
+        'config_show',
+        'delegation_find', 'delegation_show',
+        'dnsrecord_find', 'dnsrecord_show',
+        'dnszone_find', 'dnszone_show',
+        'group_find', 'group_show',
+        'hbacrule_find', 'hbacrule_show',
+        'hbacsvc_find', 'hbacsvc_show',
+        'hbacsvcgroup_find', 'hbacsvcgroup_show',
+        'host_find', 'host_show',
+        'hostgroup_find', 'hostgroup_show',
+        'idrange_find', 'idrange_show',
+        'idview_find', 'idview_show',
+        'netgroup_find', 'netgroup_show',
+        'permission_find', 'permission_show',
+        'privilege_find', 'privilege_show',
+        'pwpolicy_find', 'pwpolicy_show',
+        'realmdomains_show',
+        'role_find', 'role_show',
+        'selfservice_find', 'selfservice_show',
+        'service_find', 'service_show',
+        'stageuser_find', 'stageuser_show',
+        'sudocmd_find', 'sudocmd_show',
+        'sudocmdgroup_find', 'sudocmdgroup_show',
+        'sudorule_find', 'sudorule_show',
+        'user_find', 'user_show',
+    ])
+
     takes_args = (
         Dict('methods*',
             doc=_('Nested Methods to execute'),
         ),
     )
 
+    takes_options = (
+        Flag('parallel?',
+            doc=_('Execute consecutive read-only methods concurrently'),
+        ),
+    )
+
     take_options = (
         Str('version',
             cli_name='version',
@@ -88,70 +186,139 @@ class batch(Command):
         Output('results', (list, tuple), doc='')
     )
 
-    def execute(self, methods=None, **options):
-        results = []
-        for arg in (methods or []):
-            params = dict()
-            name = None
+    def __init__(self, api):
+        super(batch, self).__init__(api)
+        self._pool = WorkerPool(self.max_workers)
+
+    def _is_read_only(self, arg):
+        try:
+            name = arg['method']
+            return name in self.parallel_methods and name in self.api.Command
+        except (KeyError, TypeError):
+            return False
+
+    def _execute_method(self, arg, options):
+        params = dict()
+        name = None
+        start = time.time()
+        try:
+            if 'method' not in arg:
+                raise errors.RequirementError(name='method')
+            if 'params' not in arg:
+                raise errors.RequirementError(name='params')
+            name = arg['method']
+            if (name not in self.api.Command or
+                    isinstance(self.api.Command[name], Local)):
+                raise errors.CommandError(name=name)
+
+            # If params are not formated as a tuple(list, dict)
+            # the following lines will raise an exception
+            # that triggers an internal server error
+            # Raise a ConversionError instead to report the issue
+            # to the client
             try:
-                if 'method' not in arg:
-                    raise errors.RequirementError(name='method')
-                if 'params' not in arg:
-                    raise errors.RequirementError(name='params')
-                name = arg['method']
-                if (name not in self.api.Command or
-                        isinstance(self.api.Command[name], Local)):
-                    raise errors.CommandError(name=name)
-
-                # If params are not formated as a tuple(list, dict)
-                # the following lines will raise an exception
-                # that triggers an internal server error
-                # Raise a ConversionError instead to report the issue
-                # to the client
-                try:
-                    a, kw = arg['params']
-                    newkw = dict((str(k), v) for k, v in kw.items())
-                    params = api.Command[name].args_options_2_params(
-                        *a, **newkw)
-                except (AttributeError, ValueError, TypeError):
-                    raise errors.ConversionError(
-                        name='params',
-                        error=_(u'must contain a tuple (list, dict)'))
-                newkw.setdefault('version', options['version'])
-
-                result = api.Command[name](*a, **newkw)
+                a, kw = arg['params']
+                newkw = dict((str(k), v) for k, v in kw.items())
+                params = api.Command[name].args_options_2_params(
+                    *a, **newkw)
+            except (AttributeError, ValueError, TypeError):
+                raise errors.ConversionError(
+                    name='params',
+                    error=_(u'must contain a tuple (list, dict)'))
+            newkw.setdefault('version', options['version'])
+
+            result = api.Command[name](*a, **newkw)
+            self.info(
+                '%s: batch: %s(%s): SUCCESS',
+                getattr(context, 'principal', 'UNKNOWN'),
+                name,
+                ', '.join(api.Command[name]._repr_iter(**params))
+            )
+            result['error']=None
+        except Exception as e:
+            if isinstance(e, errors.RequirementError) or \
+                isinstance(e, errors.CommandError):
                 self.info(
-                    '%s: batch: %s(%s): SUCCESS',
-                    getattr(context, 'principal', 'UNKNOWN'),
-                    name,
-                    ', '.join(api.Command[name]._repr_iter(**params))
+                    '%s: batch: %s',
+                    context.principal,  # pylint: disable=no-member
+                    e.__class__.__name__
                 )
-                result['error']=None
-            except Exception as e:
-                if isinstance(e, errors.RequirementError) or \
-                    isinstance(e, errors.CommandError):
-                    self.info(
-                        '%s: batch: %s',
-                        context.principal,  # pylint: disable=no-member
-                        e.__class__.__name__
-                    )
-                else:
-                    self.info(
-                        '%s: batch: %s(%s): %s',
-                        context.principal, name,  # pylint: disable=no-member
-                        ', '.join(api.Command[name]._repr_iter(**params)),
-                        e.__class__.__name__
-                    )
-                if isinstance(e, errors.PublicError):
-                    reported_error = e
-                else:
-                    reported_error = errors.InternalError()
-                result = dict(
-                    error=reported_error.strerror,
-                    error_code=reported_error.errno,
-                    error_name=unicode(type(reported_error).__name__),
-                    error_kw=reported_error.kw,
+            else:
+                self.info(
+                    '%s: batch: %s(%s): %s',
+                    context.principal, name,  # pylint: disable=no-member
+                    ', '.join(api.Command[name]._repr_iter(**params)),
+                    e.__class__.__name__
                 )
-            results.append(result)
-        return dict(count=len(results) , results=results)
+            if isinstance(e, errors.PublicError):
+                reported_error = e
+            else:
+                reported_error = errors.InternalError()
+            result = dict(
+                error=reported_error.strerror,
+                error_code=reported_error.errno,
+                error_name=unicode(type(reported_error).__name__),
+                error_kw=reported_error.kw,
+            )
+        if options.get('parallel'):
+            result['elapsed'] = time.time() - start
+        return result
+
+    def _execute_concurrently(self, indexes, methods, results, ccache,
+                              options):
+        """
+        Execute methods[i] for i in indexes in worker threads, each with
+        its own LDAP connection, and store the results in results[i].
+        """
+        pending = queue.Queue()
+        for i in indexes:
+            pending.put(i)
+
+        def worker():
+            try:
+                self.api.Backend.ldap2.connect(ccache=ccache)
+                while True:
+                    try:
+                        i = pending.get_nowait()
+                    except queue.Empty:
+                        break
+                    results[i] = self._execute_method(methods[i], options)
+            except Exception as e:
+                self.error('batch: worker failed: %s', e)
+            finally:
+                destroy_context()
+
+        workers = [self._pool.submit(worker)
+                   for _i in range(min(self.max_workers, len(indexes)))]
+        for done in workers:
+            done.wait()
+
+        # methods left over by failed workers are executed here
+        for i in indexes:
+            if results[i] is None:
+                results[i] = self._execute_method(methods[i], options)
+
+    def execute(self, methods=None, **options):
+        methods = methods or []
+        ccache = os.environ.get('KRB5CCNAME')
+        if not (options.get('parallel') and self.api.env.in_server and
+                ccache is not None):
+            results = [self._execute_method(arg, options) for arg in methods]
+            return dict(count=len(results), results=results)
 
+        # Consecutive read-only methods are executed concurrently, other
+        # methods are executed one by one in order as before.
+        results = [None] * len(methods)
+        i = 0
+        while i < len(methods):
+            j = i
+            while j < len(methods) and self._is_read_only(methods[j]):
+                j += 1
+            if j - i > 1:
+                self._execute_concurrently(range(i, j), methods, results,
+                                           ccache, options)
+            else:
+                j = i + 1
+                results[i] = self._execute_method(methods[i], options)
+            i = j
+        return dict(count=len(results), results=results)
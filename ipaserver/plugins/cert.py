@@ -85,6 +85,12 @@ Dates are treated as GMT to match the dates in the certificates.
 """) + _("""
 The date format is YYYY-mm-dd.
 """) + _("""
+Searches return at most 100 certificates by default. --sizelimit=0
+retrieves every matching certificate from the CA, 100 at a time. When the
+owners of the certificates are searched for or shown, or --all is used,
+each certificate is also retrieved from the CA separately, so such a
+search can take a long time on a CA with many certificates.
+""") + _("""
 EXAMPLES:
 """) + _("""
  Request a new certificate and add the principal:
@@ -1049,8 +1055,7 @@ class cert_find(Search, CertMethod):
                     value = unicode(value)
                 ra_options[name] = value
             if sizelimit is not None:
-                if sizelimit != 0:
-                    ra_options['sizelimit'] = sizelimit
+                ra_options['sizelimit'] = sizelimit
                 sizelimit = 0
                 has_ca_options = True
 
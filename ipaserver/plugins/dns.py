@@ -21,6 +21,8 @@
 from __future__ import absolute_import
 
 import netaddr
+import random
+import threading
 import time
 import re
 import binascii
@@ -338,6 +340,13 @@ _IN = dns.rdataclass.IN
 # NS record type
 _NS = dns.rdatatype.from_text('NS')
 
+# wait_for_dns: delay between DNS queries is doubled after each attempt,
+# starting at the minimum and never exceeding the maximum (in seconds)
+WAIT_FOR_DNS_MIN_DELAY = 0.1
+WAIT_FOR_DNS_MAX_DELAY = 2
+# wait_for_dns: maximal number of records checked concurrently
+WAIT_FOR_DNS_THREADS = 8
+
 _output_permissions = (
     output.summary,
     output.Output('result', bool, _('True means the operation was successful')),
@@ -3305,39 +3314,64 @@ class dnsrecord(LDAPObject):
 
         return ldap_rrsets
 
-    def wait_for_modified_attr(self, ldap_rrset, rdtype, dns_name):
+    def _get_wait_resolver(self):
+        resolver = dns.resolver.Resolver()
+        resolver.set_flags(0)  # disable recursion (for NS RR checks)
+        # a single query must not take longer than the whole wait
+        resolver.lifetime = min(resolver.lifetime,
+                                max(int(self.api.env['wait_for_dns']), 1))
+        return resolver
+
+    def _get_wait_deadline(self):
+        # wait_for_dns is the number of seconds to wait in total
+        return time.time() + int(self.api.env['wait_for_dns'])
+
+    def wait_for_modified_attr(self, ldap_rrset, rdtype, dns_name,
+                               resolver=None, deadline=None, stop=None):
         '''Wait until DNS resolver returns up-to-date answer for given RRset
-            or until the maximum number of attempts is reached.
-            Number of attempts is controlled by self.api.env['wait_for_dns'].
+            or until the deadline is reached.
+            The DNS server is queried with exponential backoff, at least
+            once.
 
         :param ldap_rrset:
             None if given rdtype should not exist or
             dns.rrset.RRset to match against data in DNS.
         :param dns_name: FQDN to query
         :type dns_name: dns.name.Name
+        :param resolver: dns.resolver.Resolver to use
+        :param deadline: time.time() when to give up, defaults to
+            self.api.env['wait_for_dns'] seconds from now
+        :param stop: threading.Event, stop waiting once it is set
         :return: None if data in DNS and LDAP match
         :raises errors.DNSDataMismatch: if data in DNS and LDAP doesn't match
         :raises dns.exception.DNSException: if DNS resolution failed
         '''
-        resolver = dns.resolver.Resolver()
-        resolver.set_flags(0)  # disable recursion (for NS RR checks)
-        max_attempts = int(self.api.env['wait_for_dns'])
-        warn_attempts = max_attempts // 2
-        period = 1  # second
+        if resolver is None:
+            resolver = self._get_wait_resolver()
+        if deadline is None:
+            deadline = self._get_wait_deadline()
+        warn_time = time.time() + (deadline - time.time()) / 2
         attempt = 0
         log_fn = self.log.debug
         log_fn('querying DNS server: expecting answer {%s}', ldap_rrset)
         wait_template = 'waiting for DNS answer {%s}: got {%s} (attempt %s); '\
-                        'waiting %s seconds before next try'
+                        'waiting %.1f seconds before next try'
 
-        while attempt < max_attempts:
-            if attempt >= warn_attempts:
+        while True:
+            if time.time() >= warn_time:
                 log_fn = self.log.warning
+            backoff = min(WAIT_FOR_DNS_MAX_DELAY,
+                          WAIT_FOR_DNS_MIN_DELAY * 2 ** attempt)
             attempt += 1
             try:
-                dns_answer = resolver.query(dns_name, rdtype,
-                                            dns.rdataclass.IN,
-                                            raise_on_no_answer=False)
+                try:
+                    dns_answer = resolver.query(dns_name, rdtype,
+                                                dns.rdataclass.IN,
+                                                raise_on_no_answer=False)
+                finally:
+                    # random jitter, never sleep past the deadline
+                    delay = min(random.uniform(backoff / 2, backoff),
+                                deadline - time.time())
                 dns_rrset = None
                 if rdtype == _NS:
                     # NS records can be in Authority section (sometimes)
@@ -3353,38 +3387,101 @@ class dnsrecord(LDAPObject):
                            attempt)
                     return
 
+                if delay <= 0:
+                    # The deadline was reached
+                    raise errors.DNSDataMismatch(expected=ldap_rrset,
+                                                 got=dns_rrset)
                 log_msg = wait_template % (ldap_rrset, dns_answer.response,
-                                           attempt, period)
+                                           attempt, delay)
 
             except (dns.resolver.NXDOMAIN,
                     dns.resolver.YXDOMAIN,
                     dns.resolver.NoNameservers,
                     dns.resolver.Timeout) as e:
-                if attempt >= max_attempts:
+                if delay <= 0:
                     raise
                 else:
                     log_msg = wait_template % (ldap_rrset, type(e), attempt,
-                                               period)
+                                               delay)
 
             log_fn(log_msg)
-            time.sleep(period)
+            if stop is None:
+                time.sleep(delay)
+            elif stop.wait(delay):
+                # Another check failed, the result does not matter anymore
+                return
 
-        # Maximum number of attempts was reached
-        else:
-            raise errors.DNSDataMismatch(expected=ldap_rrset, got=dns_rrset)
+    def _wait_for_rrset(self, ldap_rrset, rdtype, dns_name, nxdomain,
+                        resolver, deadline, stop):
+        try:
+            self.wait_for_modified_attr(ldap_rrset, rdtype, dns_name,
+                                        resolver, deadline, stop)
 
-    def wait_for_modified_attrs(self, entry_attrs, dns_name, dns_domain):
-        '''Wait until DNS resolver returns up-to-date answer for given entry
-            or until the maximum number of attempts is reached.
+        except dns.resolver.NXDOMAIN as e:
+            if not nxdomain:
+                e = errors.DNSDataMismatch(expected=ldap_rrset,
+                                           got="NXDOMAIN")
+                self.log.error(e)
+                raise e
 
-        :param entry_attrs:
-            None if the entry was deleted from LDAP or
-            LDAPEntry instance containing at least all modified attributes.
-        :param dns_name: FQDN
-        :type dns_name: dns.name.Name
-        :raises errors.DNSDataMismatch: if data in DNS and LDAP doesn't match
+        except dns.resolver.NoNameservers as e:
+            # Do not raise exception if we have got SERVFAILs.
+            # Maybe the user has created an invalid zone intentionally.
+            self.log.warning('waiting for DNS answer {%s}: got {%s}; '
+                          'ignoring', ldap_rrset, type(e))
+
+        except dns.exception.DNSException as e:
+            err_desc = str(type(e))
+            err_str = str(e)
+            if err_str:
+                err_desc += ": %s" % err_str
+            e = errors.DNSDataMismatch(expected=ldap_rrset, got=err_desc)
+            self.log.error(e)
+            raise e
+
+    def _wait_for_rrsets(self, checks):
+        '''Wait for all RRsets concurrently, until a common deadline.
+
+        :param checks: list of (ldap_rrset, rdtype, dns_name, nxdomain)
+        :raises errors.DNSDataMismatch: for the first check in the list
+            which failed
         '''
+        resolver = self._get_wait_resolver()
+        deadline = self._get_wait_deadline()
+        stop = threading.Event()
+
+        if len(checks) == 1:
+            self._wait_for_rrset(*(checks[0] + (resolver, deadline, stop)))
+            return
+
+        failures = [None] * len(checks)
+        pending = list(enumerate(checks))
+        lock = threading.Lock()
 
+        def worker():
+            while not stop.is_set():
+                with lock:
+                    if not pending:
+                        return
+                    i, check = pending.pop(0)
+                try:
+                    self._wait_for_rrset(*(check + (resolver, deadline, stop)))
+                except Exception as e:
+                    failures[i] = e
+                    stop.set()
+
+        threads = [threading.Thread(target=worker)
+                   for _i in range(min(len(checks), WAIT_FOR_DNS_THREADS))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for e in failures:
+            if e is not None:
+                raise e
+
+    def _get_wait_checks(self, entry_attrs, dns_name, dns_domain):
         # represent data in LDAP as dictionary rdtype => rrset
         ldap_rrsets = self._entry2rrsets(entry_attrs, dns_name, dns_domain)
         nxdomain = ldap_rrsets is None
@@ -3392,45 +3489,38 @@ class dnsrecord(LDAPObject):
             # name should not exist => ask for A record and check result
             ldap_rrsets = {dns.rdatatype.from_text('A'): None}
 
-        for rdtype, ldap_rrset in ldap_rrsets.items():
-            try:
-                self.wait_for_modified_attr(ldap_rrset, rdtype, dns_name)
+        return [(ldap_rrset, rdtype, dns_name, nxdomain)
+                for rdtype, ldap_rrset in ldap_rrsets.items()]
 
-            except dns.resolver.NXDOMAIN as e:
-                if nxdomain:
-                    continue
-                else:
-                    e = errors.DNSDataMismatch(expected=ldap_rrset,
-                                               got="NXDOMAIN")
-                    self.log.error(e)
-                    raise e
-
-            except dns.resolver.NoNameservers as e:
-                # Do not raise exception if we have got SERVFAILs.
-                # Maybe the user has created an invalid zone intentionally.
-                self.log.warning('waiting for DNS answer {%s}: got {%s}; '
-                              'ignoring', ldap_rrset, type(e))
-                continue
+    def wait_for_modified_attrs(self, entry_attrs, dns_name, dns_domain):
+        '''Wait until DNS resolver returns up-to-date answer for given entry
+            or until the deadline is reached. All record types are checked
+            concurrently.
 
-            except dns.exception.DNSException as e:
-                err_desc = str(type(e))
-                err_str = str(e)
-                if err_str:
-                    err_desc += ": %s" % err_str
-                e = errors.DNSDataMismatch(expected=ldap_rrset, got=err_desc)
-                self.log.error(e)
-                raise e
+        :param entry_attrs:
+            None if the entry was deleted from LDAP or
+            LDAPEntry instance containing at least all modified attributes.
+        :param dns_name: FQDN
+        :type dns_name: dns.name.Name
+        :raises errors.DNSDataMismatch: if data in DNS and LDAP doesn't match
+        '''
+        self._wait_for_rrsets(
+            self._get_wait_checks(entry_attrs, dns_name, dns_domain))
 
     def wait_for_modified_entries(self, entries):
-        '''Call wait_for_modified_attrs for all entries in given dict.
+        '''Wait for all entries in given dict like wait_for_modified_attrs.
+            All entries and record types are checked concurrently.
 
         :param entries:
             Dict {(dns_domain, dns_name): entry_for_wait_for_modified_attrs}
         '''
+        checks = []
         for entry_name, entry in entries.items():
             dns_domain = entry_name[0]
             dns_name = entry_name[1].derelativize(dns_domain)
-            self.wait_for_modified_attrs(entry, dns_name, dns_domain)
+            checks.extend(self._get_wait_checks(entry, dns_name, dns_domain))
+        if checks:
+            self._wait_for_rrsets(checks)
 
     def warning_if_ns_change_cause_fwzone_ineffective(self, result, *keys,
                                                       **options):
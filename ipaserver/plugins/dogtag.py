@@ -242,6 +242,8 @@ digits and nothing else follows.
 import datetime
 import json
 from lxml import etree
+import random
+import threading
 import time
 
 import six
@@ -252,6 +254,7 @@ from ipapython.dn import DN
 import ipapython.cookie
 from ipapython import dogtag
 from ipapython import ipautil
+from ipapython.ipa_log_manager import root_logger
 
 if api.env.in_server:
     import pki
@@ -1219,55 +1222,129 @@ def parse_unrevoke_cert_xml(doc):
     return response
 
 
-def host_has_service(host, ldap2, service='CA'):
-    """
-    :param host: A host which might be a master for a service.
-    :param ldap2: connection to the local database
-    :param service: The service for which the host might be a master.
-    :return:   (true, false)
+# Number of certificates fetched from the CA at once by ra.find()
+FIND_PAGE_SIZE = 100
+
+# Seconds for which the selected CA or KRA host is remembered
+HOST_SELECTION_TTL = 300
+
+# Seconds for which a host which failed to respond is not selected
+HOST_FAILURE_TTL = 60
 
-    Check if a specified host is a master for a specified service.
+
+class ServiceHostSelector(object):
     """
-    base_dn = DN(('cn', host), ('cn', 'masters'), ('cn', 'ipa'),
-                 ('cn', 'etc'), api.env.basedn)
-    filter_attrs = {
-        'objectClass': 'ipaConfigObject',
-        'cn': service,
-        'ipaConfigString': 'enabledService',
-        }
-    query_filter = ldap2.make_filter(filter_attrs, rules='&')
-    try:
-        ent, trunc = ldap2.find_entries(filter=query_filter, base_dn=base_dn)
-        if len(ent):
-            return True
-    except Exception:
-        pass
-    return False
-
-
-def select_any_master(ldap2, service='CA'):
+    Select the master to use for a service, such as CA or KRA.
+
+    ``api.env.ca_host`` is preferred, then the local host, then a master in
+    the same location as the local host, then any other master providing
+    the service. The selection is remembered for ``ttl`` seconds, so that
+    it does not cost LDAP searches on every request. When it expires, the
+    same host is selected again while it is still a candidate, so that its
+    keep-alive connections are reused. Hosts reported with `mark_failed()`
+    are not selected for ``failure_ttl`` seconds, unless there is no other
+    host.
     """
-    :param ldap2: connection to the local database
-    :param service: The service for which we're looking for a master.
-    :return:   host as str
 
-    Select any host which is a master for a specified service.
-    """
-    base_dn = DN(('cn', 'masters'), ('cn', 'ipa'), ('cn', 'etc'),
-                  api.env.basedn)
-    filter_attrs = {
-         'objectClass': 'ipaConfigObject',
-         'cn': service,
-         'ipaConfigString': 'enabledService',}
-    query_filter = ldap2.make_filter(filter_attrs, rules='&')
-    try:
-        ent, trunc = ldap2.find_entries(filter=query_filter, base_dn=base_dn)
-        if len(ent):
-            entry = random.choice(ent)
-            return entry.dn[1].value
-    except Exception:
-        pass
-    return None
+    def __init__(self, service, ttl=HOST_SELECTION_TTL,
+                 failure_ttl=HOST_FAILURE_TTL):
+        self.service = service
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self._host = None
+        self._expiration = 0
+        self._failed = {}
+        self._lock = threading.Lock()
+
+    def get_host(self, ldap2):
+        """
+        :param ldap2: connection to the local database
+        :return:   host
+                   as str
+        """
+        now = time.time()
+        with self._lock:
+            if self._host is not None and now < self._expiration:
+                return self._host
+
+        found = self._find_hosts(ldap2)
+        if found is None:
+            # do not remember the fallback, try again with the next request
+            return api.env.ca_host
+        hosts, location = found
+
+        with self._lock:
+            failed = set(h for h, t in self._failed.items() if t > now)
+            self._host = self._select(hosts, location, failed, self._host)
+            self._expiration = now + self.ttl
+            return self._host
+
+    def mark_failed(self, host):
+        """
+        Do not select ``host`` for a while, because it failed to respond.
+        """
+        with self._lock:
+            self._failed[host] = time.time() + self.failure_ttl
+            if host == self._host:
+                self._host = None
+
+    def _find_hosts(self, ldap2):
+        """
+        Return a dict mapping hosts which provide the service to the DN of
+        their location and the location of the local host, or None if the
+        search failed.
+        """
+        masters_dn = DN(('cn', 'masters'), ('cn', 'ipa'), ('cn', 'etc'),
+                        api.env.basedn)
+        service_filter = ldap2.make_filter({
+            'objectClass': 'ipaConfigObject',
+            'cn': self.service,
+            'ipaConfigString': 'enabledService',
+        }, rules='&')
+        # the locations are read from the master entries in the same search
+        query_filter = ldap2.combine_filters(
+            [service_filter, '(ipaLocation=*)'], rules='|')
+        try:
+            entries, _truncated = ldap2.find_entries(
+                filter=query_filter, base_dn=masters_dn,
+                attrs_list=['cn', 'ipaLocation'])
+        except errors.NotFound:
+            entries = []
+        except Exception as e:
+            root_logger.debug('Failed to look up %s masters: %s',
+                              self.service, e)
+            return None
+
+        locations = {}
+        hosts = set()
+        for entry in entries:
+            if entry.dn[1:] == masters_dn:
+                locations[entry.dn[0].value] = entry.single_value.get(
+                    'ipaLocation')
+            else:
+                hosts.add(entry.dn[1].value)
+        hosts = dict((host, locations.get(host)) for host in hosts)
+        # the local host may not provide the service itself
+        return hosts, locations.get(api.env.host)
+
+    def _select(self, hosts, location, failed, current=None):
+        candidates = [h for h in hosts if h not in failed] or list(hosts)
+        for host in (api.env.ca_host, api.env.host):
+            if host in candidates:
+                return host
+        if location is not None:
+            local = [h for h in candidates if hosts[h] == location]
+            if local:
+                candidates = local
+        if current in candidates:
+            return current
+        if candidates:
+            return random.choice(candidates)
+        return api.env.ca_host
+
+
+_ca_host_selector = ServiceHostSelector('CA')
+_kra_host_selector = ServiceHostSelector('KRA')
 
 #-------------------------------------------------------------------------------
 
@@ -1276,15 +1353,16 @@ if api.env.ra_plugin != 'dogtag':
     # In this case, abort loading this plugin module...
     raise SkipPluginModule(reason='dogtag not selected as RA plugin')
 import os
-import random
 from ipaserver.plugins import rabase
 from ipalib.constants import TYPE_ERROR
-from ipalib.util import cachedproperty
 from ipalib import _
 from ipaplatform.paths import paths
 
 register = Registry()
 
+# Keep-alive connections to Dogtag, shared by all the backends
+connection_pool = dogtag.ConnectionPool()
+
 
 @register()
 class ra(rabase.rabase):
@@ -1333,7 +1411,7 @@ class ra(rabase.rabase):
         self.error('%s.%s(): %s', type(self).__name__, func_name, err_msg)
         raise errors.CertificateOperationError(error=err_msg)
 
-    @cachedproperty
+    @property
     def ca_host(self):
         """
         :return:   host
@@ -1341,17 +1419,7 @@ class ra(rabase.rabase):
 
         Select our CA host.
         """
-        ldap2 = self.api.Backend.ldap2
-        if host_has_service(api.env.ca_host, ldap2, "CA"):
-            return api.env.ca_host
-        if api.env.host != api.env.ca_host:
-            if host_has_service(api.env.host, ldap2, "CA"):
-                return api.env.host
-        host = select_any_master(ldap2)
-        if host:
-            return host
-        else:
-            return api.env.ca_host
+        return _ca_host_selector.get_host(self.api.Backend.ldap2)
 
     def _request(self, url, port, **kw):
         """
@@ -1362,7 +1430,12 @@ class ra(rabase.rabase):
 
         Perform an HTTP request.
         """
-        return dogtag.http_request(self.ca_host, port, url, **kw)
+        ca_host = self.ca_host
+        try:
+            return dogtag.http_request(ca_host, port, url, **kw)
+        except errors.NetworkError:
+            _ca_host_selector.mark_failed(ca_host)
+            raise
 
     def _sslget(self, url, port, **kw):
         """
@@ -1373,7 +1446,15 @@ class ra(rabase.rabase):
 
         Perform an HTTPS request
         """
-        return dogtag.https_request(self.ca_host, port, url, self.sec_dir, self.password, self.ipa_certificate_nickname, **kw)
+        ca_host = self.ca_host
+        try:
+            return dogtag.https_request(
+                ca_host, port, url, self.sec_dir, self.password,
+                self.ipa_certificate_nickname,
+                connection_pool=connection_pool, **kw)
+        except errors.NetworkError:
+            _ca_host_selector.mark_failed(ca_host)
+            raise
 
     def get_parse_result_xml(self, xml_text, parse_func):
         '''
@@ -1770,6 +1851,9 @@ class ra(rabase.rabase):
         Search for certificates
 
         :param options: dictionary of search options
+        :return: iterator over the matching certificates. They are fetched
+                 from the CA while iterating, up to ``sizelimit`` (0 is
+                 unlimited, 100 if not set).
         """
 
         def convert_time(value):
@@ -1857,9 +1941,39 @@ class ra(rabase.rabase):
         payload = etree.tostring(doc, pretty_print=False, xml_declaration=True, encoding='UTF-8')
         self.debug('%s.find(): request: %s', type(self).__name__, payload)
 
-        url = 'http://%s/ca/rest/certs/search?size=%d' % (
-            ipautil.format_netloc(self.ca_host, 8080),
-            options.get('sizelimit', 100))
+        return self._find_pages(payload, options.get('sizelimit', 100))
+
+    def _find_pages(self, payload, sizelimit):
+        """
+        Yield search results, fetching them from the CA page by page
+
+        :param payload: the CertSearchRequest document
+        :param sizelimit: maximum number of results, 0 is unlimited
+        """
+        start = 0
+        first_id = None
+        while True:
+            size = FIND_PAGE_SIZE
+            if sizelimit:
+                size = min(size, sizelimit - start)
+            count = 0
+            for result in self._find_page(payload, start, size):
+                if count == 0:
+                    if result['serial_number'] == first_id:
+                        # the CA ignores the start of the page
+                        return
+                    first_id = result['serial_number']
+                count += 1
+                yield result
+            self.debug('%s.find(): %d results from %d',
+                       type(self).__name__, count, start)
+            start += count
+            if count < size or (sizelimit and start >= sizelimit):
+                return
+
+    def _find_page(self, payload, start, size):
+        url = 'http://%s/ca/rest/certs/search?start=%d&size=%d' % (
+            ipautil.format_netloc(self.ca_host, 8080), start, size)
 
         opener = urllib.request.build_opener()
         opener.addheaders = [('Accept-Encoding', 'gzip, deflate'),
@@ -1879,40 +1993,35 @@ class ra(rabase.rabase):
             self.raise_certificate_operation_error('find',
                                                    detail=e.reason)
 
-        data = response.readlines()
-        self.debug('%s.find(): response: %s', type(self).__name__, data)
-        parser = etree.XMLParser()
         try:
-            doc = etree.fromstring(data[0], parser)
+            # parse the certificates as they arrive and drop them once
+            # they are converted
+            for _event, cert in etree.iterparse(response,
+                                                tag='CertDataInfo'):
+                yield self._parse_cert_data_info(cert)
+                cert.clear()
+                while cert.getprevious() is not None:
+                    del cert.getparent()[0]
         except etree.XMLSyntaxError as e:
             self.raise_certificate_operation_error('find',
                                                    detail=e.msg)
+        finally:
+            response.close()
 
-        # Grab all the certificates
-        certs = doc.xpath('//CertDataInfo')
-
-        results = []
-
-        for cert in certs:
-            response_request = {}
-            response_request['serial_number'] = int(cert.get('id'), 16) # parse as hex
-            response_request['serial_number_hex'] = u'0x%X' % response_request['serial_number']
-
-            dn = cert.xpath('SubjectDN')
-            if len(dn) == 1:
-                response_request['subject'] = unicode(dn[0].text)
-
-            issuer_dn = cert.xpath('IssuerDN')
-            if len(issuer_dn) == 1:
-                response_request['issuer'] = unicode(issuer_dn[0].text)
-
-            status = cert.xpath('Status')
-            if len(status) == 1:
-                response_request['status'] = unicode(status[0].text)
-            results.append(response_request)
+    @staticmethod
+    def _parse_cert_data_info(cert):
+        response_request = {}
+        response_request['serial_number'] = int(cert.get('id'), 16) # parse as hex
+        response_request['serial_number_hex'] = u'0x%X' % response_request['serial_number']
 
-        return results
+        for key, tag in (('subject', 'SubjectDN'),
+                         ('issuer', 'IssuerDN'),
+                         ('status', 'Status')):
+            node = cert.find(tag)
+            if node is not None:
+                response_request[key] = unicode(node.text)
 
+        return response_request
 
 # ----------------------------------------------------------------------------
 @register()
@@ -1935,17 +2044,7 @@ class kra(Backend):
 
         Select our KRA host.
         """
-        ldap2 = self.api.Backend.ldap2
-        if host_has_service(api.env.ca_host, ldap2, "KRA"):
-            return api.env.ca_host
-        if api.env.host != api.env.ca_host:
-            if host_has_service(api.env.host, ldap2, "KRA"):
-                return api.env.host
-        host = select_any_master(ldap2, "KRA")
-        if host:
-            return host
-        else:
-            return api.env.ca_host
+        return _kra_host_selector.get_host(self.api.Backend.ldap2)
 
     def get_client(self):
         """
@@ -2017,6 +2116,7 @@ class RestClient(Backend):
         # session cookie
         self.override_port = None
         self.cookie = None
+        self.session_ca_host = None
 
     def _read_password(self):
         try:
@@ -2025,40 +2125,39 @@ class RestClient(Backend):
         except IOError:
             self.password = ''
 
-    @cachedproperty
+    @property
     def ca_host(self):
         """
         :return:   host
                    as str
 
-        Select our CA host.
+        Select our CA host. The host stays the same while logged in, the
+        session is valid only on the host which created it.
         """
-        ldap2 = self.api.Backend.ldap2
-        if host_has_service(api.env.ca_host, ldap2, "CA"):
-            return api.env.ca_host
-        if api.env.host != api.env.ca_host:
-            if host_has_service(api.env.host, ldap2, "CA"):
-                return api.env.host
-        host = select_any_master(ldap2)
-        if host:
-            return host
-        else:
-            return api.env.ca_host
+        if self.session_ca_host is not None:
+            return self.session_ca_host
+        return _ca_host_selector.get_host(self.api.Backend.ldap2)
 
     def __enter__(self):
         """Log into the REST API"""
         if self.cookie is not None:
             return
-        status, resp_headers, resp_body = dogtag.https_request(
-            self.ca_host, self.override_port or self.env.ca_agent_port,
-            '/ca/rest/account/login',
-            self.sec_dir, self.password, self.ipa_certificate_nickname,
-            method='GET'
-        )
+        ca_host = self.ca_host
+        try:
+            status, resp_headers, resp_body = dogtag.https_request(
+                ca_host, self.override_port or self.env.ca_agent_port,
+                '/ca/rest/account/login',
+                self.sec_dir, self.password, self.ipa_certificate_nickname,
+                method='GET', connection_pool=connection_pool
+            )
+        except errors.NetworkError:
+            _ca_host_selector.mark_failed(ca_host)
+            raise
         cookies = ipapython.cookie.Cookie.parse(resp_headers.get('set-cookie', ''))
         if status != 200 or len(cookies) == 0:
             raise errors.RemoteRetrieveError(reason=_('Failed to authenticate to CA REST API'))
         self.cookie = str(cookies[0])
+        self.session_ca_host = ca_host
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
@@ -2067,9 +2166,10 @@ class RestClient(Backend):
             self.ca_host, self.override_port or self.env.ca_agent_port,
             '/ca/rest/account/logout',
             self.sec_dir, self.password, self.ipa_certificate_nickname,
-            method='GET'
+            method='GET', connection_pool=connection_pool
         )
         self.cookie = None
+        self.session_ca_host = None
 
     def _ssldo(self, method, path, headers=None, body=None):
         """
@@ -2093,12 +2193,18 @@ class RestClient(Backend):
             resource = os.path.join('/ca/rest', self.path)
 
         # perform main request
-        status, resp_headers, resp_body = dogtag.https_request(
-            self.ca_host, self.override_port or self.env.ca_agent_port,
-            resource,
-            self.sec_dir, self.password, self.ipa_certificate_nickname,
-            method=method, headers=headers, body=body
-        )
+        ca_host = self.ca_host
+        try:
+            status, resp_headers, resp_body = dogtag.https_request(
+                ca_host, self.override_port or self.env.ca_agent_port,
+                resource,
+                self.sec_dir, self.password, self.ipa_certificate_nickname,
+                method=method, headers=headers, body=body,
+                connection_pool=connection_pool
+            )
+        except errors.NetworkError:
+            _ca_host_selector.mark_failed(ca_host)
+            raise
         if status < 200 or status >= 300:
             explanation = self._parse_dogtag_error(resp_body) or ''
             raise errors.RemoteRetrieveError(
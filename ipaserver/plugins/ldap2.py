@@ -29,13 +29,14 @@ Backend plugin for LDAP.
 
 import os
 import pwd
+import threading
 
 import ldap as _ldap
 
 from ipalib import krb_utils
 from ipapython.dn import DN
-from ipapython.ipaldap import (LDAPClient, AUTOBIND_AUTO, AUTOBIND_ENABLED,
-                               AUTOBIND_DISABLED)
+from ipapython.ipaldap import (LDAPClient, LDAPConnectionPool, AUTOBIND_AUTO,
+                               AUTOBIND_ENABLED, AUTOBIND_DISABLED)
 
 
 try:
@@ -58,6 +59,9 @@ from ipalib.request import context
 
 register = Registry()
 
+# serializes changes of KRB5CCNAME in the process environment
+_krb5ccname_lock = threading.Lock()
+
 
 @register()
 class ldap2(CrudBackend, LDAPClient):
@@ -75,38 +79,46 @@ class ldap2(CrudBackend, LDAPClient):
         LDAPClient.__init__(self, ldap_uri,
                             force_schema_updates=force_schema_updates)
 
-        self.__time_limit = None
-        self.__size_limit = None
+        # the limits are set per connection, connections are per thread
+        self.__limits = threading.local()
+
+        if api.env.in_server and api.env.ldap_pool_size > 0:
+            self.pool = LDAPConnectionPool(api.env.ldap_pool_size,
+                                           api.env.ldap_pool_idle_timeout)
+        else:
+            self.pool = None
 
     @property
     def time_limit(self):
-        if self.__time_limit is None:
+        time_limit = getattr(self.__limits, 'time_limit', None)
+        if time_limit is None:
             return float(self.get_ipa_config().single_value.get(
                 'ipasearchtimelimit', 2))
-        return self.__time_limit
+        return time_limit
 
     @time_limit.setter
     def time_limit(self, val):
-        self.__time_limit = float(val)
+        self.__limits.time_limit = float(val)
 
     @time_limit.deleter
     def time_limit(self):
-        self.__time_limit = None
+        self.__limits.time_limit = None
 
     @property
     def size_limit(self):
-        if self.__size_limit is None:
+        size_limit = getattr(self.__limits, 'size_limit', None)
+        if size_limit is None:
             return int(self.get_ipa_config().single_value.get(
                 'ipasearchrecordslimit', 0))
-        return self.__size_limit
+        return size_limit
 
     @size_limit.setter
     def size_limit(self, val):
-        self.__size_limit = int(val)
+        self.__limits.size_limit = int(val)
 
     @size_limit.deleter
     def size_limit(self):
-        self.__size_limit = None
+        self.__limits.size_limit = None
 
     def _connect(self):
         # Connectible.conn is a proxy to thread-local storage;
@@ -138,6 +150,10 @@ class ldap2(CrudBackend, LDAPClient):
         tls_keyfile - TLS bind key filename
         autobind - autobind as the current user
 
+        When the connection pool is enabled, Kerberos connections are taken
+        from the pool if a connection bound as the same principal is
+        available.
+
         Extends backend.Connectible.create_connection.
         """
         if bind_dn is None:
@@ -158,6 +174,24 @@ class ldap2(CrudBackend, LDAPClient):
         if debug_level:
             _ldap.set_option(_ldap.OPT_DEBUG_LEVEL, debug_level)
 
+        ldapi = self.ldap_uri.startswith('ldapi://')
+
+        # only plain Kerberos binds are pooled
+        pooled = (self.pool is not None and ccache is not None and
+                  not bind_pw and serverctrls is None and
+                  clientctrls is None and
+                  not (autobind != AUTOBIND_DISABLED and
+                       os.getegid() == 0 and ldapi))
+        if pooled:
+            with _krb5ccname_lock:
+                os.environ['KRB5CCNAME'] = ccache
+                principal = krb_utils.get_principal(ccache_name=ccache)
+            conn = self.pool.get(principal)
+            if conn is not None:
+                setattr(context, 'principal', principal)
+                setattr(context, 'ldap2_pool_key', principal)
+                return conn
+
         client = LDAPClient(self.ldap_uri,
                             force_schema_updates=self._force_schema_updates)
         conn = client._conn
@@ -173,8 +207,6 @@ class ldap2(CrudBackend, LDAPClient):
                 if maxssf < minssf:
                     conn.set_option(_ldap.OPT_X_SASL_SSF_MAX, minssf)
 
-        ldapi = self.ldap_uri.startswith('ldapi://')
-
         if bind_pw:
             client.simple_bind(bind_dn, bind_pw,
                                server_controls=serverctrls,
@@ -194,27 +226,45 @@ class ldap2(CrudBackend, LDAPClient):
             if ldapi:
                 with client.error_handler():
                     conn.set_option(_ldap.OPT_HOST_NAME, self.api.env.host)
-            if ccache is None:
-                os.environ.pop('KRB5CCNAME', None)
-            else:
-                os.environ['KRB5CCNAME'] = ccache
-
-            principal = krb_utils.get_principal(ccache_name=ccache)
-
-            client.gssapi_bind(server_controls=serverctrls,
-                               client_controls=clientctrls)
+            # the GSSAPI bind uses the ccache from the environment, which
+            # other threads (e.g. parallel batch workers) may change
+            with _krb5ccname_lock:
+                if ccache is None:
+                    os.environ.pop('KRB5CCNAME', None)
+                else:
+                    os.environ['KRB5CCNAME'] = ccache
+
+                principal = krb_utils.get_principal(ccache_name=ccache)
+
+                client.gssapi_bind(server_controls=serverctrls,
+                                   client_controls=clientctrls)
             setattr(context, 'principal', principal)
+            if pooled:
+                setattr(context, 'ldap2_pool_key', principal)
 
         return conn
 
     def destroy_connection(self):
-        """Disconnect from LDAP server."""
-        try:
+        """
+        Disconnect from LDAP server.
+
+        Connections taken from the connection pool are returned to it
+        instead of being unbound.
+        """
+        pool_key = getattr(context, 'ldap2_pool_key', None)
+        if pool_key is not None:
+            del context.ldap2_pool_key
             if self.conn is not None:
-                self.unbind()
-        except errors.PublicError:
-            # ignore when trying to unbind multiple times
-            pass
+                self.pool.put(pool_key, self.conn)
+                self.debug('LDAP connection pool stats: %s',
+                           self.pool.stats())
+        else:
+            try:
+                if self.conn is not None:
+                    self.unbind()
+            except errors.PublicError:
+                # ignore when trying to unbind multiple times
+                pass
 
         del self.time_limit
         del self.size_limit
@@ -23,6 +23,7 @@ import traceback
 import six
 
 from . import baseldap
+from .aci import get_parsed_acis
 from .privilege import validate_permission_to_privilege
 from ipalib import errors
 from ipalib.parameters import Str, StrEnum, DNParam, Flag
@@ -664,7 +665,8 @@ class permission(baseldap.LDAPObject):
         return acientry, acistring
 
     def _get_aci_entry_and_string(self, permission_entry, name=None,
-                                  notfound_ok=False, cached_acientry=None):
+                                  notfound_ok=False, cached_acientry=None,
+                                  cached_acis=None):
         """Get the entry and ACI corresponding to the permission entry
 
         :param name: The name of the permission, or None for the cn
@@ -672,6 +674,7 @@ class permission(baseldap.LDAPObject):
             If true, (acientry, None) will be returned on missing ACI, rather
             than raising exception
         :param cached_acientry: See upgrade_permission()
+        :param cached_acis: See upgrade_permission()
         """
         ldap = self.api.Backend.ldap2
         if name is None:
@@ -680,6 +683,14 @@ class permission(baseldap.LDAPObject):
                                                      self.api.env.basedn)
         wanted_aciname = 'permission:%s' % name
 
+        if cached_acis is not None and cached_acis.dn == location:
+            acistring = cached_acis.get_string(wanted_aciname)
+            if acistring is not None or notfound_ok:
+                return ldap.make_entry(location), acistring
+            raise errors.NotFound(
+                reason=_('The ACI for permission %(name)s was not found '
+                         'in %(dn)s ') % {'name': name, 'dn': location})
+
         if (cached_acientry and
                 cached_acientry.dn == location and
                 'aci' in cached_acientry):
@@ -707,7 +718,8 @@ class permission(baseldap.LDAPObject):
                          'in %(dn)s ') % {'name': name, 'dn': location})
 
     def upgrade_permission(self, entry, target_entry=None,
-                           output_only=False, cached_acientry=None):
+                           output_only=False, cached_acientry=None,
+                           cached_acis=None):
         """Upgrade the given permission entry to V2, in-place
 
         The entry is only upgraded if it is a plain old-style permission,
@@ -724,12 +736,16 @@ class permission(baseldap.LDAPObject):
             Optional pre-retreived entry that contains the existing ACI.
             If it is None or its DN does not match the location DN,
             cached_acientry is ignored and the entry is retreived from LDAP.
+        :param cached_acis:
+            Optional ParsedACIs of the entry that contains the existing ACI,
+            used for lookups only. Takes precedence over cached_acientry if
+            its DN matches the location DN.
         """
         if entry.get('ipapermissiontype'):
             # Only convert old-style, non-SYSTEM permissions -- i.e. no flags
             return
         base, acistring = self._get_aci_entry_and_string(
-            entry, cached_acientry=cached_acientry)
+            entry, cached_acientry=cached_acientry, cached_acis=cached_acis)
 
         if not target_entry:
             target_entry = entry
@@ -1309,11 +1325,11 @@ class permission_find(baseldap.LDAPSearch):
                     base_dn=DN(self.obj.container_dn, self.api.env.basedn),
                     filter=ldap.combine_filters(filters, rules=ldap.MATCH_ALL),
                     attrs_list=attrs_list)
-                # Retrieve the root entry (with all legacy ACIs) at once
-                root_entry = ldap.get_entry(DN(api.env.basedn), ['aci'])
+                # Retrieve the root entry's (parsed) legacy ACIs at once
+                root_acis = get_parsed_acis(ldap, DN(api.env.basedn))
             except errors.NotFound:
                 legacy_entries = ()
-                cached_root_entry = None
+                root_acis = None
             self.log.debug('potential legacy entries: %s', len(legacy_entries))
             nonlegacy_names = {e.single_value['cn'] for e in entries}
             for entry in legacy_entries:
@@ -1329,7 +1345,7 @@ class permission_find(baseldap.LDAPSearch):
                     truncated = True
                     break
                 self.obj.upgrade_permission(entry, output_only=True,
-                                            cached_acientry=root_entry)
+                                            cached_acis=root_acis)
                 # If all given options match, include the entry
                 # Do a case-insensitive match, on any value if multi-valued
                 for opt in attribute_options:
@@ -27,7 +27,7 @@ from xml.sax.saxutils import escape
 from six.moves.xmlrpc_client import Fault
 import os
 import datetime
-import json
+import itertools
 import traceback
 import gssapi
 import time
@@ -39,7 +39,8 @@ import six
 from six.moves.urllib.parse import parse_qs
 
 from ipalib import plugable, errors
-from ipalib.capabilities import VERSION_WITHOUT_CAPABILITIES
+from ipalib.capabilities import (
+    VERSION_WITHOUT_CAPABILITIES, client_has_capability)
 from ipalib.frontend import Local
 from ipalib.backend import Executioner
 from ipalib.errors import (PublicError, InternalError, CommandError, JSONError,
@@ -47,18 +48,18 @@ from ipalib.errors import (PublicError, InternalError, CommandError, JSONError,
     ExecutionError, PasswordExpired, KrbPrincipalExpired, UserLocked)
 from ipalib.request import context, destroy_context
 from ipalib.rpc import (xml_dumps, xml_loads,
-    json_encode_binary, json_decode_binary)
+    json_loads_binary, JSONEncoder)
 from ipalib.util import parse_time_duration, normalize_name
 from ipapython.dn import DN
 from ipaserver.plugins.ldap2 import ldap2
 from ipaserver.session import (
     get_session_mgr, AuthManager, get_ipa_ccache_name,
-    load_ccache_data, bind_ipa_ccache, release_ipa_ccache, fmt_time,
+    load_ccache_data, release_ipa_ccache, get_session_ccache_cache, fmt_time,
     default_max_session_duration, krbccache_dir, krbccache_prefix)
 from ipalib.backend import Backend
 from ipalib.krb_utils import (
     krb_ticket_expiration_threshold, krb5_format_principal_name,
-    krb5_format_service_principal_name, get_credentials, get_credentials_if_valid)
+    krb5_format_service_principal_name, get_credentials)
 from ipapython import ipautil
 from ipaplatform.paths import paths
 from ipapython.version import VERSION
@@ -70,6 +71,11 @@ if six.PY3:
 HTTP_STATUS_SUCCESS = '200 Success'
 HTTP_STATUS_SERVER_ERROR = '500 Internal Server Error'
 
+# Responses are passed to the WSGI server in chunks of (at least) this size
+RESPONSE_CHUNK_SIZE = 64 * 1024
+# Responses up to this size are encoded completely before the status is sent
+RESPONSE_BUFFER_SIZE = 1024 * 1024
+
 _not_found_template = """<html>
 <head>
 <title>404 Not Found</title>
@@ -130,6 +136,23 @@ _success_template = """<html>
 </body>
 </html>"""
 
+def iter_chunks(strings, chunk_size=RESPONSE_CHUNK_SIZE):
+    """
+    Join the pieces of an iterencode() output into UTF-8 encoded chunks.
+    """
+    chunk = []
+    length = 0
+    for s in strings:
+        chunk.append(s)
+        length += len(s)
+        if length >= chunk_size:
+            yield u''.join(chunk).encode('utf-8')
+            chunk = []
+            length = 0
+    if chunk:
+        yield u''.join(chunk).encode('utf-8')
+
+
 class HTTP_Status(plugable.Plugin):
     def not_found(self, environ, start_response, url, message):
         """
@@ -406,6 +429,8 @@ class WSGIExecutioner(Executioner):
         try:
             status = HTTP_STATUS_SUCCESS
             response = self.wsgi_execute(environ)
+            if not isinstance(response, (bytes, six.text_type)):
+                response = self._buffer_response(response)
             headers = [('Content-Type', self.content_type + '; charset=utf-8')]
         except Exception as e:
             self.exception('WSGI %s.__call__():', self.name)
@@ -423,7 +448,37 @@ class WSGIExecutioner(Executioner):
             headers.append(('Set-Cookie', session_cookie))
 
         start_response(status, headers)
-        return [response]
+        if isinstance(response, (bytes, six.text_type)):
+            response = [response]
+        return response
+
+    def _buffer_response(self, chunks):
+        """
+        Encode the response body up to RESPONSE_BUFFER_SIZE now, so that an
+        encoding error is still reported as a server error. The rest of a
+        larger body is encoded while it is sent.
+        """
+        chunks = iter(chunks)
+        buffered = []
+        size = 0
+        for chunk in chunks:
+            buffered.append(chunk)
+            size += len(chunk)
+            if size >= RESPONSE_BUFFER_SIZE:
+                return itertools.chain(buffered, self._iter_response(chunks))
+        return buffered
+
+    def _iter_response(self, chunks):
+        try:
+            for chunk in chunks:
+                yield chunk
+        except Exception:
+            # The success status has been sent already. Let the WSGI server
+            # abort the connection, so that the client does not take the
+            # truncated body for a complete response.
+            self.exception('WSGI %s.__call__(): encoding of the response '
+                           'failed', self.name)
+            raise
 
     def unmarshal(self, data):
         raise NotImplementedError('%s.unmarshal()' % type(self).__name__)
@@ -471,12 +526,16 @@ class jsonserver(WSGIExecutioner, HTTP_Status):
             principal=unicode(principal),
             version=unicode(VERSION),
         )
-        response = json_encode_binary(response, version)
-        return json.dumps(response, sort_keys=True, indent=4)
+        if client_has_capability(version, 'compact_json'):
+            encoder = JSONEncoder(
+                version, sort_keys=True, separators=(',', ':'))
+        else:
+            encoder = JSONEncoder(version, sort_keys=True, indent=4)
+        return iter_chunks(encoder.iterencode(response))
 
     def unmarshal(self, data):
         try:
-            d = json.loads(data)
+            d = json_loads_binary(data)
         except ValueError as e:
             raise JSONError(error=e)
         if not isinstance(d, dict):
@@ -485,7 +544,6 @@ class jsonserver(WSGIExecutioner, HTTP_Status):
             raise JSONError(error=_('Request is missing "method"'))
         if 'params' not in d:
             raise JSONError(error=_('Request is missing "params"'))
-        d = json_decode_binary(d)
         method = d['method']
         params = d['params']
         _id = d.get('id')
@@ -800,18 +858,19 @@ class jsonserver_session(jsonserver, KerberosSession):
             self.debug('no ccache, need login')
             return self.need_login(start_response)
 
-        ipa_ccache_name = bind_ipa_ccache(ccache_data)
+        ccache_cache = get_session_ccache_cache()
+        ipa_ccache_name = ccache_cache.bind(session_id, ccache_data)
 
         # Redirect to login if Kerberos credentials are expired
-        creds = get_credentials_if_valid(ccache_name=ipa_ccache_name)
-        if not creds:
+        endtime = ccache_cache.get_endtime(session_id, ipa_ccache_name)
+        if endtime is None:
             self.debug('ccache expired, deleting session, need login')
             # The request is finished with the ccache, destroy it.
             release_ipa_ccache(ipa_ccache_name)
             return self.need_login(start_response)
 
         # Update the session expiration based on the Kerberos expiration
-        endtime = creds.lifetime + time.time()
+        expiration = session_data['session_expiration_timestamp']
         self.update_session_expiration(session_data, endtime)
 
         # Store the session data in the per-thread context
@@ -837,13 +896,27 @@ class jsonserver_session(jsonserver, KerberosSession):
             # logout command removes the ccache data from the session
             # data to invalidate the session credentials.
 
+            session_changed = (
+                expiration != session_data['session_expiration_timestamp'])
             if 'ccache_data' in session_data:
-                session_data['ccache_data'] = load_ccache_data(ipa_ccache_name)
-
-            # The request is finished with the ccache, destroy it.
-            release_ipa_ccache(ipa_ccache_name)
-            # Store the session data.
-            session_mgr.store_session_data(session_data)
+                new_ccache_data = ccache_cache.refresh(session_id,
+                                                       ipa_ccache_name)
+                if (new_ccache_data is not None and
+                        new_ccache_data != ccache_data):
+                    session_data['ccache_data'] = new_ccache_data
+                    session_changed = True
+                # The request is finished with the ccache. The ccache file
+                # is kept for the next request of the session.
+                ccache_cache.release(ipa_ccache_name)
+            else:
+                ccache_cache.forget(session_id)
+                session_changed = True
+                # The session credentials are gone, destroy the ccache.
+                release_ipa_ccache(ipa_ccache_name)
+
+            # Store the session data unless nothing has changed.
+            if session_changed:
+                session_mgr.store_session_data(session_data)
             destroy_context()
 
         return response
@@ -1261,18 +1334,19 @@ class xmlserver_session(xmlserver, KerberosSession):
             self.debug('xmlserver_session.__call_: no ccache, need TGT')
             return self.need_login(start_response)
 
-        ipa_ccache_name = bind_ipa_ccache(ccache_data)
+        ccache_cache = get_session_ccache_cache()
+        ipa_ccache_name = ccache_cache.bind(session_id, ccache_data)
 
         # Redirect to /ipa/xml if Kerberos credentials are expired
-        creds = get_credentials_if_valid(ccache_name=ipa_ccache_name)
-        if not creds:
+        endtime = ccache_cache.get_endtime(session_id, ipa_ccache_name)
+        if endtime is None:
             self.debug('xmlserver_session.__call_: ccache expired, deleting session, need login')
             # The request is finished with the ccache, destroy it.
             release_ipa_ccache(ipa_ccache_name)
             return self.need_login(start_response)
 
         # Update the session expiration based on the Kerberos expiration
-        endtime = creds.lifetime + time.time()
+        expiration = session_data['session_expiration_timestamp']
         self.update_session_expiration(session_data, endtime)
 
         # Store the session data in the per-thread context
@@ -1294,13 +1368,27 @@ class xmlserver_session(xmlserver, KerberosSession):
             # logout command removes the ccache data from the session
             # data to invalidate the session credentials.
 
+            session_changed = (
+                expiration != session_data['session_expiration_timestamp'])
             if 'ccache_data' in session_data:
-                session_data['ccache_data'] = load_ccache_data(ipa_ccache_name)
-
-            # The request is finished with the ccache, destroy it.
-            release_ipa_ccache(ipa_ccache_name)
-            # Store the session data.
-            session_mgr.store_session_data(session_data)
+                new_ccache_data = ccache_cache.refresh(session_id,
+                                                       ipa_ccache_name)
+                if (new_ccache_data is not None and
+                        new_ccache_data != ccache_data):
+                    session_data['ccache_data'] = new_ccache_data
+                    session_changed = True
+                # The request is finished with the ccache. The ccache file
+                # is kept for the next request of the session.
+                ccache_cache.release(ipa_ccache_name)
+            else:
+                ccache_cache.forget(session_id)
+                session_changed = True
+                # The session credentials are gone, destroy the ccache.
+                release_ipa_ccache(ipa_ccache_name)
+
+            # Store the session data unless nothing has changed.
+            if session_changed:
+                session_mgr.store_session_data(session_data)
             destroy_context()
 
         return response
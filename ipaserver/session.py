@@ -16,10 +16,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import collections
+import hashlib
 import memcache
 import random
 import os
 import re
+import threading
 import time
 
 from six.moves.urllib.parse import urlparse
@@ -31,7 +34,8 @@ from ipalib import api
 from ipaplatform.paths import paths
 from ipalib.krb_utils import (
     krb5_parse_ccache,
-    krb5_unparse_ccache)
+    krb5_unparse_ccache,
+    get_credentials_if_valid)
 from ipapython.cookie import Cookie
 
 __doc__ = '''
@@ -1226,7 +1230,7 @@ def load_ccache_data(ccache_name):
     scheme, name = krb5_parse_ccache(ccache_name)
     if scheme == 'FILE':
         root_logger.debug('reading ccache data from file "%s"', name)
-        src = open(name)
+        src = open(name, 'rb')
         ccache_data = src.read()
         src.close()
         return ccache_data
@@ -1275,7 +1279,164 @@ def release_ipa_ccache(ccache_name):
     else:
         raise ValueError('ccache scheme "%s" unsupported (%s)', scheme, ccache_name)
 
+
+class SessionCCacheCache(object):
+    '''
+    Per-process cache of the session ccaches bound by this process.
+
+    Every request authenticated by a session has to turn the ccache data
+    stored in the session into a ccache file, check the credentials are
+    still valid and afterwards copy the possibly updated ccache back into
+    the session. This cache remembers, per session id, a digest of the
+    ccache data and the expiration time of its credentials, and what
+    was last written into this process's ccache file. This allows us to
+
+      * skip rewriting the ccache file when it already holds the data,
+      * skip the GSSAPI credentials inquiry for ccache data whose
+        credentials were already validated,
+      * skip reading the ccache file back when it was not modified.
+
+    The ccache file is detected as modified by comparing its inode,
+    size and modification time with the values recorded when it was
+    written.
+    '''
+
+    def __init__(self, max_sessions=256):
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        # session id -> (ccache digest, credentials end time)
+        self._sessions = collections.OrderedDict()
+        # (ccache digest, stat key) describing the ccache file
+        self._file_state = None
+
+    @staticmethod
+    def _digest(ccache_data):
+        return hashlib.sha256(ccache_data).hexdigest()
+
+    @staticmethod
+    def _stat_key(name):
+        try:
+            st = os.stat(name)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime)
+
+    def bind(self, session_id, ccache_data):
+        '''
+        Make ccache_data of session session_id the current ccache.
+
+        Writes the ccache file only if it does not already contain
+        ccache_data.
+
+        :returns:
+          ccache name
+        '''
+        name = _get_krbccache_pathname()
+        digest = self._digest(ccache_data)
+        with self._lock:
+            if self._file_state != (digest, self._stat_key(name)):
+                root_logger.debug('storing ccache data into file "%s"', name)
+                with open(name, 'wb') as dst:
+                    dst.write(ccache_data)
+                self._file_state = (digest, self._stat_key(name))
+            else:
+                root_logger.debug('ccache file "%s" is up to date', name)
+
+        ccache_name = krb5_unparse_ccache('FILE', name)
+        os.environ['KRB5CCNAME'] = ccache_name
+        return ccache_name
+
+    def get_endtime(self, session_id, ccache_name):
+        '''
+        Return the expiration time of the credentials in the bound ccache
+        or None if the credentials are not valid.
+
+        The GSSAPI credentials inquiry is performed only for ccache data
+        not yet validated for the session.
+        '''
+        with self._lock:
+            digest = self._file_state[0] if self._file_state else None
+            cached = self._sessions.get(session_id)
+
+        now = time.time()
+        if cached is not None and cached[0] == digest:
+            endtime = cached[1]
+            if endtime > now:
+                return endtime
+            self.forget(session_id)
+            return None
+
+        creds = get_credentials_if_valid(ccache_name=ccache_name)
+        if not creds:
+            self.forget(session_id)
+            return None
+
+        endtime = creds.lifetime + now
+        self._remember(session_id, digest, endtime)
+        return endtime
+
+    def refresh(self, session_id, ccache_name):
+        '''
+        Return the ccache data if the bound ccache was modified since it
+        was written, otherwise return None.
+        '''
+        scheme, name = krb5_parse_ccache(ccache_name)
+        with self._lock:
+            file_state = self._file_state
+            if (file_state is not None and
+                    file_state[1] == self._stat_key(name)):
+                return None
+
+        ccache_data = load_ccache_data(ccache_name)
+        digest = self._digest(ccache_data)
+        with self._lock:
+            self._file_state = (digest, self._stat_key(name))
+            cached = self._sessions.get(session_id)
+        if cached is not None and file_state is not None and \
+                cached[0] == file_state[0]:
+            # the credentials were only extended, not replaced
+            self._remember(session_id, digest, cached[1])
+        else:
+            self.forget(session_id)
+        return ccache_data
+
+    def release(self, ccache_name):
+        '''
+        Stop using the current request's ccache.
+
+        Unlike release_ipa_ccache() the ccache file is kept so that the
+        next request of the same session does not need to rewrite it. The
+        credentials of the last session stay on disk between requests. Only
+        the apache user can read them, krbccache_dir is created with mode
+        0700 (see init/systemd/ipa.conf.tmpfiles).
+        '''
+        if os.environ.get('KRB5CCNAME') == ccache_name:
+            del os.environ['KRB5CCNAME']
+
+    def forget(self, session_id):
+        '''
+        Drop all information cached for session session_id.
+        '''
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _remember(self, session_id, digest, endtime):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._sessions[session_id] = (digest, endtime)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+
 _session_mgr = None
+_session_ccache_cache = None
+
+
+def get_session_ccache_cache():
+    global _session_ccache_cache
+    if _session_ccache_cache is None:
+        _session_ccache_cache = SessionCCacheCache()
+    return _session_ccache_cache
 
 
 def get_session_mgr():
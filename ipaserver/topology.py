@@ -6,8 +6,6 @@
 set of functions and classes useful for management of domain level 1 topology
 """
 
-from copy import deepcopy
-
 from ipalib import _
 from ipapython.graph import Graph
 
@@ -51,20 +49,23 @@ def create_topology_graph(masters, segments):
     return graph
 
 
-def get_topology_connection_errors(graph):
+def get_topology_connection_errors(graph, removed_masters=()):
     """
-    Traverse graph from each master and find out which masters are not
-    reachable.
+    Find out which masters are not reachable from each master.
 
     :param graph: topology graph where vertices are masters
+    :param removed_masters: masters to leave out of the graph, used to check
+        the topology after their removal without modifying the graph
     :returns: list of errors, error is: (master, visited, not_visited)
     """
     connect_errors = []
-    master_cns = list(graph.vertices)
+    reachable = graph.reachability(exclude=removed_masters)
+    masters = graph.vertices.difference(removed_masters)
+    master_cns = list(masters)
     master_cns.sort()
     for m in master_cns:
-        visited = graph.bfs(m)
-        not_visited = graph.vertices - visited
+        visited = reachable[m]
+        not_visited = masters - visited
         if not_visited:
             connect_errors.append((m, list(visited), list(not_visited)))
     return connect_errors
@@ -134,36 +135,32 @@ class TopologyConnectivity(object):
         self.api = api_instance
 
         self.graphs = _create_topology_graphs(self.api)
+        self._errors = None
 
     @property
     def errors(self):
+        if self._errors is None:
+            self._errors = self.errors_after_masters_removal([])
+
+        return self._errors
+
+    def errors_after_masters_removal(self, master_cns):
         errors_by_suffix = {}
         for suffix in self.graphs:
             errors_by_suffix[suffix] = get_topology_connection_errors(
-                self.graphs[suffix]
+                self.graphs[suffix], removed_masters=master_cns
             )
 
         return errors_by_suffix
 
     def errors_after_master_removal(self, master_cn):
-        graphs_before = deepcopy(self.graphs)
-
-        for s in self.graphs:
-            try:
-                self.graphs[s].remove_vertex(master_cn)
-            except ValueError:
-                pass
-
-        errors_after_removal = self.errors
-
-        self.graphs = graphs_before
-
-        return errors_after_removal
+        return self.errors_after_masters_removal([master_cn])
 
     def check_current_state(self):
         err_msg = ""
-        for suffix in self.errors:
-            errors = self.errors[suffix]
+        errors_by_suffix = self.errors
+        for suffix in errors_by_suffix:
+            errors = errors_by_suffix[suffix]
             if errors:
                 err_msg = "\n".join([
                     err_msg,
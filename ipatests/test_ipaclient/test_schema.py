@@ -0,0 +1,76 @@
+#
+# Copyright (C) 2016  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the schema archive of `ipaclient/remote_plugins/schema.py`.
+"""
+
+import json
+import zipfile
+
+import pytest
+
+from ipaclient.remote_plugins import schema
+
+pytestmark = pytest.mark.tier0
+
+# header ID 0xcafe with 4 bytes of data
+EXTRA = b'\xfe\xca\x04\x00data'
+
+
+def member(name, compress_type, extra=b''):
+    info = zipfile.ZipInfo(name)
+    info.compress_type = compress_type
+    info.extra = extra
+    return info
+
+
+MEMBERS = [
+    (member('schema', zipfile.ZIP_DEFLATED), {u'fingerprint': u'fp'}),
+    (member('methods', zipfile.ZIP_STORED, EXTRA),
+     {u'user': [u'user_add']}),
+    (member('commands/ping', zipfile.ZIP_STORED),
+     {u'name': u'ping', u'doc': u'Ping a remote server.'}),
+    (member('commands/user_add', zipfile.ZIP_DEFLATED, EXTRA),
+     {u'name': u'user_add', u'params': [u'uid'] * 100}),
+    (member('topics/ping', zipfile.ZIP_STORED, EXTRA),
+     {u'name': u'ping', u'doc': u'\u017dzip'}),
+]
+
+
+@pytest.fixture
+def archive(tmpdir):
+    path = str(tmpdir.join('fingerprint'))
+    with zipfile.ZipFile(path, 'w') as zf:
+        for info, data in MEMBERS:
+            zf.writestr(info, json.dumps(data).encode('utf-8'))
+    return path
+
+
+def test_read(archive):
+    schema_archive = schema._SchemaArchive(archive)
+    with zipfile.ZipFile(archive) as zf:
+        assert [i.extra for i in zf.infolist()] == [
+            info.extra for info, _data in MEMBERS]
+        for info, data in MEMBERS:
+            expected = json.loads(zf.read(info.filename).decode('utf-8'))
+            assert expected == data
+            namespace, sep, name = info.filename.partition('/')
+            if sep:
+                result = schema_archive.read_namespace_member(namespace, name)
+            else:
+                result = schema_archive.read(info.filename)
+            assert result == expected
+
+    assert sorted(schema_archive.namespace('commands')) == [
+        'ping', 'user_add']
+    assert schema_archive.namespace('classes') == {}
+
+
+def test_unsupported_compression(archive, monkeypatch):
+    schema_archive = schema._SchemaArchive(archive)
+    info = schema_archive.namespace('commands')['ping']
+    # bzip2
+    monkeypatch.setattr(info, 'compress_type', 12)
+    with pytest.raises(zipfile.BadZipfile):
+        schema_archive.read_namespace_member('commands', 'ping')
@@ -162,3 +162,31 @@ def test_aci_parsing_8():
 def test_aci_parsing_9():
     check_aci_parsing('(targetfilter = "(|(objectClass=person)(objectClass=krbPrincipalAux)(objectClass=posixAccount)(objectClass=groupOfNames)(objectClass=posixGroup))")(targetattr != "aci || userPassword || krbPrincipalKey || sambaLMPassword || sambaNTPassword || passwordHistory")(version 3.0; acl "Account Admins can manage Users and Groups"; allow (add, delete, read, write) groupdn = "ldap:///cn=admins,cn=groups,cn=accounts,dc=greyoak,dc=com";)',
         '(targetattr != "aci || userPassword || krbPrincipalKey || sambaLMPassword || sambaNTPassword || passwordHistory")(targetfilter = "(|(objectClass=person)(objectClass=krbPrincipalAux)(objectClass=posixAccount)(objectClass=groupOfNames)(objectClass=posixGroup))")(version 3.0;acl "Account Admins can manage Users and Groups";allow (add,delete,read,write) groupdn = "ldap:///cn=admins,cn=groups,cn=accounts,dc=greyoak,dc=com";)')
+
+def test_aci_parsing_10():
+    check_aci_parsing(' ( targetattr ! = member)( target="ldap:///cn=ipausers,cn=groups,cn=accounts,dc=example,dc=com" )(version 3.0;acl "a";allow (write) groupdn="ldap:///cn=a,cn=taskgroups,dc=example,dc=com";)',
+        '(target = "ldap:///cn=ipausers,cn=groups,cn=accounts,dc=example,dc=com")(targetattr != "member")(version 3.0;acl "a";allow (write) groupdn = "ldap:///cn=a,cn=taskgroups,dc=example,dc=com";)')
+
+
+@pytest.mark.parametrize('target', [
+    '(targetattr="cn)',
+    '(targetattr=)',
+    '(targetattr "cn")',
+    '(targetattr="cn"',
+    '(targetattr=cn-sn)',
+    '(targetattr="cn") x',
+])
+def test_aci_parsing_malformed_target(target):
+    with pytest.raises(SyntaxError):
+        ACI(target + '(version 3.0;acl "a";allow (write) userdn="ldap:///self";)')
+
+
+def test_aci_parsing_cached():
+    source = '(targetattr="title || cn")(version 3.0;acl "a";allow (write) userdn="ldap:///self";)'
+    a = ACI(source)
+    a.set_target_attr(['sn'])
+    a.permissions.append('read')
+    b = ACI(source)
+    assert b.target['targetattr']['expression'] == ['title', 'cn']
+    assert b.permissions == ['write']
+    assert b == ACI(source)
@@ -22,6 +22,9 @@ Test the `ipalib.rpc` module.
 """
 from __future__ import print_function
 
+import datetime
+import json
+
 from six.moves.xmlrpc_client import Binary, Fault, dumps, loads
 
 import nose
@@ -32,6 +35,7 @@ from ipatests.data import binary_bytes, utf8_bytes, unicode_str
 from ipalib.frontend import Command
 from ipalib.request import context, Connection
 from ipalib import rpc, errors, api, request
+from ipapython.dn import DN
 from ipapython.version import API_VERSION
 
 if six.PY3:
@@ -196,6 +200,59 @@ def test_xml_loads():
         assert type(e.faultString) is unicode
 
 
+def test_json_loads_binary():
+    """
+    Test the `ipalib.rpc.json_loads_binary` function.
+    """
+    f = rpc.json_loads_binary
+    value = dict(
+        method=u'batch',
+        params=[
+            [dict(method=u'user_add', params=[[u'jdoe'], dict(
+                usercertificate=[dict(__base64__=u'AP8=')],
+                krbprincipalexpiration=dict(__datetime__=u'20160101000000Z'),
+                nested=[[1, 2], [3, [4]]],
+            )])],
+            dict(version=u'2.213'),
+        ],
+        id=0,
+    )
+    data = json.dumps(value)
+    assert_equal(f(data), rpc.json_decode_binary(json.loads(data)))
+    assert f(data)['params'][0][0]['params'][1]['nested'] == (
+        (1, 2), (3, (4,)))
+
+    data = json.dumps([[1, {u'__base64__': u'AP8='}], u'a'])
+    assert f(data) == ((1, b'\x00\xff'), u'a')
+    assert f(json.dumps(u'a')) == u'a'
+
+
+def test_json_encoder():
+    """
+    Test the `ipalib.rpc.JSONEncoder` class.
+    """
+    value = dict(
+        result=dict(
+            binary=[binary_bytes, b'\x00\xff'],
+            utf8=utf8_bytes,
+            text=[unicode_str, u'a'],
+            nested=(1, 2.5, None, True, dict(dn=DN(('cn', 'a')))),
+            time=datetime.datetime(2016, 1, 1),
+        ),
+        error=None,
+    )
+    for version in (u'2.51', API_VERSION):
+        for kw in (dict(sort_keys=True, indent=4),
+                   dict(sort_keys=True, separators=(',', ':'))):
+            encoder = rpc.JSONEncoder(version, **kw)
+            assert_equal(
+                u''.join(encoder.iterencode(value)),
+                json.dumps(rpc.json_encode_binary(value, version), **kw))
+
+    encoder = rpc.JSONEncoder(API_VERSION)
+    raises(TypeError, u''.join, encoder.iterencode(dict(a=object())))
+
+
 class test_xmlclient(PluginTester):
     """
     Test the `ipalib.rpc.xmlclient` plugin.
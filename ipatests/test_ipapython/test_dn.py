@@ -1,10 +1,12 @@
 import contextlib
+import pickle
 import unittest
 import pytest
 
 import six
 
-from ipapython.dn import DN, RDN, AVA
+from ipapython import dn as dn_module
+from ipapython.dn import DN, RDN, AVA, intern_dn
 
 if six.PY3:
     unicode = str
@@ -1302,5 +1304,86 @@ class TestInternationalization(unittest.TestCase):
             self.assertEqual(str(dn1), b'cn=' + self.arabic_hello_utf8)
 
 
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        dn_module._parse_cache.clear()
+
+    def test_cached_parse(self):
+        dn1 = DN('cn=Bob,ou=people,dc=example,dc=com')
+        dn2 = DN(u'cn=Bob,ou=people,dc=example,dc=com')
+        self.assertEqual(dn1, dn2)
+        self.assertEqual(str(dn1), str(dn2))
+        self.assertEqual(hash(dn1), hash(dn2))
+        stats = dn_module._parse_cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+
+        # cached RDNs must not leak between DNs built from them
+        dn3 = DN(('cn', 'Alice'), 'ou=people,dc=example,dc=com')
+        self.assertEqual(str(dn3), 'cn=Alice,ou=people,dc=example,dc=com')
+        self.assertEqual(str(DN('ou=people,dc=example,dc=com')),
+                         'ou=people,dc=example,dc=com')
+        self.assertEqual(str(dn1), 'cn=Bob,ou=people,dc=example,dc=com')
+
+    def test_malformed_not_cached(self):
+        for _i in range(2):
+            with self.assertRaises(ValueError):
+                DN('cn')
+        self.assertEqual(dn_module._parse_cache.stats()['size'], 0)
+
+    def test_bounded(self):
+        cache = dn_module._ParseCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats()['size'], 2)
+
+    def test_cached_str_and_hash(self):
+        dn1 = DN(('cn', 'Bob'), ('dc', 'example'), ('dc', 'com'))
+        self.assertEqual(str(dn1), 'cn=Bob,dc=example,dc=com')
+        self.assertEqual(hash(dn1), hash(DN('CN=bob,DC=example,DC=com')))
+        self.assertEqual(str(dn1[1:]), 'dc=example,dc=com')
+        self.assertEqual(hash(dn1[1:]), hash(DN('dc=example,dc=com')))
+        self.assertEqual(str(dn1 + 'dc=org'),
+                         'cn=Bob,dc=example,dc=com,dc=org')
+        self.assertEqual(str(DN(dn1)), str(dn1))
+
+    def test_intern(self):
+        dn1 = intern_dn('cn=Bob,dc=example,dc=com')
+        dn2 = intern_dn(DN(('cn', 'Bob'), ('dc', 'example'), ('dc', 'com')))
+        self.assertIs(dn1, dn2)
+        dn3 = intern_dn('cn=BOB,dc=example,dc=com')
+        self.assertIsNot(dn1, dn3)
+        self.assertEqual(dn1, dn3)
+        self.assertEqual(str(dn3), 'cn=BOB,dc=example,dc=com')
+
+
+class TestCompact(unittest.TestCase):
+    def test_no_instance_dict(self):
+        dn1 = DN('cn=Bob+uid=bob,dc=example,dc=com')
+        for obj in (dn1, dn1[0], dn1[0][0]):
+            self.assertFalse(hasattr(obj, '__dict__'))
+
+    def test_shared_rdns(self):
+        dn1 = DN('cn=Bob,dc=example,dc=com')
+        dn2 = DN('cn=Alice', dn1[1:])
+        self.assertIs(dn2.rdns[1], dn1.rdns[1])
+        self.assertEqual(dn1[1:], DN('dc=example,dc=com'))
+        self.assertTrue(dn2.endswith(dn1[1:]))
+        self.assertEqual(dn2.find(DN('dc=com')), 2)
+
+    def test_pickle(self):
+        dn1 = DN('cn=Bob+uid=bob,dc=example,dc=com')
+        for obj in (dn1, dn1[0], dn1[0][0]):
+            copied = pickle.loads(pickle.dumps(obj))
+            self.assertIs(type(copied), type(obj))
+            self.assertEqual(copied, obj)
+            self.assertEqual(str(copied), str(obj))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,185 @@
+#
+# Copyright (C) 2016  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the `ipapython/dogtag.py` module.
+"""
+
+import socket
+
+import pytest
+
+from ipapython import dogtag
+
+# Python 3 rename. The package is available in "six.moves.http_client", but
+# pylint cannot handle classes from that alias
+try:
+    import httplib
+except ImportError:
+    import http.client as httplib
+
+pytestmark = pytest.mark.tier0
+
+KEY = ('ca.example.com', 8443, '/etc/httpd/alias', 'ipaCert')
+
+
+class FakeMessage(object):
+    dict = {}
+
+
+class FakeResponse(object):
+    status = 200
+    msg = FakeMessage()
+
+    def __init__(self, will_close):
+        self.will_close = will_close
+
+    def read(self):
+        return b'body'
+
+
+class FakeConnection(object):
+    def __init__(self, stale=False, broken=False, will_close=False):
+        self.stale = stale
+        self.broken = broken
+        self.will_close = will_close
+        self.requests = 0
+        self.closed = False
+        # the server side of the connection
+        self.sock, self.peer = socket.socketpair()
+
+    def request(self, method, uri, body=None, headers=None):
+        assert not self.closed
+        if self.broken:
+            raise socket.error(32, 'Broken pipe')
+        self.requests += 1
+
+    def getresponse(self):
+        if self.stale:
+            raise httplib.BadStatusLine('')
+        return FakeResponse(self.will_close)
+
+    def close(self):
+        self.closed = True
+        self.sock.close()
+        self.peer.close()
+
+
+class ConnectionFactory(object):
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.connections = []
+
+    def __call__(self, host, port):
+        conn = FakeConnection(**self.kwargs)
+        self.connections.append(conn)
+        return conn
+
+
+def request(pool, factory, method='POST'):
+    return pool.request(KEY, factory, KEY[0], KEY[1], method, '/ca/agent',
+                        'body', {})
+
+
+def test_reuse():
+    pool = dogtag.ConnectionPool()
+    factory = ConnectionFactory()
+    assert request(pool, factory) == (200, {}, b'body')
+    assert request(pool, factory) == (200, {}, b'body')
+    assert len(factory.connections) == 1
+    assert factory.connections[0].requests == 2
+
+    stats = pool.stats()
+    assert stats['requests'] == 2
+    assert stats['connections'] == 1
+    assert stats['reused'] == 1
+    assert stats['idle'] == 1
+
+    pool.clear()
+    assert factory.connections[0].closed
+    assert pool.stats()['idle'] == 0
+
+
+def test_stale_connection():
+    pool = dogtag.ConnectionPool()
+    factory = ConnectionFactory()
+    request(pool, factory, 'GET')
+    factory.connections[0].stale = True
+
+    assert request(pool, factory, 'GET') == (200, {}, b'body')
+    assert len(factory.connections) == 2
+    assert factory.connections[0].closed
+    assert pool.stats()['stale'] == 1
+
+
+def test_stale_connection_not_sent():
+    pool = dogtag.ConnectionPool()
+    factory = ConnectionFactory()
+    request(pool, factory)
+    factory.connections[0].broken = True
+
+    # the request did not reach the server, it is safe to send it again
+    assert request(pool, factory) == (200, {}, b'body')
+    assert len(factory.connections) == 2
+    assert factory.connections[0].closed
+    assert factory.connections[1].requests == 1
+    assert pool.stats()['stale'] == 1
+
+
+def test_stale_connection_before_send():
+    pool = dogtag.ConnectionPool()
+    factory = ConnectionFactory()
+    request(pool, factory)
+    # the server closed the idle connection
+    factory.connections[0].peer.close()
+
+    # the closed connection is detected before the request is sent over it,
+    # so even a POST is sent over a new connection
+    assert request(pool, factory) == (200, {}, b'body')
+    assert len(factory.connections) == 2
+    assert factory.connections[0].closed
+    assert factory.connections[0].requests == 1
+    assert factory.connections[1].requests == 1
+    assert pool.stats()['stale'] == 1
+
+
+def test_stale_connection_no_retry():
+    pool = dogtag.ConnectionPool()
+    factory = ConnectionFactory()
+    request(pool, factory)
+    factory.connections[0].stale = True
+
+    # the server may have processed the request, it must not be sent again
+    with pytest.raises(httplib.BadStatusLine):
+        request(pool, factory)
+    assert len(factory.connections) == 1
+    assert factory.connections[0].closed
+    assert pool.stats()['idle'] == 0
+
+
+def test_stale_new_connection():
+    pool = dogtag.ConnectionPool()
+    factory = ConnectionFactory(stale=True)
+    with pytest.raises(httplib.BadStatusLine):
+        request(pool, factory)
+    assert len(factory.connections) == 1
+    assert factory.connections[0].closed
+    assert pool.stats()['idle'] == 0
+
+
+def test_idle_timeout():
+    pool = dogtag.ConnectionPool(idle_timeout=0)
+    factory = ConnectionFactory()
+    request(pool, factory)
+    request(pool, factory)
+    assert len(factory.connections) == 2
+    assert factory.connections[0].closed
+
+
+def test_server_closes_connection():
+    pool = dogtag.ConnectionPool()
+    factory = ConnectionFactory(will_close=True)
+    request(pool, factory)
+    request(pool, factory)
+    assert len(factory.connections) == 2
+    assert all(conn.closed for conn in factory.connections)
@@ -0,0 +1,85 @@
+#
+# Copyright (C) 2016  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the `ipapython/graph.py` module.
+"""
+
+import random
+
+import pytest
+
+from ipapython.graph import Graph
+
+pytestmark = pytest.mark.tier0
+
+
+def make_graph(vertices, edges):
+    graph = Graph()
+    for vertex in vertices:
+        graph.add_vertex(vertex)
+    for tail, head in edges:
+        graph.add_edge(tail, head)
+    return graph
+
+
+def random_graph(rng, n_vertices, n_edges):
+    vertices = ['m%d' % i for i in range(n_vertices)]
+    edges = [(rng.choice(vertices), rng.choice(vertices))
+             for _i in range(n_edges)]
+    return make_graph(vertices, edges)
+
+
+def test_adjacency():
+    graph = make_graph('abc', [('a', 'b'), ('b', 'c'), ('c', 'b')])
+    assert graph.get_heads('b') == ['c']
+    assert sorted(graph.get_tails('b')) == ['a', 'c']
+    assert graph.get_tails('x') == []
+
+    graph.remove_edge('c', 'b')
+    assert graph.get_tails('b') == ['a']
+    assert graph.get_heads('c') == []
+    with pytest.raises(ValueError):
+        graph.remove_edge('c', 'b')
+
+    graph.remove_vertex('b')
+    assert graph.vertices == set('ac')
+    assert graph.edges == []
+    assert graph.get_heads('a') == []
+    assert graph.get_tails('c') == []
+    with pytest.raises(ValueError):
+        graph.remove_vertex('b')
+
+
+def test_strongly_connected_components():
+    graph = make_graph(
+        'abcdef',
+        [('a', 'b'), ('b', 'a'), ('b', 'c'), ('c', 'd'), ('d', 'c'),
+         ('e', 'f')])
+    components = graph.strongly_connected_components()
+    assert sorted(sorted(c) for c in components) == [
+        ['a', 'b'], ['c', 'd'], ['e'], ['f']]
+    # reachable components come first
+    assert components.index({'c', 'd'}) < components.index({'a', 'b'})
+    assert components.index({'f'}) < components.index({'e'})
+
+    components = graph.strongly_connected_components(exclude=['b'])
+    assert sorted(sorted(c) for c in components) == [
+        ['a'], ['c', 'd'], ['e'], ['f']]
+
+
+def test_reachability_matches_bfs():
+    rng = random.Random(0)
+    for _i in range(200):
+        graph = random_graph(rng, rng.randint(1, 12), rng.randint(0, 30))
+        reachable = graph.reachability()
+        assert set(reachable) == graph.vertices
+        for vertex in graph.vertices:
+            assert reachable[vertex] == graph.bfs(vertex)
+
+        removed = rng.choice(sorted(graph.vertices))
+        reachable = graph.reachability(exclude=[removed])
+        graph.remove_vertex(removed)
+        assert set(reachable) == graph.vertices
+        for vertex in graph.vertices:
+            assert reachable[vertex] == graph.bfs(vertex)
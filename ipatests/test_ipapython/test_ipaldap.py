@@ -0,0 +1,69 @@
+#
+# Copyright (C) 2016  FreeIPA Contributors see COPYING for license
+#
+
+import ldap
+import pytest
+
+from ipapython.ipaldap import LDAPConnectionPool
+
+pytestmark = pytest.mark.tier0
+
+
+class FakeConnection(object):
+    def __init__(self, healthy=True):
+        self.healthy = healthy
+        self.unbound = False
+
+    def whoami_s(self):
+        if not self.healthy:
+            raise ldap.SERVER_DOWN({'desc': 'Can\'t contact LDAP server'})
+        return 'dn: uid=admin'
+
+    def unbind_s(self):
+        self.unbound = True
+
+
+class TestLDAPConnectionPool(object):
+    def test_miss_and_hit(self):
+        pool = LDAPConnectionPool(max_size=2, idle_timeout=60)
+        conn = FakeConnection()
+        assert pool.get('admin') is None
+        pool.put('admin', conn)
+        assert pool.get('user') is None
+        assert pool.get('admin') is conn
+        assert pool.stats() == dict(size=0, hits=1, misses=2, evictions=0,
+                                    failed_checks=0)
+
+    def test_failed_check(self):
+        pool = LDAPConnectionPool(max_size=2, idle_timeout=60)
+        conn = FakeConnection(healthy=False)
+        pool.put('admin', conn)
+        assert pool.get('admin') is None
+        assert conn.unbound
+        assert pool.stats()['failed_checks'] == 1
+
+    def test_max_size(self):
+        pool = LDAPConnectionPool(max_size=2, idle_timeout=60)
+        conns = [FakeConnection() for _i in range(3)]
+        pool.put('admin', conns[0])
+        pool.put('user', conns[1])
+        pool.put('user', conns[2])
+        assert conns[0].unbound
+        assert pool.get('admin') is None
+        assert pool.stats()['evictions'] == 1
+
+    def test_idle_timeout(self):
+        pool = LDAPConnectionPool(max_size=2, idle_timeout=-1)
+        conn = FakeConnection()
+        pool.put('admin', conn)
+        assert conn.unbound
+        assert pool.get('admin') is None
+
+    def test_clear(self):
+        pool = LDAPConnectionPool(max_size=2, idle_timeout=60)
+        conn = FakeConnection()
+        pool.put('admin', conn)
+        pool.clear()
+        assert conn.unbound
+        assert pool.stats()['size'] == 0
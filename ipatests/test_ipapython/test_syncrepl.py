@@ -0,0 +1,119 @@
+#
+# Copyright (C) 2016  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the `ipapython/dnssec/syncrepl.py` module.
+"""
+
+import os
+
+import pytest
+from ldap.syncrepl import SyncreplConsumer
+
+from ipapython.dnssec.syncrepl import SyncReplConsumer
+
+pytestmark = pytest.mark.tier0
+
+BASE = 'cn=dns,dc=example,dc=com'
+ZONE_DN = 'idnsname=example.com.,cn=dns,dc=example,dc=com'
+ZONE_UUID = '0b0d6f45-2cd5-4e5b-9f5c-3a2f8f0d7d1e'
+
+
+class RecordingConsumer(SyncReplConsumer):
+    def __init__(self, *args, **kwargs):
+        self.added = []
+        SyncReplConsumer.__init__(self, *args, **kwargs)
+
+    def application_add(self, uuid, dn, attributes):
+        self.added.append((uuid, dn, attributes['idnsname']))
+
+
+@pytest.fixture
+def db_path(tmpdir):
+    return str(tmpdir.join('syncrepl.db'))
+
+
+@pytest.fixture(autouse=True)
+def no_search(monkeypatch):
+    monkeypatch.setattr(SyncreplConsumer, 'syncrepl_search',
+                        lambda self, *args, **kwargs: 1)
+
+
+def search(consumer, filterstr='(objectClass=idnsZone)'):
+    consumer.syncrepl_search(BASE, 2, mode='refreshAndPersist',
+                             filterstr=filterstr)
+
+
+def test_in_memory():
+    consumer = RecordingConsumer('ldap://localhost')
+    search(consumer)
+    consumer.syncrepl_entry(ZONE_DN, {'idnsName': ['example.com.']},
+                            ZONE_UUID)
+    consumer.syncrepl_set_cookie('cookie1')
+    assert consumer.syncrepl_get_cookie() == 'cookie1'
+    assert consumer.added == [(ZONE_UUID, ZONE_DN, ['example.com.'])]
+
+
+def test_resume(db_path):
+    consumer = RecordingConsumer('ldap://localhost', db_path=db_path)
+    search(consumer)
+    consumer.syncrepl_entry(ZONE_DN, {'idnsName': ['example.com.']},
+                            ZONE_UUID)
+    consumer.syncrepl_set_cookie('cookie1')
+    consumer.close_db()
+
+    consumer = RecordingConsumer('ldap://localhost', db_path=db_path)
+    assert consumer.syncrepl_get_cookie() == 'cookie1'
+    assert consumer.added == []
+    search(consumer)
+    assert consumer.added == [(ZONE_UUID, ZONE_DN, ['example.com.'])]
+
+    # the entry is known, the same change is a modification now
+    consumer.syncrepl_entry(ZONE_DN, {'idnsName': ['example.com.']},
+                            ZONE_UUID)
+    assert len(consumer.added) == 1
+
+
+def test_uncommitted_changes(db_path):
+    consumer = RecordingConsumer('ldap://localhost', db_path=db_path)
+    search(consumer)
+    consumer.syncrepl_entry(ZONE_DN, {'idnsName': ['example.com.']},
+                            ZONE_UUID)
+    consumer.syncrepl_set_cookie('cookie1')
+    consumer.syncrepl_delete([ZONE_UUID])
+    consumer.close_db()
+
+    # the deletion was not followed by a cookie
+    consumer = RecordingConsumer('ldap://localhost', db_path=db_path)
+    search(consumer)
+    assert consumer.syncrepl_get_cookie() == 'cookie1'
+    assert consumer.added == [(ZONE_UUID, ZONE_DN, ['example.com.'])]
+
+
+def test_search_changed(db_path):
+    consumer = RecordingConsumer('ldap://localhost', db_path=db_path)
+    search(consumer)
+    consumer.syncrepl_entry(ZONE_DN, {'idnsName': ['example.com.']},
+                            ZONE_UUID)
+    consumer.syncrepl_set_cookie('cookie1')
+    consumer.close_db()
+
+    consumer = RecordingConsumer('ldap://localhost', db_path=db_path)
+    search(consumer, filterstr='(objectClass=idnsSecKey)')
+    assert consumer.syncrepl_get_cookie() is None
+    assert consumer.added == []
+
+
+def test_corrupted_db(db_path):
+    with open(db_path, 'wb') as f:
+        f.write(b'garbage' * 1024)
+
+    consumer = RecordingConsumer('ldap://localhost', db_path=db_path)
+    assert consumer.syncrepl_get_cookie() is None
+    search(consumer)
+    consumer.syncrepl_set_cookie('cookie1')
+    consumer.close_db()
+    assert os.path.exists(db_path)
+
+    consumer = RecordingConsumer('ldap://localhost', db_path=db_path)
+    assert consumer.syncrepl_get_cookie() == 'cookie1'
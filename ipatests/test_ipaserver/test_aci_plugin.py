@@ -0,0 +1,183 @@
+#
+# Copyright (C) 2016  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the ACI search of the `ipaserver/plugins/aci.py` module.
+"""
+
+import pytest
+
+from ipapython.dn import DN
+from ipaserver.plugins import aci
+from ipaserver.plugins.aci import ParsedACIs, _parse_aci_name
+
+pytestmark = pytest.mark.tier0
+
+BASEDN = DN(('dc', 'example'), ('dc', 'com'))
+GROUPS = DN(('cn', 'groups'), ('cn', 'accounts'), BASEDN)
+USERS = u'ldap:///uid=*,cn=users,cn=accounts,%s' % BASEDN
+
+ACIS = [
+    u'(targetattr = "cn || sn")(target = "%s")(version 3.0;acl '
+    u'"permission:Read users";allow (read, search) '
+    u'groupdn = "ldap:///cn=Read users,cn=permissions,cn=pbac,%s";)' % (
+        USERS, BASEDN),
+    u'(targetattr = "mail")(targetfilter = "(memberOf=%s)")(version 3.0;acl '
+    u'"delegation:Edit mail";allow (write) '
+    u'groupdn = "ldap:///%s";)' % (
+        DN(('cn', 'editors'), GROUPS), DN(('cn', 'admins'), GROUPS)),
+    u'(targetattr = "telephoneNumber || mail")(version 3.0;acl '
+    u'"selfservice:Self phone";allow (write) userdn = "ldap:///self";)',
+    u'(targetattr = "member")(target = "ldap:///%s")(version 3.0;acl '
+    u'"permission:Manage editors";allow (write) '
+    u'groupdn = "ldap:///%s";)' % (
+        DN(('cn', 'editors'), GROUPS), BASEDN),
+    u'(targetattr = "*")(version 3.0;acl "Admins all";allow (all) '
+    u'groupdn = "ldap:///%s";)' % DN(('cn', 'admins'), GROUPS),
+    u'(targetattr = "cn")(targetfilter = "(objectclass=posixgroup)")'
+    u'(version 3.0;acl "permission:Read groups";allow (read) '
+    u'userdn = "ldap:///all";)',
+]
+
+
+def find_linear(acis, term=None, aciname=None, aciprefix=None, attrs=None,
+                bindrule=None, permissions=None, memberof_filter=None,
+                target=None, selfaci=False, group=None, targetgroup=None,
+                group_container_dn=None, filter=None, subtree=None):
+    """
+    Filter the ACIs one by one, as aci_find did before they were indexed
+    """
+    def target_of(a, name):
+        if name in a.target:
+            return a.target[name]['expression']
+        return None
+
+    def group_of(a):
+        groupdn = a.bindrule['expression'].replace('ldap:///', '')
+        try:
+            return DN(groupdn)[0]['cn']
+        except (ValueError, IndexError, KeyError):
+            return None
+
+    def targetgroup_of(a):
+        dn = target_of(a, 'target')
+        if dn is None:
+            return None
+        dn = DN(dn.replace('ldap:///', ''))
+        if not dn.endswith(group_container_dn):
+            return None
+        try:
+            return dn[0]['cn']
+        except (IndexError, KeyError):
+            return None
+
+    checks = []
+    if term:
+        checks.append(lambda a: term.lower() in a.name.lower())
+    if aciname:
+        checks.append(lambda a: _parse_aci_name(a.name)[1] == aciname)
+    if aciprefix:
+        checks.append(lambda a: _parse_aci_name(a.name)[0] == aciprefix)
+    if attrs:
+        checks.append(lambda a: set(t.lower() for t in attrs) <= set(
+            t.lower() for t in target_of(a, 'targetattr') or ()))
+    if bindrule:
+        checks.append(lambda a: a.bindrule['expression'] == bindrule)
+    if permissions:
+        checks.append(lambda a: set(permissions) <= set(a.permissions))
+    if memberof_filter:
+        checks.append(
+            lambda a: target_of(a, 'targetfilter') == memberof_filter)
+    if target is not None:
+        checks.append(lambda a: target_of(a, 'target') == target)
+    if selfaci:
+        checks.append(lambda a: a.bindrule['expression'] == u'ldap:///self')
+    if group:
+        checks.append(lambda a: group_of(a) == group)
+    if targetgroup:
+        checks.append(lambda a: targetgroup_of(a) == targetgroup)
+    if filter:
+        checks.append(lambda a: target_of(a, 'targetfilter') == filter)
+    if subtree:
+        checks.append(lambda a: (target_of(a, 'target') or u'').lower() ==
+                      subtree.lower())
+
+    return [a for a in acis if all(check(a) for check in checks)]
+
+
+@pytest.fixture(scope='module')
+def parsed():
+    return ParsedACIs(BASEDN, ACIS)
+
+
+@pytest.mark.parametrize('criteria', [
+    {},
+    {'term': u'read'},
+    {'term': u'nothing'},
+    {'aciname': u'Read users'},
+    {'aciprefix': u'permission'},
+    {'aciprefix': u'none'},
+    {'aciprefix': u'permission', 'term': u'GROUPS'},
+    {'attrs': [u'mail']},
+    {'attrs': [u'MAIL', u'telephonenumber']},
+    {'attrs': [u'cn', u'sn', u'uid']},
+    {'bindrule': u'ldap:///%s' % BASEDN},
+    {'permissions': [u'write']},
+    {'permissions': [u'read', u'search']},
+    {'permissions': [u'write'], 'attrs': [u'mail']},
+    {'memberof_filter': u'(memberOf=%s)' % DN(('cn', 'editors'), GROUPS)},
+    {'target': USERS},
+    {'target': u''},
+    {'selfaci': True},
+    {'selfaci': True, 'aciprefix': u'permission'},
+    {'group': u'admins'},
+    {'group': u'admins', 'aciprefix': u'none'},
+    {'targetgroup': u'editors', 'group_container_dn': GROUPS},
+    {'filter': u'(objectclass=posixgroup)'},
+    {'subtree': USERS.upper()},
+])
+def test_find(parsed, criteria):
+    expected = find_linear(parsed.acis, **criteria)
+    assert parsed.find(**criteria) == expected
+    assert [str(a) for a in parsed.find(**criteria)] == [
+        str(a) for a in expected]
+
+
+def test_find_keeps_order(parsed):
+    assert parsed.find() == parsed.acis
+    assert len(parsed.acis) == len(ACIS)
+    assert parsed.find(permissions=[u'write']) == [
+        parsed.acis[1], parsed.acis[2], parsed.acis[3]]
+
+
+class FakeLDAP(object):
+    def __init__(self, acis):
+        self.acis = acis
+        self.reads = 0
+
+    def get_entry(self, dn, attrs_list):
+        assert attrs_list == ['aci']
+        self.reads += 1
+        return {'aci': list(self.acis)}
+
+
+def test_get_parsed_acis():
+    # a caller that may read all ACIs, and one that may read only some
+    admin = FakeLDAP(ACIS)
+    user = FakeLDAP(ACIS[2:])
+
+    parsed = aci.get_parsed_acis(admin, BASEDN)
+    assert len(parsed.acis) == len(ACIS)
+    assert aci.get_parsed_acis(admin, BASEDN) is parsed
+    # the ACIs are read with the caller's bind each time
+    assert admin.reads == 2
+
+    assert len(aci.get_parsed_acis(user, BASEDN).acis) == len(ACIS) - 2
+    assert aci.get_parsed_acis(admin, BASEDN) is parsed
+
+
+def test_get_parsed_acis_bounded():
+    ldap = FakeLDAP(ACIS)
+    for i in range(aci.PARSED_ACIS_CACHE_SIZE * 2):
+        aci.get_parsed_acis(ldap, DN(('cn', str(i)), BASEDN))
+    assert len(aci._parsed_acis_cache) == aci.PARSED_ACIS_CACHE_SIZE
@@ -0,0 +1,171 @@
+#
+# Copyright (C) 2016  FreeIPA Contributors see COPYING for license
+#
+"""
+Test waiting for DNS records in `ipaserver/plugins/dns.py`.
+"""
+
+import threading
+import time
+
+import dns.exception
+import dns.name
+import dns.rdataclass
+import dns.rdatatype
+import dns.resolver
+import dns.rrset
+import pytest
+import six
+
+from ipalib import errors
+from ipapython.ipa_log_manager import log_mgr
+from ipaserver.plugins import dns as dns_plugin
+
+pytestmark = pytest.mark.tier0
+
+NAME = dns.name.from_text('www.example.com.')
+A = dns.rdatatype.A
+AAAA = dns.rdatatype.AAAA
+
+
+def rrset(rdtype, *values):
+    return dns.rrset.from_text(NAME, 86400, dns.rdataclass.IN, rdtype,
+                               *values)
+
+
+class FakeAnswer(object):
+    def __init__(self, rrset):
+        self.rrset = rrset
+        self.response = rrset
+
+
+class FakeResolver(object):
+    """
+    Returns the answers of each record type in turn, the last one is
+    returned again and again. An answer is a RRset, None for an empty
+    answer or an exception to raise.
+    """
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.queries = dict((rdtype, 0) for rdtype in answers)
+        self._lock = threading.Lock()
+
+    def query(self, qname, rdtype, rdclass, raise_on_no_answer=True):
+        assert qname == NAME
+        assert not raise_on_no_answer
+        with self._lock:
+            answers = self.answers[rdtype]
+            answer = answers[min(self.queries[rdtype], len(answers) - 1)]
+            self.queries[rdtype] += 1
+        if isinstance(answer, Exception):
+            raise answer
+        return FakeAnswer(answer)
+
+
+class FakeAPI(object):
+    def __init__(self, wait_for_dns):
+        self.env = dict(wait_for_dns=wait_for_dns)
+
+
+class FakeDNSRecord(object):
+    wait_for_modified_attr = six.get_unbound_function(
+        dns_plugin.dnsrecord.wait_for_modified_attr)
+    _wait_for_rrset = six.get_unbound_function(
+        dns_plugin.dnsrecord._wait_for_rrset)
+    _wait_for_rrsets = six.get_unbound_function(
+        dns_plugin.dnsrecord._wait_for_rrsets)
+    _get_wait_deadline = six.get_unbound_function(
+        dns_plugin.dnsrecord._get_wait_deadline)
+
+    def __init__(self, resolver, wait_for_dns=10):
+        log_mgr.get_logger(self, True)
+        self.api = FakeAPI(wait_for_dns)
+        self.resolver = resolver
+
+    def _get_wait_resolver(self):
+        return self.resolver
+
+
+def wait(resolver, expected, rdtype=A, timeout=0.5):
+    FakeDNSRecord(resolver).wait_for_modified_attr(
+        expected, rdtype, NAME, resolver, time.time() + timeout)
+
+
+def test_converge():
+    expected = rrset(A, '192.0.2.2')
+    resolver = FakeResolver({A: [
+        dns.resolver.NXDOMAIN(),
+        rrset(A, '192.0.2.1'),
+        expected,
+    ]})
+    wait(resolver, expected, timeout=10)
+    assert resolver.queries[A] == 3
+
+    # a deleted RRset
+    resolver = FakeResolver({A: [rrset(A, '192.0.2.1'), None]})
+    wait(resolver, None, timeout=10)
+    assert resolver.queries[A] == 2
+
+
+def test_mismatch_at_deadline():
+    resolver = FakeResolver({A: [rrset(A, '192.0.2.1')]})
+    start = time.time()
+    with pytest.raises(errors.DNSDataMismatch):
+        wait(resolver, rrset(A, '192.0.2.2'), timeout=0.5)
+    # the backoff does not sleep past the deadline
+    assert time.time() - start < 1.5
+    assert resolver.queries[A] > 1
+
+    # DNS errors are retried until the deadline and then raised
+    resolver = FakeResolver({A: [dns.resolver.Timeout()]})
+    with pytest.raises(dns.resolver.Timeout):
+        wait(resolver, None, timeout=0.2)
+    assert resolver.queries[A] > 1
+
+    # the DNS server is queried at least once
+    resolver = FakeResolver({A: [rrset(A, '192.0.2.1')]})
+    wait(resolver, rrset(A, '192.0.2.1'), timeout=0)
+    assert resolver.queries[A] == 1
+
+
+def test_nxdomain():
+    record = FakeDNSRecord(FakeResolver({A: [dns.resolver.NXDOMAIN()]}))
+    # the name is expected not to exist
+    record._wait_for_rrset(None, A, NAME, True, record.resolver,
+                           time.time() + 0.2, threading.Event())
+
+    # only the RRset is expected not to exist
+    with pytest.raises(errors.DNSDataMismatch) as e:
+        record._wait_for_rrset(None, A, NAME, False, record.resolver,
+                               time.time() + 0.2, threading.Event())
+    assert 'NXDOMAIN' in str(e.value)
+
+
+def test_wait_for_rrsets():
+    record = FakeDNSRecord(FakeResolver({
+        A: [None, rrset(A, '192.0.2.1')],
+        AAAA: [None, None, rrset(AAAA, '2001:db8::1')],
+    }))
+    record._wait_for_rrsets([
+        (rrset(A, '192.0.2.1'), A, NAME, False),
+        (rrset(AAAA, '2001:db8::1'), AAAA, NAME, False),
+    ])
+    assert record.resolver.queries == {A: 2, AAAA: 3}
+
+
+def test_wait_for_rrsets_stop_on_first_failure():
+    record = FakeDNSRecord(FakeResolver({
+        A: [rrset(A, '192.0.2.1')],
+        AAAA: [dns.exception.FormError()],
+    }), wait_for_dns=30)
+    start = time.time()
+    with pytest.raises(errors.DNSDataMismatch) as e:
+        record._wait_for_rrsets([
+            (rrset(A, '192.0.2.2'), A, NAME, False),
+            (rrset(AAAA, '2001:db8::1'), AAAA, NAME, False),
+        ])
+    assert 'FormError' in str(e.value)
+    # the check of A does not wait for the deadline
+    assert time.time() - start < 10
+    assert record.resolver.queries[AAAA] == 1
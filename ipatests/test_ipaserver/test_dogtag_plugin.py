@@ -0,0 +1,290 @@
+#
+# Copyright (C) 2016  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the `ipaserver/plugins/dogtag.py` module.
+"""
+
+import io
+import time
+import types
+
+import pytest
+import six
+from six.moves import urllib
+
+from ipalib import errors
+from ipapython import ipaldap
+from ipapython.dn import DN
+from ipapython.ipa_log_manager import log_mgr
+
+try:
+    from ipaserver.plugins import dogtag
+except errors.SkipPluginModule:
+    # the module is loaded only if dogtag is the configured RA plugin
+    dogtag = None
+
+pytestmark = [
+    pytest.mark.tier0,
+    pytest.mark.skipif(dogtag is None, reason='dogtag is not the RA plugin'),
+]
+
+
+def cert_search_page(serials):
+    infos = u''.join(
+        u'<CertDataInfo id="0x%x"><SubjectDN>CN=cert%d</SubjectDN>'
+        u'<IssuerDN>CN=CA</IssuerDN><Status>VALID</Status></CertDataInfo>' % (
+            serial, serial)
+        for serial in serials)
+    return (u'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            u'<CertDataInfos><total>%d</total>%s</CertDataInfos>' % (
+                len(serials), infos)).encode('utf-8')
+
+
+class FakeCA(object):
+    """
+    CA with the certificates 1 to ``count``. If ``ignore_start`` is set,
+    every page starts with the first certificate, like some CA versions do.
+    """
+
+    def __init__(self, count, ignore_start=False):
+        self.count = count
+        self.ignore_start = ignore_start
+        self.pages = []
+
+    def open(self, req):
+        query = urllib.parse.parse_qs(
+            urllib.parse.urlparse(req.get_full_url()).query)
+        start = int(query['start'][0])
+        size = int(query['size'][0])
+        self.pages.append((start, size))
+        if self.ignore_start:
+            start = 0
+        serials = range(start + 1, min(start + size, self.count) + 1)
+        return io.BytesIO(cert_search_page(serials))
+
+
+class FakeRA(object):
+    ca_host = 'ca.example.com'
+
+    def __init__(self):
+        log_mgr.get_logger(self, True)
+        for name in ('_find_pages', '_find_page'):
+            method = six.get_unbound_function(getattr(dogtag.ra, name))
+            setattr(self, name, types.MethodType(method, self))
+        self.parsed = None
+
+    def _parse_cert_data_info(self, cert):
+        # the certificate parsed before was cleared, the ones before it
+        # were dropped
+        if self.parsed is not None:
+            assert len(self.parsed) == 0
+            assert not self.parsed.attrib
+        assert len(list(cert.itersiblings(preceding=True))) <= 1
+        self.parsed = cert
+        return dogtag.ra._parse_cert_data_info(cert)
+
+
+@pytest.fixture
+def ca(monkeypatch):
+    ca = FakeCA(250)
+    monkeypatch.setattr(urllib.request, 'build_opener', lambda: ca)
+    return ca
+
+
+def find(sizelimit):
+    return list(FakeRA()._find_pages(b'<CertSearchRequest/>', sizelimit))
+
+
+def test_find_page(ca):
+    result = find(2)
+    assert result == [
+        dict(serial_number=1, serial_number_hex=u'0x1', subject=u'CN=cert1',
+             issuer=u'CN=CA', status=u'VALID'),
+        dict(serial_number=2, serial_number_hex=u'0x2', subject=u'CN=cert2',
+             issuer=u'CN=CA', status=u'VALID'),
+    ]
+    assert ca.pages == [(0, 2)]
+
+
+@pytest.mark.parametrize('sizelimit,pages', [
+    (100, [(0, 100)]),
+    (150, [(0, 100), (100, 50)]),
+    (250, [(0, 100), (100, 100), (200, 50)]),
+    (300, [(0, 100), (100, 100), (200, 100)]),
+    # unlimited, the short page is the last one
+    (0, [(0, 100), (100, 100), (200, 100)]),
+])
+def test_find_pages(ca, sizelimit, pages):
+    result = find(sizelimit)
+    assert [r['serial_number'] for r in result] == list(
+        range(1, min(sizelimit or 250, 250) + 1))
+    assert ca.pages == pages
+
+
+def test_find_pages_empty_last_page(ca):
+    ca.count = 200
+    assert len(find(0)) == 200
+    assert ca.pages == [(0, 100), (100, 100), (200, 100)]
+
+
+def test_find_pages_start_ignored(ca):
+    # the second page starts with the same certificate as the first one
+    ca.ignore_start = True
+    result = find(0)
+    assert [r['serial_number'] for r in result] == list(range(1, 101))
+    assert ca.pages == [(0, 100), (100, 100)]
+
+
+CA_HOST = 'ca.example.com'
+LOCAL_HOST = 'ipa.example.com'
+MASTERS_DN = DN(('cn', 'masters'), ('cn', 'ipa'), ('cn', 'etc'),
+                ('dc', 'example'), ('dc', 'com'))
+
+
+class FakeEnv(object):
+    basedn = MASTERS_DN[3:]
+    ca_host = CA_HOST
+    host = LOCAL_HOST
+
+
+class FakeAPI(object):
+    env = FakeEnv()
+
+
+class FakeLDAP2(ipaldap.LDAPClient):
+    """
+    Finds the masters added by `add_master()` and the entries of the
+    services named in the filter.
+    """
+
+    def __init__(self):
+        super(FakeLDAP2, self).__init__('ldap://test')
+        self._has_schema = True
+        self._schema = None
+        self.entries = []
+        self.searches = 0
+        self.error = None
+
+    def add_master(self, host, location=None, services=('CA',)):
+        master_dn = DN(('cn', host), MASTERS_DN)
+        if location is not None:
+            self.entries.append(self.make_entry(
+                master_dn, cn=[host], ipaLocation=[location]))
+        for service in services:
+            self.entries.append(self.make_entry(
+                DN(('cn', service), master_dn), cn=[service],
+                ipaConfigString=['enabledService']))
+
+    def find_entries(self, filter=None, attrs_list=None, base_dn=None,
+                     **kwargs):
+        assert base_dn == MASTERS_DN
+        self.searches += 1
+        if self.error is not None:
+            raise self.error
+        entries = [e for e in self.entries
+                   if e.dn[1:] == MASTERS_DN or
+                   '(cn=%s)' % e.dn[0].value in filter]
+        if not entries:
+            raise errors.NotFound(reason='no masters')
+        return entries, False
+
+
+@pytest.fixture
+def ldap2(monkeypatch):
+    monkeypatch.setattr(dogtag, 'api', FakeAPI())
+    return FakeLDAP2()
+
+
+def test_host_selection_order(ldap2):
+    ldap2.add_master(CA_HOST)
+    ldap2.add_master(LOCAL_HOST, location='loc1')
+    ldap2.add_master('near.example.com', location='loc1')
+    ldap2.add_master('far.example.com', location='loc2')
+    selector = dogtag.ServiceHostSelector('CA', ttl=0)
+    for host in (CA_HOST, LOCAL_HOST, 'near.example.com', 'far.example.com'):
+        assert selector.get_host(ldap2) == host
+        selector.mark_failed(host)
+    # every master failed, they are all candidates again
+    assert selector.get_host(ldap2) == CA_HOST
+
+
+def test_host_selection_service(ldap2):
+    ldap2.add_master(CA_HOST, services=('KRA',))
+    ldap2.add_master('kra.example.com', services=('KRA',))
+    ldap2.add_master('ca2.example.com')
+    assert dogtag.ServiceHostSelector('CA').get_host(
+        ldap2) == 'ca2.example.com'
+
+    # no master provides the service
+    assert dogtag.ServiceHostSelector('OTHER').get_host(ldap2) == CA_HOST
+
+
+def test_host_selection_location(ldap2):
+    ldap2.add_master(LOCAL_HOST, location='loc1', services=())
+    for i in range(5):
+        ldap2.add_master('near%d.example.com' % i, location='loc1')
+        ldap2.add_master('far%d.example.com' % i, location='loc2')
+    for _i in range(20):
+        selector = dogtag.ServiceHostSelector('CA')
+        assert selector.get_host(ldap2).startswith('near')
+
+    # no master in the location is left
+    for i in range(5):
+        selector.mark_failed('near%d.example.com' % i)
+    assert selector.get_host(ldap2).startswith('far')
+
+
+def test_host_selection_ttl(ldap2):
+    ldap2.add_master('ca1.example.com')
+    selector = dogtag.ServiceHostSelector('CA', ttl=0.2)
+    assert selector.get_host(ldap2) == 'ca1.example.com'
+    ldap2.add_master(CA_HOST)
+    assert selector.get_host(ldap2) == 'ca1.example.com'
+    assert ldap2.searches == 1
+
+    time.sleep(0.3)
+    assert selector.get_host(ldap2) == CA_HOST
+    assert ldap2.searches == 2
+
+
+def test_host_selection_keeps_current(ldap2):
+    for i in range(10):
+        ldap2.add_master('ca%d.example.com' % i)
+    selector = dogtag.ServiceHostSelector('CA', ttl=0)
+    host = selector.get_host(ldap2)
+    for _i in range(20):
+        assert selector.get_host(ldap2) == host
+
+    selector.mark_failed(host)
+    other = selector.get_host(ldap2)
+    assert other != host
+    for _i in range(20):
+        assert selector.get_host(ldap2) == other
+
+
+def test_host_failure_ttl(ldap2):
+    ldap2.add_master(CA_HOST)
+    ldap2.add_master('ca1.example.com')
+    selector = dogtag.ServiceHostSelector('CA', ttl=0.2, failure_ttl=0.5)
+    assert selector.get_host(ldap2) == CA_HOST
+    # the failed host is replaced without waiting for the selection TTL
+    selector.mark_failed(CA_HOST)
+    assert selector.get_host(ldap2) == 'ca1.example.com'
+
+    # the failure is remembered after the selection TTL
+    time.sleep(0.3)
+    assert selector.get_host(ldap2) == 'ca1.example.com'
+    time.sleep(0.3)
+    assert selector.get_host(ldap2) == CA_HOST
+
+
+def test_host_search_failure(ldap2):
+    ldap2.add_master('ca1.example.com')
+    ldap2.error = errors.DatabaseError(desc='busy', info='')
+    selector = dogtag.ServiceHostSelector('CA')
+    assert selector.get_host(ldap2) == CA_HOST
+    # the fallback is not remembered
+    ldap2.error = None
+    assert selector.get_host(ldap2) == 'ca1.example.com'
+    assert ldap2.searches == 2
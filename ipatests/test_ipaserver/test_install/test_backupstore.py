@@ -0,0 +1,84 @@
+#
+# Copyright (C) 2016  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the `ipaserver/install/backupstore.py` module.
+"""
+
+import io
+import os
+import random
+
+import pytest
+
+from ipaserver.install import backupstore
+
+pytestmark = pytest.mark.tier0
+
+
+def make_ldif(count, start=0):
+    return b''.join(
+        b'dn: uid=user%d,cn=users,dc=example,dc=com\n'
+        b'objectClass: person\n'
+        b'description: %d\n\n' % (i, random.randint(0, 10 ** 9))
+        for i in range(start, start + count))
+
+
+@pytest.fixture
+def store(tmpdir):
+    return backupstore.ChunkStore(str(tmpdir.join('chunks')))
+
+
+@pytest.fixture
+def source(tmpdir):
+    src = tmpdir.mkdir('src')
+    src.join('userRoot.ldif').write(make_ldif(20000), mode='wb')
+    src.mkdir('bak').join('id2entry.db').write(b'\0' * 100000, mode='wb')
+    return src
+
+
+def test_chunks():
+    data = make_ldif(20000)
+    chunks = list(backupstore.iter_chunks(io.BytesIO(data)))
+    assert len(chunks) > 1
+    assert b''.join(chunks) == data
+    assert all(len(c) <= 2 * backupstore.CHUNK_MAX_SIZE for c in chunks)
+
+    # an entry inserted at the start changes only the first chunk
+    changed = list(backupstore.iter_chunks(
+        io.BytesIO(make_ldif(1, start=100000) + data)))
+    assert changed[1:] == chunks[1:]
+
+
+def test_backup_restore(tmpdir, store, source):
+    manifest = str(tmpdir.join('manifest'))
+    total, written = backupstore.create_manifest(store, str(source), manifest)
+    assert total == 100000 + len(source.join('userRoot.ldif').read('rb'))
+    assert written > 0
+
+    # nothing changed, no new chunks
+    assert backupstore.create_manifest(
+        store, str(source), str(tmpdir.join('manifest2')))[1] == 0
+
+    target = tmpdir.mkdir('target')
+    backupstore.restore_manifest(store, backupstore.read_manifest(manifest),
+                                 str(target))
+    for name in ('userRoot.ldif', os.path.join('bak', 'id2entry.db')):
+        assert (target.join(name).read('rb') ==
+                source.join(name).read('rb'))
+
+
+def test_verify(tmpdir, store, source):
+    filename = str(tmpdir.join('manifest'))
+    backupstore.create_manifest(store, str(source), filename)
+    manifest = backupstore.read_manifest(filename)
+    assert backupstore.verify_manifest(store, manifest) == []
+
+    digest = manifest['files'][-1]['chunks'][0]
+    path = store._chunk_path(digest)
+    os.chmod(path, 0o600)
+    with open(path, 'wb') as f:
+        f.write(b'garbage')
+    problems = backupstore.verify_manifest(store, manifest)
+    assert len(problems) == 1
+    assert digest in problems[0]
@@ -0,0 +1,310 @@
+#
+# Copyright (C) 2016  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the pipelined writes and index tasks of
+`ipaserver/install/ldapupdate.py`.
+"""
+
+import copy
+
+import ldap
+import pytest
+
+from ipalib import errors
+from ipapython import ipaldap
+from ipapython.dn import DN
+from ipapython.ipa_log_manager import log_mgr
+from ipaserver.install import ldapupdate
+
+pytestmark = pytest.mark.tier0
+
+SUFFIX = DN('dc=example,dc=com')
+DN_ATTRS = ('member', 'memberof', 'managedby')
+
+
+class FakeLDAPClient(ipaldap.LDAPClient):
+    """
+    In-memory LDAP server. Like 389-ds, it applies the operations in flight
+    concurrently; they are applied in reverse order whenever a result is
+    read, so writes which must be ordered are only ordered if the updater
+    waits for the earlier one.
+    """
+
+    def __init__(self):
+        # like the updater's connection, values are not decoded
+        super(FakeLDAPClient, self).__init__('ldap://test',
+                                             force_schema_updates=False,
+                                             decode_attrs=False)
+        self._has_schema = True
+        self._schema = None
+        # DN => {lowercased attribute name: [raw values]}
+        self.db = {}
+        # DN => list of exceptions raised by the next writes of the DN
+        self.fail = {}
+        self.in_flight = []
+        self.max_in_flight = 0
+        self.results = {}
+        self.last_msgid = 0
+
+    def has_dn_syntax(self, name_or_oid):
+        return name_or_oid.lower() in DN_ATTRS
+
+    def add(self, dn, **attrs):
+        self.db[DN(dn)] = dict(
+            (attr.lower(), [v.encode('utf-8') for v in values])
+            for attr, values in attrs.items())
+
+    def values(self, dn, attr):
+        return [v.decode('utf-8') for v in self.db[DN(dn)].get(attr, [])]
+
+    def _check_failure(self, dn):
+        failures = self.fail.get(dn)
+        if failures:
+            raise failures.pop(0)
+
+    def _update_memberof(self, group_dn, members):
+        # the memberOf plugin updates the members which exist
+        for member in members:
+            member_attrs = self.db.get(DN(member.decode('utf-8')))
+            if member_attrs is not None:
+                member_attrs.setdefault('memberof', []).append(
+                    str(group_dn).encode('utf-8'))
+
+    def _search(self, dn):
+        if dn not in self.db:
+            raise errors.NotFound(reason=str(dn))
+        return self._convert_result([(str(dn), copy.deepcopy(self.db[dn]))])
+
+    def _add(self, dn, attrs):
+        self._check_failure(dn)
+        if dn in self.db:
+            raise errors.DuplicateEntry()
+        if dn[1:] not in self.db and dn[1:] != SUFFIX:
+            raise errors.NotFound(reason=str(dn))
+        self.db[dn] = dict((attr.lower(), list(values))
+                           for attr, values in attrs.items())
+        self._update_memberof(dn, attrs.get('member', []))
+
+    def _modify(self, dn, modlist):
+        self._check_failure(dn)
+        if dn not in self.db:
+            raise errors.NotFound(reason=str(dn))
+        attrs = self.db[dn]
+        for op, attr, values in modlist:
+            attr = attr.lower()
+            if op == ldap.MOD_ADD:
+                attrs.setdefault(attr, []).extend(values)
+            elif op == ldap.MOD_REPLACE:
+                attrs[attr] = list(values)
+            elif values is None:
+                attrs.pop(attr, None)
+            else:
+                attrs[attr] = [v for v in attrs[attr] if v not in values]
+            if attr == 'member' and op != ldap.MOD_DELETE:
+                self._update_memberof(dn, values)
+
+    def _send(self, operation):
+        self.last_msgid += 1
+        self.in_flight.append((self.last_msgid, operation))
+        self.max_in_flight = max(self.max_in_flight, len(self.in_flight))
+        return self.last_msgid
+
+    def get_entry_async(self, dn, attrs_list=None, time_limit=None):
+        return self._send(lambda: self._search(dn))
+
+    def add_entry_async(self, entry):
+        dn = entry.dn
+        attrs = dict((attr, list(values))
+                     for attr, values in entry.raw.items() if values)
+        return self._send(lambda: self._add(dn, attrs))
+
+    def update_entry_async(self, entry):
+        dn = entry.dn
+        modlist = entry.generate_modlist()
+        return self._send(lambda: self._modify(dn, modlist))
+
+    def get_async_result(self, msgid):
+        for queued_msgid, operation in reversed(self.in_flight):
+            try:
+                self.results[queued_msgid] = (operation(), None)
+            except errors.PublicError as e:
+                self.results[queued_msgid] = (None, e)
+        self.in_flight = []
+        result, error = self.results.pop(msgid)
+        if error is not None:
+            raise error
+        return result or []
+
+    def get_entries(self, base_dn, scope=None, filter=None, attrs_list=None):
+        # a synchronous search does not wait for the writes in flight
+        return self._search(base_dn)
+
+    def add_entry(self, entry):
+        self._add(entry.dn, dict(entry.raw))
+
+    def update_entry(self, entry):
+        self._modify(entry.dn, entry.generate_modlist())
+        entry.reset_modlist()
+
+
+class Updater(ldapupdate.LDAPUpdate):
+    def __init__(self, conn):
+        log_mgr.get_logger(self, True)
+        self.conn = conn
+        self.sub_dict = {}
+        self.modified = False
+        self._pending = []
+        self._prefetched = {}
+        self._index_attributes = []
+
+
+@pytest.fixture
+def conn():
+    return FakeLDAPClient()
+
+
+def entry_dn(name):
+    return DN(('cn', name), SUFFIX)
+
+
+def add_record(name, parent=SUFFIX, **attrs):
+    # values are encoded like in the records of parse_update_file()
+    default = [dict(attr='objectClass', value=b'top'),
+               dict(attr='cn', value=name.encode('utf-8'))]
+    for attr, values in attrs.items():
+        default.extend(dict(attr=attr, value=v.encode('utf-8'))
+                       for v in values)
+    return {'dn': DN(('cn', name), parent), 'default': default}
+
+
+def update_record(name, action, attr, value):
+    return {'dn': entry_dn(name),
+            'updates': [dict(action=action, attr=attr,
+                             value=value.encode('utf-8'))]}
+
+
+def test_same_entry_order(conn):
+    conn.add(entry_dn('a'), cn=['a'], x=['1'])
+    Updater(conn)._run_updates([
+        update_record('a', 'add', 'x', '2'),
+        update_record('a', 'add', 'x', '3'),
+    ])
+    assert conn.values(entry_dn('a'), 'x') == ['1', '2', '3']
+    assert not conn.in_flight
+
+
+def test_parent_child_order(conn):
+    Updater(conn)._run_updates([
+        add_record('parent'),
+        add_record('child', parent=entry_dn('parent')),
+    ])
+    assert DN(('cn', 'child'), entry_dn('parent')) in conn.db
+
+
+def test_referenced_entry_order(conn):
+    # like 40-delegation.update, a privilege and a permission which lists
+    # it as member are added, the privilege must get its memberOf
+    Updater(conn)._run_updates([
+        add_record('privilege'),
+        add_record('permission', member=[str(entry_dn('privilege'))]),
+    ])
+    assert conn.values(entry_dn('privilege'), 'memberof') == [
+        str(entry_dn('permission'))]
+
+    conn.add(entry_dn('group'), cn=['group'])
+    Updater(conn)._run_updates([
+        add_record('user'),
+        update_record('group', 'add', 'member', str(entry_dn('user'))),
+    ])
+    assert conn.values(entry_dn('user'), 'memberof') == [
+        str(entry_dn('group'))]
+
+
+def test_retry_prefetched(conn):
+    conn.add(entry_dn('a'), cn=['a'])
+    conn.fail[entry_dn('a')] = [errors.DatabaseError(desc='busy', info='')]
+    updater = Updater(conn)
+    updater._run_updates([
+        update_record('a', 'add', 'x', 'X'),
+        update_record('a', 'remove', 'x', 'X'),
+    ])
+    # the failed write is retried before the second record reads the entry
+    assert conn.values(entry_dn('a'), 'x') == []
+    assert updater.modified
+
+
+def test_earlier_failure_raised(conn):
+    conn.add(entry_dn('bad'), cn=['bad'])
+    conn.fail[entry_dn('bad')] = [
+        errors.ObjectclassViolation(info='bad') for _i in range(2)]
+    updater = Updater(conn)
+    with pytest.raises(errors.ObjectclassViolation):
+        updater._run_updates(
+            [update_record('bad', 'add', 'x', '1')] +
+            [add_record('new%d' % i) for i in range(10)])
+    assert not updater._pending
+
+
+def test_in_flight_limit(conn):
+    count = ldapupdate.UPDATE_MAX_PENDING * 3
+    Updater(conn)._run_updates([add_record('e%d' % i) for i in range(count)])
+    assert len(conn.db) == count
+    assert 1 < conn.max_in_flight <= ldapupdate.UPDATE_MAX_PENDING
+
+
+INDEX_DN = DN(('cn', 'index'), ('cn', 'userRoot'), ('cn', 'ldbm database'),
+              ('cn', 'plugins'), ('cn', 'config'))
+
+
+@pytest.fixture
+def index_updater(conn):
+    conn.add(INDEX_DN, cn=['index'])
+    updater = Updater(conn)
+    updater.tasks = []
+    updater.create_index_task = (
+        lambda *attributes: updater.tasks.append(attributes))
+    updater.monitor_index_task = lambda dn: None
+    return updater
+
+
+def test_index_tasks_before_plugin(index_updater):
+    plugin_calls = []
+
+    def plugin():
+        plugin_calls.append(list(index_updater.tasks))
+        return False, []
+
+    index_updater.api = type('FakeAPI', (object,),
+                             {'Updater': {'plugin': plugin}})
+    index_updater._run_updates([
+        add_record('a', parent=INDEX_DN),
+        add_record('b', parent=INDEX_DN),
+        {'plugin': 'plugin'},
+        add_record('c', parent=INDEX_DN),
+    ])
+    # the indexes changed before the plugin are rebuilt in one task first
+    assert plugin_calls == [[(b'a', b'b')]]
+    index_updater._run_index_tasks()
+    assert index_updater.tasks == [(b'a', b'b'), (b'c',)]
+
+
+def test_index_tasks_per_file(index_updater, tmpdir):
+    files = []
+    for name, records in (('10-index.update', ['a', 'b']),
+                          ('20-entry.update', []),
+                          ('30-index.update', ['c'])):
+        lines = ['dn: cn=%s,%s\ndefault: cn: %s\n' % (r, INDEX_DN, r)
+                 for r in records]
+        lines.append('dn: cn=entry,%s\nadd: description: %s\n' % (
+            SUFFIX, name))
+        path = tmpdir.join(name)
+        path.write('\n'.join(lines))
+        files.append(str(path))
+    index_updater.conn.add(entry_dn('entry'), cn=['entry'])
+    index_updater.create_connection = lambda: None
+    index_updater.close_connection = lambda: None
+    index_updater._store_fingerprints = lambda fingerprints: None
+
+    assert index_updater.update(files, force=True)
+    assert index_updater.tasks == [(b'a', b'b'), (b'c',)]
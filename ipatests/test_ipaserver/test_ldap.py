@@ -156,6 +156,27 @@ class test_ldap(object):
         serial = unicode(x509.get_serial_number(cert, x509.DER))
         assert serial is not None
 
+    def test_iter_entries(self):
+        """
+        Test that iter_entries generates the same entries as find_entries
+        """
+        self.conn = ldap2(api, ldap_uri=self.ldapuri)
+        self.conn.connect()
+        base_dn = DN(api.env.container_accounts, api.env.basedn)
+        entries, _truncated = self.conn.find_entries(
+            base_dn=base_dn, attrs_list=['cn'], scope=self.conn.SCOPE_ONELEVEL)
+        streamed = list(self.conn.iter_entries(
+            base_dn=base_dn, attrs_list=['cn'], scope=self.conn.SCOPE_ONELEVEL,
+            size_limit=2, paged_search=True))
+        assert (sorted(e.dn for e in streamed) ==
+                sorted(e.dn for e in entries))
+
+        # stopping early must not break the connection
+        result = self.conn.iter_entries(base_dn=base_dn, paged_search=True)
+        next(result)
+        result.close()
+        assert self.conn.get_entry(base_dn, ['cn']).dn == base_dn
+
 
 @pytest.mark.tier0
 class test_LDAPEntry(object):
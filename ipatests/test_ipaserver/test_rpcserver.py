@@ -21,6 +21,7 @@
 Test the `ipaserver.rpc` module.
 """
 
+import datetime
 import json
 import pytest
 
@@ -28,6 +29,9 @@ import six
 
 from ipatests.util import assert_equal, raises, PluginTester
 from ipalib import errors
+from ipalib.rpc import json_encode_binary
+from ipapython.dn import DN
+from ipapython.version import VERSION
 from ipaserver import rpcserver
 
 if six.PY3:
@@ -259,3 +263,68 @@ class test_jsonserver(PluginTester):
         options = dict(givenname=u'John', sn='Doe')
         d = dict(method=u'user_add', params=(args, options), id=18)
         assert o.unmarshal(json.dumps(d)) == (u'user_add', args, options, 18)
+
+    def test_marshal(self):
+        """
+        Test the `ipaserver.rpcserver.jsonserver.marshal` method.
+        """
+        (o, api, home) = self.instance('Backend', in_server=True)
+
+        result = dict(
+            count=2,
+            result=(
+                dict(dn=DN('uid=jdoe,cn=users'), uid=(u'jdoe',),
+                     usercertificate=(b'\x00\xff',)),
+                dict(dn=DN('uid=jsmith,cn=users'), uid=(u'jsmith',),
+                     krblastpwdchange=(datetime.datetime(2016, 1, 1),)),
+            ),
+        )
+        for version in (u'2.51', u'2.213'):
+            response = b''.join(o.marshal(result, None, 1, version))
+            expected = json_encode_binary(
+                dict(result=result, error=None, id=1, principal=u'UNKNOWN',
+                     version=unicode(VERSION)),
+                version)
+            assert json.loads(response.decode('utf-8')) == expected
+            if version == u'2.51':
+                assert b'\n    ' in response
+            else:
+                assert b'\n' not in response
+
+        # large responses are sent in chunks
+        result = dict(result=[u'x' * 1024] * 1024)
+        chunks = list(o.marshal(result, None, 1, u'2.213'))
+        assert len(chunks) > 1
+        assert json.loads(b''.join(chunks).decode('utf-8'))['result'] == result
+
+    def test_marshal_error(self):
+        """
+        Test that an encoding error is reported as a server error.
+        """
+        (o, api, home) = self.instance('Backend', in_server=True)
+        statuses = []
+
+        def start_response(status, headers):
+            statuses.append(status)
+
+        def call(result):
+            del statuses[:]
+            # plugins are locked, see test_backend
+            object.__setattr__(o, 'wsgi_execute', lambda environ: o.marshal(
+                dict(result=result), None, 1, u'2.213'))
+            return o({}, start_response)
+
+        response = call(object())
+        assert statuses == [rpcserver.HTTP_STATUS_SERVER_ERROR]
+        assert list(response) == [rpcserver.HTTP_STATUS_SERVER_ERROR]
+
+        # the end of a large response is encoded while it is sent, an error
+        # there must abort the response rather than end it normally
+        size = rpcserver.RESPONSE_BUFFER_SIZE // 1024 + 1
+        response = call([u'x' * 1024] * size + [object()])
+        assert statuses == [rpcserver.HTTP_STATUS_SUCCESS]
+        raises(TypeError, list, response)
+
+        response = call([u'x' * 1024] * (size // 2))
+        assert statuses == [rpcserver.HTTP_STATUS_SUCCESS]
+        assert isinstance(response, list)
@@ -0,0 +1,161 @@
+#
+# Copyright (C) 2016  FreeIPA Contributors see COPYING for license
+#
+"""
+Test the `ipaserver/session.py` module.
+"""
+
+import os
+
+import pytest
+
+from ipaserver import session
+
+pytestmark = pytest.mark.tier0
+
+
+class FakeCredentials(object):
+    def __init__(self):
+        self.lifetime = 3600
+        self.valid = True
+        self.inquiries = 0
+
+    def __call__(self, name=None, ccache_name=None):
+        self.inquiries += 1
+        if self.valid:
+            return self
+        return None
+
+
+class WriteCounter(object):
+    def __init__(self):
+        self.writes = 0
+
+    def __call__(self, name, mode='r'):
+        if 'w' in mode:
+            self.writes += 1
+        return open(name, mode)
+
+
+@pytest.fixture
+def creds(monkeypatch):
+    creds = FakeCredentials()
+    monkeypatch.setattr(session, 'get_credentials_if_valid', creds)
+    return creds
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    counter = WriteCounter()
+    monkeypatch.setattr(session, 'open', counter, raising=False)
+    return counter
+
+
+@pytest.fixture
+def cache(tmpdir, monkeypatch, creds, writes):
+    monkeypatch.setattr(session, 'krbccache_dir', str(tmpdir))
+    monkeypatch.delenv('KRB5CCNAME', raising=False)
+    return session.SessionCCacheCache(max_sessions=2)
+
+
+def ccache_path(ccache_name):
+    return session.krb5_parse_ccache(ccache_name)[1]
+
+
+def test_bind(cache, writes):
+    ccache_name = cache.bind('s1', b'tgt1')
+    assert os.environ['KRB5CCNAME'] == ccache_name
+    with open(ccache_path(ccache_name), 'rb') as f:
+        assert f.read() == b'tgt1'
+    assert writes.writes == 1
+
+    # the file holds the data already
+    assert cache.bind('s1', b'tgt1') == ccache_name
+    assert writes.writes == 1
+
+    # other data
+    cache.bind('s2', b'tgt2')
+    assert writes.writes == 2
+    cache.bind('s1', b'tgt1')
+    assert writes.writes == 3
+
+    # the file was changed by someone else
+    os.utime(ccache_path(ccache_name), (0, 0))
+    cache.bind('s1', b'tgt1')
+    assert writes.writes == 4
+
+
+def test_get_endtime(cache, creds):
+    ccache_name = cache.bind('s1', b'tgt1')
+    assert cache.get_endtime('s1', ccache_name) is not None
+    assert cache.get_endtime('s1', ccache_name) is not None
+    assert creds.inquiries == 1
+
+    # the session got new credentials
+    ccache_name = cache.bind('s1', b'tgt2')
+    assert cache.get_endtime('s1', ccache_name) is not None
+    assert creds.inquiries == 2
+
+
+def test_get_endtime_expired(cache, creds):
+    creds.lifetime = -1
+    ccache_name = cache.bind('s1', b'tgt1')
+    cache.get_endtime('s1', ccache_name)
+    assert creds.inquiries == 1
+
+    # the expired credentials are forgotten
+    assert cache.get_endtime('s1', ccache_name) is None
+    creds.lifetime = 3600
+    assert cache.get_endtime('s1', ccache_name) is not None
+    assert creds.inquiries == 2
+
+    creds.valid = False
+    ccache_name = cache.bind('s1', b'tgt2')
+    assert cache.get_endtime('s1', ccache_name) is None
+    assert cache.get_endtime('s1', ccache_name) is None
+    assert creds.inquiries == 4
+
+
+def test_refresh(cache, creds, writes):
+    ccache_name = cache.bind('s1', b'tgt1')
+    cache.get_endtime('s1', ccache_name)
+    assert cache.refresh('s1', ccache_name) is None
+
+    # the ticket was renewed during the request
+    with open(ccache_path(ccache_name), 'wb') as f:
+        f.write(b'renewed tgt1')
+    assert cache.refresh('s1', ccache_name) == b'renewed tgt1'
+    assert cache.refresh('s1', ccache_name) is None
+
+    # the next request of the session neither writes nor checks the new
+    # ccache data
+    cache.release(ccache_name)
+    assert 'KRB5CCNAME' not in os.environ
+    assert cache.bind('s1', b'renewed tgt1') == ccache_name
+    assert cache.get_endtime('s1', ccache_name) is not None
+    assert writes.writes == 1
+    assert creds.inquiries == 1
+
+
+def test_refresh_not_validated(cache, creds):
+    ccache_name = cache.bind('s1', b'tgt1')
+    with open(ccache_path(ccache_name), 'wb') as f:
+        f.write(b'new tgt1')
+
+    # the credentials of s1 were not checked yet, the new ones are checked
+    # when they are used
+    assert cache.refresh('s1', ccache_name) == b'new tgt1'
+    assert cache.get_endtime('s1', ccache_name) is not None
+    assert creds.inquiries == 1
+
+
+def test_max_sessions(cache, creds):
+    for session_id in ('s1', 's2', 's3'):
+        ccache_name = cache.bind(session_id, b'tgt')
+        cache.get_endtime(session_id, ccache_name)
+    assert creds.inquiries == 3
+
+    # s1 is the least recently used session
+    for session_id in ('s2', 's3', 's1'):
+        cache.get_endtime(session_id, ccache_name)
+    assert creds.inquiries == 4
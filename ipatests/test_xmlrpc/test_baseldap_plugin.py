@@ -22,6 +22,7 @@ Test the `ipalib.plugins.baseldap` module.
 """
 
 import ldap
+import six
 
 from ipapython.dn import DN
 from ipapython import ipaldap
@@ -218,3 +219,146 @@ def test_entry_to_dict():
     assert_deepequal(
         baseldap.entry_to_dict(entry, all=True, raw=True),
         the_dict)
+
+
+@pytest.mark.tier0
+def test_convert_member_value():
+    """Test the LDAPObject member DN to primary key conversion"""
+    class FakePrimaryKey(object):
+        def __init__(self, name):
+            self.name = name
+
+    class FakeLDAPObject(object):
+        rdn_attribute = ''
+
+        def __init__(self, name, pkey, container_dn):
+            self.name = name
+            self.primary_key = FakePrimaryKey(pkey)
+            self.container_dn = container_dn
+
+        def get_primary_key_from_dn(self, dn):
+            return dn[self.primary_key.name]
+
+    class FakeAPI(object):
+        class env(object):
+            basedn = DN('dc=example,dc=com')
+
+        Object = {
+            'user': FakeLDAPObject('user', 'uid', DN('cn=users,cn=accounts')),
+            'group': FakeLDAPObject(
+                'group', 'cn', DN('cn=groups,cn=accounts')),
+            'accounts': FakeLDAPObject('accounts', 'cn', DN('cn=accounts')),
+        }
+
+    class group(baseldap.LDAPObject):
+        attribute_members = {
+            'member': ['user', 'group', 'nonexistent'],
+            'memberof': ['accounts', 'group'],
+        }
+
+    instance = group(FakeAPI())
+    containers = instance._build_member_containers()
+
+    def convert(attr, member):
+        result = instance._convert_member_value(member, *containers[attr])
+        if result is not None:
+            return result[0].name, result[1]
+
+    # plain values
+    assert convert(
+        'member', b'uid=admin,cn=users,cn=accounts,dc=example,dc=com'
+    ) == ('user', u'admin')
+    assert convert(
+        'member', b'cn=Admins,CN=Groups,cn=accounts,DC=example,dc=com'
+    ) == ('group', u'Admins')
+    assert convert(
+        'member', b'cn=x,cn=computers,cn=accounts,dc=example,dc=com'
+    ) is None
+    # values which need DN parsing
+    assert convert(
+        'member', b'uid=a\\2Cb,cn=users,cn=accounts,dc=example,dc=com'
+    ) == ('user', u'a,b')
+    assert convert(
+        'member', b'uid=a+cn=b,cn=users,cn=accounts,dc=example,dc=com'
+    ) == ('user', u'a')
+    # the first object in attribute_members wins
+    assert convert(
+        'memberof', b'cn=admins,cn=groups,cn=accounts,dc=example,dc=com'
+    ) == ('accounts', u'admins')
+    assert convert(
+        'memberof', b'cn=a\\2Cb,cn=groups,cn=accounts,dc=example,dc=com'
+    ) == ('accounts', u'a,b')
+
+
+@pytest.mark.tier0
+def test_get_memberofindirect_batch():
+    """Test that batched indirect membership never reads member lists"""
+    basedn = DN('dc=example,dc=com')
+    users = DN('cn=users,cn=accounts', basedn)
+    groups = DN('cn=groups,cn=accounts', basedn)
+    ipausers = DN(('cn', 'ipausers'), groups)
+    editors = DN(('cn', 'editors'), groups)
+    admins = DN(('cn', 'admins'), groups)
+
+    user_dns = [DN(('uid', 'user%d' % i), users) for i in range(5000)]
+    # DN of a group -> DNs of its direct members
+    members = {
+        ipausers: set(user_dns),
+        editors: set(user_dns[:10]),
+        admins: set([editors]),
+    }
+
+    class FakeLDAPClient(ipaldap.LDAPClient):
+        def __init__(self):
+            super(FakeLDAPClient, self).__init__('ldap://test',
+                                                 force_schema_updates=False)
+            self._has_schema = True
+            self._schema = None
+            self.searches = {}
+
+        def find_entries_async(self, filter, attrs_list, base_dn):
+            # the parent groups must be found without reading their members
+            assert attrs_list == ['']
+            msgid = len(self.searches) + 1
+            self.searches[msgid] = [
+                group_dn for group_dn, group_members in members.items()
+                if any(u'(member=%s)' % dn in filter for dn in group_members)
+            ]
+            return msgid
+
+        def get_async_result(self, msgid):
+            return [ipaldap.LDAPEntry(self, dn)
+                    for dn in self.searches.pop(msgid)]
+
+        def decode(self, val, attr):
+            return val.decode('utf-8')
+
+    conn = FakeLDAPClient()
+
+    class FakeLDAPObject(object):
+        class api(object):
+            class env(object):
+                basedn = DN('dc=example,dc=com')
+
+        backend = conn
+
+    get_memberofindirect_batch = six.get_unbound_function(
+        baseldap.LDAPObject.get_memberofindirect_batch)
+
+    def memberof(*dns):
+        return [str(dn).encode('utf-8') for dn in dns]
+
+    entries = [ipaldap.LDAPEntry(conn, dn) for dn in user_dns[:5] + [editors]]
+    for entry in entries[:5]:
+        entry.raw['memberof'] = memberof(ipausers, editors, admins)
+    entries[5].raw['memberof'] = memberof(admins)
+
+    get_memberofindirect_batch(FakeLDAPObject(), entries)
+
+    assert not conn.searches
+    for entry in entries[:5]:
+        assert (sorted(entry.raw['memberof']) ==
+                sorted(memberof(ipausers, editors)))
+        assert entry.raw['memberofindirect'] == memberof(admins)
+    assert entries[5].raw['memberof'] == memberof(admins)
+    assert 'memberofindirect' not in entries[5].raw
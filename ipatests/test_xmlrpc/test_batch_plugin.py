@@ -49,6 +49,22 @@ def deepequal_list(*expected):
     return checker
 
 
+def check_parallel_results(*expected):
+    """Factory for a function that checks results of a parallel batch
+
+    The created function asserts the results are in the order of the
+    methods, each reporting the given error (None for success) and the
+    time it took.
+    """
+    def checker(got):
+        assert len(expected) == len(got)
+        for error, result in zip(expected, got):
+            assert result['error'] == error
+            assert isinstance(result['elapsed'], float)
+        return True
+    return checker
+
+
 @pytest.mark.tier1
 class test_batch(Declarative):
 
@@ -181,6 +197,28 @@ class test_batch(Declarative):
             ),
         ),
 
+        dict(
+            desc='Show groups in parallel',
+            command=('batch', [
+                dict(method='group_show', params=([group1], dict())),
+                dict(method='group_show', params=([u'notfound'], dict())),
+                dict(method='group_find', params=([group1], dict())),
+                dict(method='group_mod', params=([group1], dict(
+                        description=u'Test desc 2'))),
+                dict(method='group_show', params=([group1], dict())),
+            ], dict(parallel=True)),
+            expected=dict(
+                count=5,
+                results=check_parallel_results(
+                    None,
+                    u'notfound: group not found',
+                    None,
+                    None,
+                    None,
+                ),
+            ),
+        ),
+
         dict(
             desc='Try bad command invocations',
             command=('batch', [
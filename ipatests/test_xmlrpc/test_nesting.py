@@ -189,6 +189,19 @@ class TestNestingUserGroups(XMLRPC_test):
         group3.retrieve()
         group4.retrieve()
 
+    def test_find_group_group(self, group1, group2, group3, group4):
+        """ Check group-find resolves indirect members like group-show """
+        command = group1.make_find_command(
+            u'testgroup', all=True, no_members=False)
+        found = dict((entry['cn'][0], entry)
+                     for entry in command()['result'])
+        for group in (group1, group2, group3, group4):
+            shown = group.make_retrieve_command(all=True)()['result']
+            for attr in (u'memberof_group', u'memberofindirect_group',
+                         u'memberindirect_group', u'memberindirect_user'):
+                assert (sorted(found[group.cn].get(attr, [])) ==
+                        sorted(shown.get(attr, [])))
+
 
 @pytest.mark.tier1
 class TestNestingHostGroups(XMLRPC_test):